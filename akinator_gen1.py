@@ -1,11 +1,19 @@
 import argparse
-import math
 import time
 import json
 import os
+import sys
+
+import numpy as np
+
+from cache import CacheLRU
+from base_conhecimento import KnowledgeBase, base_de, tem_caracteristica
+from metricas import contar, medir
+from posterior import PosteriorLog
 
 # --- Configuração ---
 DB_FILE = "pokemon_db.json"
+CALIBRACAO_FILE = os.path.splitext(DB_FILE)[0] + ".calib" # Gerado por calibracao.py (opcional)
 
 # Formato: (Probabilidade se TIVER a característica, Probabilidade se NÃO TIVER)
 LIKELIHOODS = {
@@ -16,6 +24,23 @@ LIKELIHOODS = {
     "pn": (0.30, 0.70)   # Provavelmente Não: 30% chance de ter
 }
 
+# --- Busca (Lookahead) ---
+PROFUNDIDADE_BUSCA = 2     # Perguntas simuladas à frente (Depth)
+RAMOS_BUSCA = ("s", "n")   # Respostas simuladas em cada nó (pode incluir "p", "pn", "i")
+TEMPO_LIMITE_BUSCA = 0.5   # Segundos; a busca devolve a melhor profundidade concluída
+QUANTIZACAO_CACHE = 1e-9   # Resolução do posterior na chave da tabela de transposição
+EPSILON_ATIVO = 1e-4       # Pokémons com prob <= epsilon ficam fora da busca (conjunto ativo)
+TOLERANCIA_EMPATE = 1e-9   # Scores mais próximos que isso empatam (desempate pela ordem do Depth 1)
+
+# --- Cache por histórico de respostas (compartilhado entre jogos do processo) ---
+CAPACIDADE_CACHE_HISTORICO = 4096  # Estados guardados (posterior, scores de Depth 1, melhor pergunta)
+TTL_CACHE_HISTORICO = 60 * 60      # Segundos
+
+# --- Amostragem (Monte Carlo) para conjuntos ativos grandes ---
+AMOSTRAGEM_BUSCA = None    # None = exato; "auto" = amostra só se o conjunto ativo passar do tamanho da amostra; int = nº de amostras
+ERRO_AMOSTRAGEM = 0.05     # Erro máximo em cada P(resposta | pergunta) estimada...
+CONFIANCA_AMOSTRAGEM = 0.95  # ...com esta confiança (para todas as perguntas e ramos ao mesmo tempo)
+
 # --- Gerenciamento de Dados ---
 
 def carregar_dados():
@@ -27,33 +52,348 @@ def carregar_dados():
     except:
         return []
 
-def salvar_dados(dados):
-    with open(DB_FILE, "w", encoding="utf-8") as f:
+def salvar_dados(dados, caminho=DB_FILE):
+    """ Grava a base (arquivo temporário + rename: quem recarrega nunca lê um JSON pela metade). """
+    temporario = caminho + ".tmp"
+    with open(temporario, "w", encoding="utf-8") as f:
         json.dump(dados, f, indent=4, ensure_ascii=False)
+    os.replace(temporario, caminho)
 
-# Salva o log de aprendizado para futura calibração de pesos.
+# Salva o log de aprendizado para futura calibração de pesos (append-only, ver log_aprendizado.py).
 
 def registrar_feedback(pokemon_real, historico_respostas):
+    from log_aprendizado import log_padrao # Só quem registra paga o import
+    log_padrao().registrar(pokemon_real, historico_respostas)
 
-    log_file = "learning_log.json"
-    entry = {
-        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
-        "pokemon_real": pokemon_real,
-        "historico": historico_respostas
-    }
-    
-    logs = []
-    if os.path.exists(log_file):
-        try:
-            with open(log_file, "r", encoding="utf-8") as f:
-                logs = json.load(f)
-        except:
-            pass
-            
-    logs.append(entry)
+# --- Matriz de Features (compilada uma vez por base, ver base_conhecimento.py) ---
+
+def carregar_base():
+    """
+    KnowledgeBase do DB_FILE, usando o cache binário compilado quando válido, com a
+    calibração aprendida do log aplicada se existir uma para esta base.
+    """
+    base = KnowledgeBase.carregar(DB_FILE)
+    if base is not None and os.path.exists(CALIBRACAO_FILE):
+        from calibracao import aplicar_calibracao
+        aplicar_calibracao(base, CALIBRACAO_FILE)
+    return base
+
+def assinatura_modelo(base):
+    """ Identifica base + calibração (o que muda a escolha de perguntas). """
+    calibracao = base.derivados.get("calibracao")
+    return base.assinatura if calibracao is None else f"{base.assinatura}+{calibracao['id']}"
+
+def coluna_feature(dados, attr, val):
+    """ Vetor booleano 'tem a característica' para (attr, val). """
+    return base_de(dados).coluna(attr, val)
+
+def tabela_log_verossimilhanca(base, resposta_codigo):
+    """
+    log P(resposta | pokémon, pergunta) para todas as perguntas candidatas (pokémons x perguntas).
+    Calculada uma vez por base e resposta; cada resposta do jogo só soma uma coluna dela.
+    Vem da calibração (calibracao.py) se houver uma aplicada à base, senão de LIKELIHOODS.
+    """
+    chave = ("log_verossimilhanca", resposta_codigo)
+    if chave not in base.derivados:
+        tabela = _log_verossimilhanca(base, resposta_codigo)
+        tabela.setflags(write=False)
+        base.derivados[chave] = tabela
+    return base.derivados[chave]
+
+def _log_verossimilhanca(base, resposta_codigo, indice=(slice(None), slice(None))):
+    """ Trecho `indice` (linhas, colunas) de `tabela_log_verossimilhanca`. """
+    calibracao = base.derivados.get("calibracao")
+    if calibracao is not None:
+        return np.log(calibracao["probs"][calibracao["codigos"].index(resposta_codigo)][indice], dtype=np.float64)
+    p_tem, p_nao_tem = LIKELIHOODS[resposta_codigo]
+    return np.where(base.matriz[indice], np.log(p_tem), np.log(p_nao_tem))
+
+def maximo_log_verossimilhanca(base, resposta_codigo):
+    """ Máximo de cada coluna de `tabela_log_verossimilhanca` (quanto o teto da vista de líderes sobe). """
+    chave = ("log_verossimilhanca_max", resposta_codigo)
+    if chave not in base.derivados:
+        base.derivados[chave] = tabela_log_verossimilhanca(base, resposta_codigo).max(axis=0)
+    return base.derivados[chave]
+
+def tabela_ramos(matriz, ramos=("s", "n")):
+    """
+    Modelo de resposta usado pela busca: tabela (ramos x pokémons x perguntas) com
+    P(resposta | pokémon, pergunta), tirada de LIKELIHOODS e normalizada entre os ramos
+    considerados. Para ("s", "n") os pesos já somam 1 (0.9/0.1).
+    """
+    pesos = np.stack([np.where(matriz, *LIKELIHOODS[r]) for r in ramos])
+    return pesos / pesos.sum(axis=0, keepdims=True)
+
+def tabela_tlogt(tabelas):
+    """ T * log2(T) elemento a elemento (0 onde T = 0), usado no cálculo matricial da entropia. """
+    return tabelas * np.log2(tabelas, out=np.zeros_like(tabelas), where=tabelas > 0)
+
+def tabela_ramos_base(base, ramos=("s", "n")):
+    """
+    (`tabela_ramos`, `tabela_tlogt`) da base inteira, calculadas uma vez e guardadas
+    nos derivados da base. Com calibração, os pesos vêm da matriz aprendida.
+    """
+    chave = ("ramos", tuple(ramos))
+    if chave not in base.derivados:
+        tabelas = _ramos(base, ramos)
+        base.derivados[chave] = (tabelas, tabela_tlogt(tabelas))
+    return base.derivados[chave]
+
+def _ramos(base, ramos, indice=(slice(None), slice(None))):
+    """ Trecho `indice` (linhas, colunas) da `tabela_ramos` da base. """
+    calibracao = base.derivados.get("calibracao")
+    if calibracao is not None:
+        # Mesmo modelo da atualização, renormalizado entre os ramos simulados
+        pesos = np.stack([calibracao["probs"][calibracao["codigos"].index(r)][indice] for r in ramos]).astype(np.float64)
+        return pesos / pesos.sum(axis=0, keepdims=True)
+    return tabela_ramos(base.matriz[indice], ramos)
+
+def transportar_derivados(anterior, base):
+    """
+    Leva as tabelas de verossimilhança e de ramos já calculadas em `anterior` para
+    `base`, uma edição dela (mesmos nomes/perguntas onde não mudou): copia as células
+    mantidas e só recalcula as linhas novas ou alteradas e as colunas novas. Só vale se
+    o modelo das células mantidas é o mesmo: ambas sem calibração, ou a calibração de
+    `base` levada da de `anterior` (`remapear_calibracao`). Retorna quantas tabelas levou.
+    """
+    cal_anterior, cal_nova = anterior.derivados.get("calibracao"), base.derivados.get("calibracao")
+    if (cal_anterior is None) != (cal_nova is None) or \
+       (cal_nova is not None and cal_nova.get("origem") != cal_anterior["id"]):
+        return 0
+
+    indice_nomes = {nome: i for i, nome in enumerate(anterior.nomes)}
+    origem_linhas = np.array([indice_nomes.get(nome, -1) for nome in base.nomes], dtype=np.intp)
+    origem_colunas = np.array([anterior.indice_perguntas.get(perg, -1) for perg in base.perguntas], dtype=np.intp)
+    # Blocos (novo, antigo) de linhas x colunas consecutivas nas duas bases: cópia por fatias, sem indexação avançada
+    blocos = [(np.s_[ln:ln + nl, cn:cn + nc], np.s_[la:la + nl, ca:ca + nc])
+              for ln, la, nl in _trechos(origem_linhas) for cn, ca, nc in _trechos(origem_colunas)]
+
+    def copiar(antiga, tabela):
+        for novo, antigo in blocos:
+            tabela[(Ellipsis,) + novo] = antiga[(Ellipsis,) + antigo]
+        return tabela
+
+    # Linhas recalculadas inteiras: novas ou com alguma característica mantida diferente
+    mudou = copiar(anterior.matriz, np.zeros(base.matriz.shape, dtype=bool)) != base.matriz
+    mudou[:, origem_colunas < 0] = False
+    recalcular = (origem_linhas < 0) | mudou.any(axis=1)
+    linhas_novas = (np.flatnonzero(recalcular), slice(None))
+    colunas_novas = (slice(None), np.flatnonzero(origem_colunas < 0))
+
+    def transportar(antiga, calcular):
+        tabela = copiar(antiga, np.empty(antiga.shape[:-2] + base.matriz.shape, dtype=antiga.dtype))
+        tabela[(Ellipsis,) + linhas_novas] = calcular(linhas_novas)
+        tabela[(Ellipsis,) + colunas_novas] = calcular(colunas_novas)
+        return tabela
+
+    levadas = 0
+    for chave, valor in list(anterior.derivados.items()):
+        if not isinstance(chave, tuple) or chave in base.derivados:
+            continue
+        if chave[0] == "log_verossimilhanca":
+            tabela = transportar(valor, lambda indice: _log_verossimilhanca(base, chave[1], indice))
+            tabela.setflags(write=False)
+            base.derivados[chave] = tabela
+        elif chave[0] == "ramos":
+            tabelas = transportar(valor[0], lambda indice: _ramos(base, chave[1], indice))
+            base.derivados[chave] = (tabelas, transportar(valor[1], lambda indice: tabela_tlogt(tabelas[(Ellipsis,) + indice])))
+        else:
+            continue
+        levadas += 1
+    return levadas
+
+def _trechos(origem):
+    """ (início novo, início antigo, tamanho) de cada trecho em que `origem` avança de 1 em 1 (-1 = sem origem). """
+    trechos = []
+    for i, j in enumerate(origem):
+        if j < 0:
+            continue
+        if trechos and trechos[-1][0] + trechos[-1][2] == i and trechos[-1][1] + trechos[-1][2] == j:
+            trechos[-1][2] += 1
+        else:
+            trechos.append([i, j, 1])
+    return trechos
+
+def entropia_esperada_lote(probs, tabelas, tabelas_tlogt=None):
+    """
+    Entropia esperada (Depth 1) de TODAS as perguntas (colunas de `tabelas`) de uma vez:
+    Somatório sobre as respostas de P(resposta) * H(posterior | resposta).
+
+    Com U_i = T_i * p_i (conjunta do ramo), P * H(U / P) = P * log2(P) - Somatório U_i log2(U_i),
+    e Somatório U_i log2(U_i) = (T log2 T)ᵀ p + Tᵀ (p log2 p). Ou seja, só produtos
+    matriz-vetor, sem materializar a conjunta (ramos x pokémons x perguntas).
+    `probs` também pode ser uma matriz (jogos x pokémons): o resultado vira (jogos x perguntas).
+    """
+    probs = np.asarray(probs, dtype=float)
+    if tabelas_tlogt is None:
+        tabelas_tlogt = tabela_tlogt(tabelas)
+    plogp = probs * np.log2(probs, out=np.zeros_like(probs), where=probs > 0)
+
+    p_resposta = probs @ tabelas # (ramos, perguntas)
+    soma_ulogu = probs @ tabelas_tlogt + plogp @ tabelas
+    plogp_resposta = p_resposta * np.log2(p_resposta, out=np.zeros_like(p_resposta), where=p_resposta > 0)
+    return np.maximum((plogp_resposta - soma_ulogu).sum(axis=0), 0.0)
+
+def regra_parada(best_idx, best_prob, second_prob, perguntas_feitas):
+    """ Smart Stop a partir do líder e do segundo colocado (ver `AkinatorBayes.avaliar_parada`). """
+    # 1. Certeza Absoluta
+    win_absolute = best_prob > 0.80
+
+    # 2. Dominância Relativa (Gap Rule)
+    # Se o líder tem > 60% e é 4x mais provável que o segundo colocado.
+    win_relative = (best_prob > 0.60 and best_prob > 4 * second_prob)
     
-    with open(log_file, "w", encoding="utf-8") as f:
-        json.dump(logs, f, indent=4, ensure_ascii=False)
+    # 3. Fim de Jogo "Soft" (Após 15 perguntas, fica menos exigente)
+    win_late_game = (perguntas_feitas > 15 and best_prob > 0.55 and best_prob > 2 * second_prob)
+
+    if win_absolute or win_relative or win_late_game:
+        return {"status": "finished", "indice": best_idx, "prob": best_prob}
+
+    # Derrota (Muito incerto após 10 perguntas)
+    if perguntas_feitas > 10 and best_prob < 0.05:
+        return {"status": "give_up"}
+
+    # Limite de perguntas (20): chuta o melhor mesmo assim
+    if perguntas_feitas >= 20:
+        return {"status": "finished", "indice": best_idx, "prob": best_prob, "forced": True}
+
+    return None
+
+def chave_respostas(respostas):
+    """ Forma canônica de um histórico [(attr, val, código)]: o posterior não depende da ordem. """
+    return tuple(sorted(((attr, val, resp) for attr, val, resp in respostas), key=lambda r: (r[0], repr(r[1]), r[2])))
+
+# Caminhos populares do jogo (mesmas respostas, em qualquer ordem) são servidos daqui
+# sem recalcular. Chaves: (tipo, assinatura_modelo, histórico canônico, perguntas usadas, parâmetros).
+CACHE_HISTORICO = CacheLRU(CAPACIDADE_CACHE_HISTORICO, TTL_CACHE_HISTORICO)
+
+def _consultar_cache(chave):
+    if chave is None:
+        return None
+    valor = CACHE_HISTORICO.get(chave)
+    contar(f"cache_historico.{chave[0]}.{'acertos' if valor is not None else 'falhas'}")
+    return valor
+
+def tamanho_amostra(erro=ERRO_AMOSTRAGEM, confianca=CONFIANCA_AMOSTRAGEM, n_ramos=2, n_perguntas=1):
+    """
+    Amostras necessárias para que TODAS as probabilidades de resposta P(a | q) estimadas
+    fiquem a menos de `erro` das exatas com probabilidade `confianca`
+    (Hoeffding + união sobre ramos x perguntas): M >= ln(2 k Q / (1 - confianca)) / (2 erro²).
+    """
+    return int(np.ceil(np.log(2 * n_ramos * max(n_perguntas, 1) / (1 - confianca)) / (2 * erro ** 2)))
+
+def amostrar_posterior(indices, probs, m, seed=0):
+    """
+    Reamostragem sistemática de `m` hipóteses do posterior: (índices únicos, pesos = contagem / m).
+    Menos variância que sortear com reposição, e no máximo `m` pokémons distintos.
+    """
+    cdf = np.cumsum(probs)
+    u = (np.random.default_rng(seed).random() + np.arange(m)) / m * cdf[-1]
+    sorteados = np.minimum(np.searchsorted(cdf, u, side="right"), len(indices) - 1)
+    unicos, contagens = np.unique(sorteados, return_counts=True)
+    return indices[unicos], contagens / m
+
+class TempoEsgotado(Exception):
+    """ O orçamento de tempo da busca acabou no meio de uma profundidade. """
+
+class BuscaExpectimax:
+    """
+    Expectimax sobre a entropia: em cada nó escolhe a pergunta de MENOR entropia esperada
+    e pondera os ramos de resposta pela probabilidade de ocorrerem.
+    Estados repetidos (mesmo posterior quantizado + mesmas perguntas disponíveis) saem
+    da tabela de transposição.
+
+    Branch-and-bound: nenhuma pergunta reduz a entropia esperada em mais que
+    `ganho_max` = log2(ramos) - (menor entropia de uma linha P(resposta | pokémon)), então
+    com d perguntas o valor de um nó é >= H - d * ganho_max (e >= 0). Candidatas (e ramos)
+    cujo limite inferior já passa da melhor avaliada são podadas sem mudar o resultado.
+    """
+
+    def __init__(self, tabelas, prazo=None, quantizacao=QUANTIZACAO_CACHE, tabelas_tlogt=None):
+        self.tabelas = tabelas
+        self.tabelas_tlogt = tabelas_tlogt if tabelas_tlogt is not None else tabela_tlogt(tabelas)
+        self.prazo = prazo # time.perf_counter() limite (None = sem limite)
+        self.quantizacao = quantizacao
+        self.cache = {}
+        self.nos = 0
+        self.cache_hits = 0
+        self.atualizacoes = 0 # Posteriores simulados (um por ramo de resposta)
+        self.avaliacoes = 0   # Perguntas pontuadas pela entropia esperada de Depth 1
+        self.podas = 0        # Candidatas descartadas pelo limite inferior
+        # Maior ganho de informação possível de uma pergunta (bits), para os limites inferiores
+        entropia_linhas = -self.tabelas_tlogt.sum(axis=0) # (pokémons, perguntas)
+        minima = float(entropia_linhas.min()) if entropia_linhas.size else 0.0
+        self.ganho_max = max(np.log2(tabelas.shape[0]) - minima, 0.0)
+
+    def _chave(self, probs, disponiveis, profundidade):
+        quantizado = np.rint(probs / self.quantizacao).astype(np.int64)
+        return (profundidade, quantizado.tobytes(), disponiveis.tobytes())
+
+    def valores(self, probs, disponiveis, profundidade, candidatas=None):
+        """
+        Entropia esperada de perguntar cada uma das `candidatas` (índices) e depois seguir
+        jogando otimamente por mais `profundidade - 1` perguntas. Candidatas podadas (que
+        comprovadamente não chegam à menor) ficam com np.inf.
+        """
+        if candidatas is None:
+            candidatas = np.flatnonzero(disponiveis)
+        if profundidade == 1:
+            # Produto matriz-vetor em todas as colunas sai mais barato que copiar um recorte
+            self.avaliacoes += self.tabelas.shape[2]
+            return entropia_esperada_lote(probs, self.tabelas, self.tabelas_tlogt)[candidatas]
+
+        # Limite inferior de cada candidata: entropia esperada de Depth 1 menos o que as
+        # próximas perguntas ainda podem ganhar. Avaliando na ordem do limite, a primeira
+        # candidata com limite acima da melhor encerra a busca (todas as seguintes também estão).
+        folga = (profundidade - 1) * self.ganho_max
+        limites = np.maximum(self.valores(probs, disponiveis, 1, candidatas) - folga, 0.0)
+        valores = np.full(len(candidatas), np.inf)
+        melhor = np.inf
+        ordem = np.argsort(limites, kind="stable")
+        for n, k in enumerate(ordem):
+            if limites[k] > melhor + TOLERANCIA_EMPATE:
+                self.podas += len(ordem) - n
+                break
+            j = candidatas[k]
+            restantes = disponiveis.copy()
+            restantes[j] = False
+
+            conjunta = self.tabelas[:, :, j] * probs # (ramos, pokémons)
+            p_respostas = conjunta.sum(axis=1)
+            ramos = [(p, pesos / p) for p, pesos in zip(p_respostas, conjunta) if p > 1e-12] # Ramo impossível não contribui
+            # Limite de cada ramo (mesma ideia, com a entropia do posterior do ramo)
+            limites_ramos = [p * max(AkinatorBayes.static_calc_entropy(post) - folga, 0.0) for p, post in ramos]
+            score, pendente = 0.0, sum(limites_ramos)
+            for (p_resposta, post), limite in zip(ramos, limites_ramos):
+                pendente -= limite
+                self.atualizacoes += 1
+                score += p_resposta * self.valor(post, restantes, profundidade - 1)
+                if score + pendente > melhor + TOLERANCIA_EMPATE:
+                    break # Não vence a melhor nem com os ramos restantes no limite
+            else:
+                valores[k] = score
+                melhor = min(melhor, score)
+                continue
+            self.podas += 1
+        return valores
+
+    def valor(self, probs, disponiveis, profundidade):
+        """ Menor entropia esperada alcançável a partir de `probs` em `profundidade` perguntas. """
+        if profundidade == 0 or not disponiveis.any():
+            return AkinatorBayes.static_calc_entropy(probs)
+
+        chave = self._chave(probs, disponiveis, profundidade)
+        if chave in self.cache:
+            self.cache_hits += 1
+            return self.cache[chave]
+
+        if self.prazo is not None and time.perf_counter() > self.prazo:
+            raise TempoEsgotado()
+
+        self.nos += 1
+        resultado = float(self.valores(probs, disponiveis, profundidade).min())
+        self.cache[chave] = resultado
+        return resultado
 
 # --- Motor Bayesiano (aqui onde a magia acontece)---
 
@@ -65,45 +405,52 @@ class AkinatorBayes:
         
         if not dados:
             self.total = 0
-            self.probs = []
+            self.posterior = PosteriorLog.uniforme(0)
+            self.respostas = []
             return
             
+        self.base = base_de(dados)
         self.total = len(dados)
-        self.probs = [1.0 / self.total] * self.total
+        self.posterior = PosteriorLog.uniforme(self.total)
+        self.respostas = [] # [(attr, val, código)] que levaram ao posterior; None = desconhecido
+        self.perguntas = self.base.perguntas
+        self.indice_perguntas = self.base.indice_perguntas
+        self.matriz = self.base.matriz
 
-    def get_distribution_entropy(self):
-        entropy = 0
-        for p in self.probs:
-            if p > 0:
-                entropy -= p * math.log2(p)
-        return entropy
+    @property
+    def posterior(self):
+        return self._posterior
 
-# Verifica se o pokemon tem a característica desejada.
+    @posterior.setter
+    def posterior(self, posterior):
+        # Posterior trocado por fora: o histórico que o gerou é desconhecido até alguém informar
+        self._posterior = posterior
+        self.respostas = None
 
-    def check_feature(self, pokemon, attr, val):
+    def _chave_cache(self, tipo, *parametros):
+        """ Chave do CACHE_HISTORICO para o estado atual, ou None se o histórico é desconhecido. """
+        if self.respostas is None or not self.dados:
+            return None
+        return (tipo, assinatura_modelo(self.base), chave_respostas(self.respostas),
+                tuple(sorted(self.atributos_utilizados, key=repr))) + parametros
 
-        # 1. Checagem de TIPO
-        if attr == "tipo":
-            t1 = pokemon.get("tipo", "")
-            t2 = pokemon.get("tipo2", "")
-            # Se perguntamos "É tipo Fogo?", retorna True se Primary OU Secondary for Fogo
-            return (t1 == val) or (t2 == val)
-            
-        # 2. Checagem de EVOLUÇÃO
-        if attr == "evolui":
-            evo = pokemon.get("evolui", "")
-            if val is True:
-                return bool(evo)
-            else:
-                return not bool(evo)
+    @property
+    def probs(self):
+        """ Posterior normalizado (lido do PosteriorLog em log-espaço). """
+        return self.posterior.probs
 
-        # 3. Checagem de COR
-        if attr == "cor":
-            return pokemon.get("cor") == val
+    @probs.setter
+    def probs(self, probs):
+        self.posterior = PosteriorLog.de_probs(probs)
 
-        # 4. Checagem de Booleanos Genéricos (lendario, inicial, bipede, etc)
-        # Se a chave não existir no JSON do pokemon, assumimos False por segurança
-        return pokemon.get(attr, False) == val
+    def get_distribution_entropy(self):
+        return self.static_calc_entropy(self.probs)
+
+# Verifica se o pokemon tem a característica desejada.
+
+    @staticmethod
+    def check_feature(pokemon, attr, val):
+        return tem_caracteristica(pokemon, attr, val)
 
     def atualizar_probabilidades(self, atributo, valor, resposta_codigo):
         """
@@ -112,206 +459,389 @@ class AkinatorBayes:
         if resposta_codigo not in LIKELIHOODS:
             return # Se inválido, ignora
 
-        p_tem, p_nao_tem = LIKELIHOODS[resposta_codigo]
+        # Bayes: P(H|E) = P(E|H) * P(H) / P(E)
+        # Em log-espaço basta somar log P(E|H); a normalização fica para quando alguém ler os probs
+        with medir("posterior.atualizacao"):
+            j = self.indice_perguntas.get((atributo, valor))
+            if j is not None:
+                self.posterior.adicionar(tabela_log_verossimilhanca(self.base, resposta_codigo)[:, j],
+                                         maximo_log_verossimilhanca(self.base, resposta_codigo)[j])
+            else:
+                p_tem, p_nao_tem = LIKELIHOODS[resposta_codigo]
+                tem_atributo = self.base.coluna(atributo, valor)
+                self.posterior.adicionar(np.where(tem_atributo, np.log(p_tem), np.log(p_nao_tem)))
+        if self.respostas is not None:
+            self.respostas.append((atributo, valor, resposta_codigo))
 
-        for i, pokemon in enumerate(self.dados):
-            tem_atributo = self.check_feature(pokemon, atributo, valor)
-            
-            # Bayes: P(H|E) = P(E|H) * P(H) / P(E)
-            # Aqui é calculado apenas o numerador (Likelihood * Prior) e depois normalizado
-            
-            likelihood = p_tem if tem_atributo else p_nao_tem
-            self.probs[i] *= likelihood
-            
-        # Normalização
-        soma_probs = sum(self.probs)
-        if soma_probs == 0: 
-            self.probs = [1.0/self.total] * self.total
-        else:
-            self.probs = [p / soma_probs for p in self.probs]
+    def top_candidatos(self, k=10):
+        """ [(índice, prob), ...] dos k mais prováveis, do maior para o menor (vista de líderes do posterior). """
+        with medir("posterior.top_k"):
+            indices, probs = self.posterior.top_k(k)
+        return list(zip(indices.tolist(), probs.tolist()))
+
+    def avaliar_parada(self, perguntas_feitas):
+        """
+        Condições de parada inteligentes (Smart Stop). Retorna None para continuar
+        perguntando, ou {"status": "finished"/"give_up", "indice", "prob", ...}.
+        """
+        top = self.top_candidatos(2)
+        if not top:
+            return {"status": "give_up"}
+        second_prob = top[1][1] if len(top) > 1 else 0
+        return regra_parada(top[0][0], top[0][1], second_prob, perguntas_feitas)
 
     # --- MÉTODOS ESTÁTICOS DE SIMULAÇÃO (Para Lookahead) ---
     @staticmethod
     def static_calc_entropy(probs):
-        entropy = 0
-        for p in probs:
-            if p > 0:
-                entropy -= p * math.log2(p)
-        return entropy
+        p = np.asarray(probs, dtype=float)
+        p = p[p > 0]
+        return float(-(p * np.log2(p)).sum())
 
     @staticmethod
     def static_simulate_update(dados, probs, attr, val, resposta_codigo):
-        """ Retorna NOVA lista de probs simulada, sem alterar self. """
-        new_probs = list(probs)
-        
-        # Copia da logica de check_feature e likelihood para ser standalone
+        """ Retorna NOVO vetor de probs simulado, sem alterar self. """
+        new_probs = np.array(probs, dtype=float)
         
         # Pega likelihoods
         if resposta_codigo not in LIKELIHOODS: return new_probs
         p_tem, p_nao_tem = LIKELIHOODS[resposta_codigo]
 
-        for i, pokemon in enumerate(dados):
-            # Check Feature Inline
-            tem_atributo = False
-            if attr == "tipo":
-                tem_atributo = (pokemon.get("tipo") == val) or (pokemon.get("tipo2") == val)
-            elif attr == "evolui":
-                evo = bool(pokemon.get("evolui"))
-                tem_atributo = evo if val else not evo
-            elif attr == "cor":
-                tem_atributo = (pokemon.get("cor") == val)
-            else:
-                tem_atributo = (pokemon.get(attr, False) == val)
-
-            likelihood = p_tem if tem_atributo else p_nao_tem
-            new_probs[i] *= likelihood
+        new_probs *= np.where(coluna_feature(dados, attr, val), p_tem, p_nao_tem)
 
         # Normalização
-        soma = sum(new_probs)
+        soma = new_probs.sum()
         if soma > 0:
-            new_probs = [p/soma for p in new_probs]
+            new_probs /= soma
         
         return new_probs
 
-# Minimax (Minimizar Entropia) com Profundidade e Beam Search.
+# Expectimax (Minimizar Entropia) com Aprofundamento Iterativo e Branch-and-Bound
+# (Beam Search na raiz opcional: por padrão todas as candidatas, com poda exata).
 
-    def obter_melhor_pergunta_lookahead(self, profundidade=2, beam_width=5):
+    def obter_melhor_pergunta_lookahead(self, profundidade=PROFUNDIDADE_BUSCA, beam_width=None,
+                                        ramos=RAMOS_BUSCA, tempo_limite=TEMPO_LIMITE_BUSCA, epsilon=EPSILON_ATIVO,
+                                        pool=None, amostragem=AMOSTRAGEM_BUSCA, erro_amostragem=ERRO_AMOSTRAGEM):
+        """
+        `pool` (busca_paralela.PoolBusca) reparte as candidatas do Beam entre processos a
+        partir da profundidade 2; sem ele (ou se o pool não tem esta base) a busca é sequencial.
+
+        `amostragem` troca o conjunto ativo por hipóteses amostradas do posterior (ver
+        `amostrar_posterior`), e toda a busca roda sobre elas: o custo passa a depender do
+        tamanho da amostra, não do número de pokémons. "auto" calcula o tamanho pelo
+        `erro_amostragem` e só amostra quando o conjunto ativo é maior que isso (senão, exato).
+        """
 
         if not self.dados: return None
-        
-        # Passo 1: Gerar TODAS as perguntas possíveis
-        candidatas = self._gerar_perguntas_candidatas()
-        
-        # Passo 2: Calcular Score Base (Ganho de Informação Imediato - Depth 1)
-        # Isso serve para fazer o Beam Search (Poda)
-        scores_iniciais = []
-        for attr, val in candidatas:
-            if (attr, val) in self.atributos_utilizados: continue
-            
-            # Heurística Rápida: Ganho de Informação com "Sim" perfeito
-            # Usa a entropia esperada completa do Depth 1 como filtro
-            e_esperada = self._calcular_entropia_esperada(self.probs, attr, val)
-            scores_iniciais.append( ((attr, val), e_esperada) )
-            
-        # Ordena pelo MENOR entropia esperada (Melhor ganho)
-        scores_iniciais.sort(key=lambda x: x[1])
-        
-        # Beam Search: Pega apenas as TOP N para aprofundar
-        top_candidatas = [x[0] for x in scores_iniciais[:beam_width]]
-        
-        if profundidade == 1:
-            return top_candidatas[0] if top_candidatas else None
-            
-        # Passo 3: Aprofundar (Depth > 1) nas Top Candidatas
-        melhor_pergunta = None
-        melhor_score_final = float('inf') # Menor entropia
-        
-        print(f"--- Iniciando Lookahead Depth {profundidade} em {len(top_candidatas)} candidatos ---")
-        
-        for perg in top_candidatas:
-            attr, val = perg
-            
-            # Simula resposta SIM (com peso de probabilidade de ocorrer)
-            # Probabilidade do usuário dizer SIM: P(Sim) = Somatório(P(H) * P(Sim|H))
-            p_user_sim = 0
-            for i, p in enumerate(self.probs):
-                tem = self.check_feature(self.dados[i], attr, val)
-                # Usa 0.9/0.1 do LIKELIHOODS['s']
-                mtch = 0.9 if tem else 0.1
-                p_user_sim += p * mtch
-                
-            p_user_nao = 1.0 - p_user_sim
-            
-            # Ramo SIM
-            probs_sim = self.static_simulate_update(self.dados, self.probs, attr, val, 's')
-            # Qual seria a melhor entropia alcançável no próximo turno a partir daqui?
-            # Chamada Recursiva (Simplify: Apenas pega a entropia resultante se depth acabou,
-            # ou faria nova busca. Para Depth 2, basta pegar a entropia do estado resultante ou idealmente
-            # o minimo de entropia de uma nova pergunta. 
-            # *Correção*: Minimax real busca o MINIMO da entropia apos a MELHOR pergunta do próximo turno.
-            min_ent_sim = self.buscar_minima_entropia_futura(probs_sim)
-            
-            # Ramo NÃO
-            probs_nao = self.static_simulate_update(self.dados, self.probs, attr, val, 'n')
-            min_ent_nao = self.buscar_minima_entropia_futura(probs_nao)
-            
-            # Score Ponderado
-            score_final = (p_user_sim * min_ent_sim) + (p_user_nao * min_ent_nao)
-            
-            if score_final < melhor_score_final:
-                melhor_score_final = score_final
-                melhor_pergunta = perg
-                
-        return melhor_pergunta
+
+        disponiveis = self._mascara_disponiveis()
+        if not disponiveis.any(): return None
+
+        chave = self._chave_cache("pergunta", profundidade, beam_width, tuple(ramos), epsilon, amostragem, erro_amostragem)
+        guardado = _consultar_cache(chave)
+        if guardado is not None:
+            melhor, estatisticas = guardado
+            self.estatisticas_busca = dict(estatisticas)
+            return melhor
+
+        inicio = time.perf_counter()
+        prazo = inicio + tempo_limite if tempo_limite is not None else None
+        # A busca só enxerga o conjunto ativo: o custo acompanha os candidatos plausíveis
+        ativos, probs = self._estado_ativo(epsilon)
+        amostras = None
+        if amostragem is not None:
+            m = amostragem if amostragem != "auto" else \
+                tamanho_amostra(erro_amostragem, n_ramos=len(ramos), n_perguntas=int(disponiveis.sum()))
+            if len(ativos) > m:
+                ativos, probs = amostrar_posterior(ativos, probs, m)
+                amostras = m
+                contar("busca.amostradas")
+        tabelas, tabelas_tlogt = self._tabelas_ativas(ativos, ramos)
+        busca = BuscaExpectimax(tabelas, prazo=prazo, tabelas_tlogt=tabelas_tlogt)
+
+        # Depth 1 (sempre concluída): ordena as candidatas e define o Beam da raiz
+        candidatas = np.flatnonzero(disponiveis)
+        with medir("busca.depth1"):
+            if amostras is None:
+                scores = self._scores_depth1(ativos, probs, ramos, epsilon, tabelas, tabelas_tlogt)[candidatas]
+                busca.avaliacoes += tabelas.shape[2]
+            else:
+                scores = busca.valores(probs, disponiveis, 1, candidatas)
+        ordem = np.argsort(scores, kind="stable")
+        candidatas = candidatas[ordem]
+        if beam_width is not None:
+            candidatas = candidatas[:beam_width]
+        melhor = candidatas[0]
+        profundidade_concluida = 1
+
+        # Aprofundamento iterativo: cada profundidade concluída substitui a anterior.
+        # Se o tempo acabar no meio, fica a resposta da última profundidade completa.
+        nos_pool = hits_pool = podas_pool = 0
+        for d in range(2, profundidade + 1):
+            try:
+                with medir(f"busca.depth{d}"):
+                    paralelo = pool.valores(self.base, ativos, ramos, probs, disponiveis, d, candidatas, prazo) \
+                        if pool is not None and len(candidatas) > 1 else None
+                    if paralelo is not None:
+                        scores, nos, hits, podas = paralelo
+                        nos_pool += nos
+                        hits_pool += hits
+                        podas_pool += podas
+                    else:
+                        scores = busca.valores(probs, disponiveis, d, candidatas)
+            except TempoEsgotado:
+                contar("busca.tempo_esgotado")
+                break
+            # Empates exatos podem diferir no último bit conforme a ordem dos hits da tabela de
+            # transposição; a tolerância mantém a escolha igual em modo sequencial e paralelo.
+            melhor = candidatas[int(np.flatnonzero(scores <= scores.min() + TOLERANCIA_EMPATE)[0])]
+            profundidade_concluida = d
+
+        self.estatisticas_busca = {
+            "profundidade": profundidade_concluida,
+            "nos": busca.nos + nos_pool,
+            "cache_hits": busca.cache_hits + hits_pool,
+            "podas": busca.podas + podas_pool,
+            "ativos": len(ativos),
+            "amostras": amostras,
+            "tempo": time.perf_counter() - inicio
+        }
+        contar("busca.buscas")
+        contar("busca.nos", self.estatisticas_busca["nos"])
+        contar("busca.cache_hits", self.estatisticas_busca["cache_hits"])
+        contar("busca.podas", self.estatisticas_busca["podas"])
+        contar("busca.atualizacoes_simuladas", busca.atualizacoes)
+        contar("busca.avaliacoes_entropia", busca.avaliacoes)
+        contar(f"busca.concluida_depth{profundidade_concluida}")
+        if chave is not None and profundidade_concluida == profundidade:
+            # Só buscas completas: o resultado não depende de quanto tempo sobrou
+            CACHE_HISTORICO.put(chave, (self.perguntas[melhor], dict(self.estatisticas_busca)))
+        return self.perguntas[melhor]
+
+    def _scores_depth1(self, ativos, probs, ramos, epsilon, tabelas=None, tabelas_tlogt=None):
+        """ Entropia esperada de Depth 1 de todas as perguntas no estado atual (memoizada por histórico). """
+        chave = self._chave_cache("scores", tuple(ramos), epsilon)
+        scores = _consultar_cache(chave)
+        if scores is None:
+            if tabelas is None:
+                tabelas, tabelas_tlogt = self._tabelas_ativas(ativos, ramos)
+            scores = entropia_esperada_lote(probs, tabelas, tabelas_tlogt)
+            scores.setflags(write=False)
+            if chave is not None:
+                CACHE_HISTORICO.put(chave, scores)
+        return scores
 
     def _gerar_perguntas_candidatas(self):
-        pgs = []
-        # 1. Tipos
-        tipos = set()
-        for p in self.dados:
-            if p.get("tipo"): tipos.add(p.get("tipo"))
-            if p.get("tipo2"): tipos.add(p.get("tipo2"))
-        for t in tipos: pgs.append(("tipo", t))
-        
-        # 2. Booleanos e Outros
-        pgs.append(("evolui", True))
-        cores = set(p.get("cor") for p in self.dados if p.get("cor"))
-        for c in cores: pgs.append(("cor", c))
-        
-        bools = ["lendario", "inicial", "bipede", "tem_cauda", "tem_asas", "tem_chifre", "tem_pelo", "flutua", "tem_casco", "evolui_com_pedra"]
-        for b in bools: pgs.append((b, True))
-        
-        return pgs
+        return list(self.perguntas)
+
+    def _mascara_disponiveis(self):
+        """ True para as perguntas candidatas que ainda não foram feitas. """
+        return np.array([perg not in self.atributos_utilizados for perg in self.perguntas], dtype=bool)
+
+    def _tabelas_ativas(self, ativos, ramos=RAMOS_BUSCA):
+        """ Tabelas de ramos (e T log T) recortadas no conjunto ativo. """
+        tabelas, tabelas_tlogt = tabela_ramos_base(self.base, ramos)
+        if len(ativos) == self.total:
+            return tabelas, tabelas_tlogt
+        return tabelas[:, ativos, :], tabelas_tlogt[:, ativos, :]
+
+    def _estado_ativo(self, epsilon=EPSILON_ATIVO):
+        """ (índices do conjunto ativo, probs renormalizadas sobre ele). """
+        ativos = self.posterior.ativos(epsilon)
+        probs = self.posterior.probs[ativos]
+        return ativos, probs / probs.sum()
+
+    def pontuar_perguntas(self, probs=None):
+        """
+        Pontua todas as perguntas ainda não usadas em uma única operação matricial.
+        Sem `probs`, usa o posterior atual restrito ao conjunto ativo.
+        Retorna [((attr, val), entropia_esperada), ...] da melhor (menor entropia) para a pior.
+        """
+        if not self.dados: return []
+        if probs is None:
+            ativos, probs = self._estado_ativo()
+            scores = self._scores_depth1(ativos, probs, ("s", "n"), EPSILON_ATIVO)
+        else:
+            scores = entropia_esperada_lote(probs, *tabela_ramos_base(self.base))
+        disponiveis = np.flatnonzero(self._mascara_disponiveis())
+        ordem = disponiveis[np.argsort(scores[disponiveis], kind="stable")]
+        return [(self.perguntas[j], float(scores[j])) for j in ordem]
 
     def _calcular_entropia_esperada(self, probs_iniciais, attr, val):
-        # Calcula entropia imediata (Depth 1)
-        p_sim_total = 0
-        for i, p in enumerate(probs_iniciais):
-            tem = self.check_feature(self.dados[i], attr, val)
-            p_sim_total += p * (1.0 if tem else 0.0) # Simplificação binária para performance
-            
-        p_nao_total = 1.0 - p_sim_total
-        
-        e_sim = 0
-        if p_sim_total > 0:
-            probs_sim = self.static_simulate_update(self.dados, probs_iniciais, attr, val, 's')
-            e_sim = self.static_calc_entropy(probs_sim)
-            
-        e_nao = 0
-        if p_nao_total > 0:
-            probs_nao = self.static_simulate_update(self.dados, probs_iniciais, attr, val, 'n')
-            e_nao = self.static_calc_entropy(probs_nao)
-            
-        return (p_sim_total * e_sim) + (p_nao_total * e_nao)
+        # Calcula entropia imediata (Depth 1) de uma única pergunta
+        tem = self.base.coluna(attr, val)
+        return float(entropia_esperada_lote(probs_iniciais, tabela_ramos(tem[:, None]))[0])
 
     def buscar_minima_entropia_futura(self, probs):
         # Dado um estado futuro, qual a Melhor Pergunta que poderiamos fazer lá?
         # Retorna a Entropia Esperada dessa Melhor Pergunta (Min of the Entropy Curve)
-        
-        # Otimização: Não checar todas, apenas uma amostra ou usar heurística de entropia atual * fator
-        # Para Depth 2 "Real", itera as perguntas de novo neste estado probs.
-        # Devido a custo, faz um Beam Search pequeno ou apenas calcular a entropia do estado (Depth 1.5)
-        
-        entropia_minima = float('inf')
-        
-        # Pega Top 5 perguntas neste novo estado (Beam interno)
-        candidatas = self._gerar_perguntas_candidatas()
-        
-        count = 0
-        for attr, val in candidatas:
-            if (attr, val) in self.atributos_utilizados: continue
-            
-            # Calcula Entropia Esperada desta pergunta no futuro
-            e = self._calcular_entropia_esperada(probs, attr, val)
-            if e < entropia_minima:
-                entropia_minima = e
-            
-            count += 1
-            if count > 10: break # Otimização agressiva para Demo
-            
-        return entropia_minima if entropia_minima != float('inf') else self.static_calc_entropy(probs)
+        tabelas, tabelas_tlogt = tabela_ramos_base(self.base)
+        busca = BuscaExpectimax(tabelas, tabelas_tlogt=tabelas_tlogt)
+        return busca.valor(np.asarray(probs, dtype=float), self._mascara_disponiveis(), 1)
 
 
+# --- Inferência em lote (sem estado) ---
+
+LOTE_INFERENCIA = 256 # Jogos por passada matricial (limita a memória de jogos x perguntas)
+
+def inferir_lote(dados, historicos, k=10, profundidade=1, beam_width=None, tempo_limite=TEMPO_LIMITE_BUSCA, livro=None):
+    """
+    Avalia vários jogos de uma vez a partir só dos históricos [(attr, val, código), ...].
+    Os posteriores saem de um produto matricial (contagens de respostas x tabela de
+    log-verossimilhança), exceto os de históricos já vistos (em qualquer ordem), que vêm
+    do CACHE_HISTORICO; com profundidade 1, a próxima pergunta de todos os jogos
+    de uma única `entropia_esperada_lote` sobre o posterior completo.
+    Profundidade > 1 roda o Lookahead jogo a jogo. Com `livro` (livro de aberturas), os
+    jogos ainda na abertura recebem a pergunta do livro, como no /api/next_question.
+
+    Retorna, por jogo, {"status": "playing"/"finished"/"give_up", "top": [(índice, prob)],
+    "pergunta": (attr, val) ou None}, mais "indice"/"prob"/"forced" quando termina.
+    """
+    base = base_de(dados)
+    resultados = []
+    for inicio in range(0, len(historicos), LOTE_INFERENCIA):
+        resultados.extend(_inferir_bloco(base, historicos[inicio:inicio + LOTE_INFERENCIA], k,
+                                         profundidade, beam_width, tempo_limite, livro))
+    return resultados
+
+def _inferir_bloco(base, historicos, k, profundidade, beam_width, tempo_limite, livro=None):
+    n_jogos, total, n_perguntas = len(historicos), len(base), len(base.perguntas)
+    contagens = {}
+    feitas = np.zeros((n_jogos, n_perguntas), dtype=bool)
+    log_probs = np.zeros((n_jogos, total))
+    utilizados = [set() for _ in range(n_jogos)]
+    assinatura = assinatura_modelo(base)
+    chaves, calculados = [], []
+
+    for b, historico in enumerate(historicos):
+        for attr, val, _ in historico:
+            utilizados[b].add((attr, val))
+            j = base.indice_perguntas.get((attr, val))
+            if j is not None:
+                feitas[b, j] = True
+        chave = ("posterior", assinatura, chave_respostas([h for h in historico if h[2] in LIKELIHOODS]))
+        chaves.append(chave)
+        guardado = _consultar_cache(chave)
+        if guardado is not None:
+            log_probs[b] = guardado
+            continue
+        calculados.append(b)
+        for attr, val, resp in historico:
+            j = base.indice_perguntas.get((attr, val))
+            if resp not in LIKELIHOODS:
+                continue # Se inválido, ignora (como atualizar_probabilidades)
+            if j is None:
+                p_tem, p_nao_tem = LIKELIHOODS[resp]
+                log_probs[b] += np.where(base.coluna(attr, val), np.log(p_tem), np.log(p_nao_tem))
+                continue
+            if resp not in contagens:
+                contagens[resp] = np.zeros((n_jogos, n_perguntas))
+            contagens[resp][b, j] += 1
+
+    # log P(H | respostas) = Somatório por código de (vezes respondida) x log P(código | H, pergunta)
+    for resp, cont in contagens.items():
+        log_probs += cont @ tabela_log_verossimilhanca(base, resp).T
+    for b in calculados:
+        guardado = log_probs[b].copy()
+        guardado.setflags(write=False)
+        CACHE_HISTORICO.put(chaves[b], guardado)
+
+    maximos = log_probs.max(axis=1, keepdims=True)
+    probs = np.exp(log_probs - maximos)
+    probs /= probs.sum(axis=1, keepdims=True)
+
+    k = min(k, total)
+    top = np.argpartition(-probs, k - 1, axis=1)[:, :k]
+    top = np.take_along_axis(top, np.argsort(-np.take_along_axis(probs, top, axis=1), axis=1, kind="stable"), axis=1)
+
+    resultados = []
+    for b, historico in enumerate(historicos):
+        top_b = [(int(i), float(probs[b, i])) for i in top[b]]
+        segundo = top_b[1][1] if len(top_b) > 1 else 0
+        parada = regra_parada(top_b[0][0], top_b[0][1], segundo, len(historico))
+        resultado = parada if parada is not None else {"status": "playing"}
+        resultado.update(top=top_b, pergunta=None)
+        resultados.append(resultado)
+
+    jogando = [b for b, r in enumerate(resultados) if r["status"] == "playing"]
+    if livro:
+        from livro_abertura import consultar_livro # livro_abertura importa este módulo
+        for b in jogando:
+            resultados[b]["pergunta"] = consultar_livro(livro, historicos[b])
+        buscar = [b for b in jogando if resultados[b]["pergunta"] is None]
+    else:
+        buscar = jogando
+    if not buscar:
+        return resultados
+
+    if profundidade <= 1:
+        tabelas, tabelas_tlogt = tabela_ramos_base(base)
+        scores = entropia_esperada_lote(probs[buscar], tabelas, tabelas_tlogt)
+        scores[feitas[buscar]] = np.inf
+        melhores = np.argmin(scores, axis=1)
+        for linha, b in enumerate(buscar):
+            if np.isfinite(scores[linha, melhores[linha]]):
+                resultados[b]["pergunta"] = base.perguntas[melhores[linha]]
+    else:
+        for b in buscar:
+            jogo = AkinatorBayes(base)
+            jogo.posterior = PosteriorLog(log_probs[b])
+            jogo.respostas = [(attr, val, resp) for attr, val, resp in historicos[b] if resp in LIKELIHOODS]
+            jogo.atributos_utilizados = utilizados[b]
+            resultados[b]["pergunta"] = jogo.obter_melhor_pergunta_lookahead(
+                profundidade=profundidade, beam_width=beam_width, tempo_limite=tempo_limite)
+
+    for b in jogando:
+        if resultados[b]["pergunta"] is None:
+            # Acabaram as perguntas úteis -> Chuta
+            indice, prob = resultados[b]["top"][0]
+            resultados[b].update(status="finished", indice=indice, prob=prob)
+    return resultados
+
+# --- Jogo automático (sem interface) ---
+
+def jogar_automatico(dados, responder, profundidade=PROFUNDIDADE_BUSCA, beam_width=None,
+                     tempo_limite=TEMPO_LIMITE_BUSCA, livro=None, pool=None, ao_perguntar=None):
+    """
+    Joga uma partida inteira seguindo o mesmo fluxo do /api/next_question:
+    Smart Stop -> Livro de Aberturas -> Lookahead. `responder(attr, val)` devolve o
+    código da resposta (s, n, i, p, pn). Retorna o resultado de `avaliar_parada`
+    acrescido de "perguntas", "historico" e "tempos" (latência de cada escolha).
+    `ao_perguntar(jogo, perguntas_feitas)`, se dado, é chamado antes de cada escolha.
+    """
+    if livro:
+        from livro_abertura import consultar_livro
+
+    jogo = AkinatorBayes(dados)
+    historico, tempos = [], []
+    while True:
+        parada = jogo.avaliar_parada(len(historico))
+        if parada is not None:
+            break
+        if ao_perguntar is not None:
+            ao_perguntar(jogo, len(historico))
+
+        inicio = time.perf_counter()
+        perg = consultar_livro(livro, historico) if livro else None
+        if perg is None:
+            perg = jogo.obter_melhor_pergunta_lookahead(profundidade=profundidade, beam_width=beam_width,
+                                                        tempo_limite=tempo_limite, pool=pool)
+        tempos.append(time.perf_counter() - inicio)
+
+        if not perg:
+            # Acabaram as perguntas úteis -> Chuta
+            indice, prob = jogo.top_candidatos(1)[0]
+            parada = {"status": "finished", "indice": indice, "prob": prob}
+            break
+
+        attr, val = perg
+        resp = responder(attr, val)
+        jogo.atributos_utilizados.add(perg)
+        jogo.atualizar_probabilidades(attr, val, resp)
+        historico.append((attr, val, resp))
+
+    parada.update(perguntas=len(historico), historico=historico, tempos=tempos)
+    return parada
+
 # --- Interface ---
 
 TEMPLATES_PERGUNTAS = {
@@ -344,13 +874,146 @@ def formatar_pergunta(atributo, valor):
         return f"O seu Pokémon tem a característica '{atributo}'?"
     return f"O seu Pokémon tem {atributo} igual a {valor}?"
 
-def main():
-    parser = argparse.ArgumentParser(description="Pokémon Akinator (Gen 1)")
-    parser.add_argument("-v", "--verbose", action="store_true", help="Ativar modo verbose (mostra probabilidades)")
-    args = parser.parse_args()
+# --- Modo em lote (roteiros de respostas / listas de alvos) ---
+
+def ler_roteiros(linhas, base):
+    """
+    Um roteiro por linha não vazia (linhas com # são comentários):
+      Pikachu / 25                        -> alvo (nome ou número da Pokédex, campo "numero"): respostas verdadeiras da base
+      s n p i                             -> respostas na ordem em que as perguntas vierem
+      {"alvo": "Pikachu"} / {"respostas": ["s", "n"]}  (JSON, com "id" opcional)
+    Retorna [{"linha", "id", "alvo", "respostas", "erro"}].
+    """
+    indices = {str(nome).lower(): i for i, nome in enumerate(base.nomes)}
+    por_numero = None # numero -> índice, montado só se algum alvo for numérico
+    roteiros = []
+    for numero, linha in enumerate(linhas, 1):
+        linha = linha.strip()
+        if not linha or linha.startswith("#"):
+            continue
+        roteiro = {"linha": numero, "id": None, "alvo": None, "respostas": None, "erro": None}
+        if linha.startswith("{"):
+            try:
+                item = json.loads(linha)
+            except ValueError:
+                item = {}
+            roteiro["id"] = item.get("id")
+            alvo, respostas = item.get("alvo"), item.get("respostas")
+        else:
+            tokens = linha.lower().split()
+            alvo, respostas = (None, tokens) if all(t in LIKELIHOODS for t in tokens) else (linha, None)
+
+        if isinstance(alvo, str) and alvo.strip().isdigit():
+            alvo = int(alvo)
+        if isinstance(alvo, int) and not isinstance(alvo, bool) and por_numero is None:
+            por_numero = {p["numero"]: i for i, p in enumerate(base.dados) if isinstance(p.get("numero"), int)}
+
+        if respostas is not None and isinstance(respostas, list):
+            roteiro["respostas"] = [str(r).lower() for r in respostas]
+        elif isinstance(alvo, int) and alvo in por_numero:
+            roteiro["alvo"] = por_numero[alvo]
+        elif isinstance(alvo, str) and alvo.strip().lower() in indices:
+            roteiro["alvo"] = indices[alvo.strip().lower()]
+        else:
+            roteiro["erro"] = f"Roteiro inválido ou Pokémon desconhecido: {linha[:80]}"
+        roteiros.append(roteiro)
+    return roteiros
+
+def jogar_lote(dados, roteiros, profundidade=1, beam_width=None, tempo_limite=TEMPO_LIMITE_BUSCA, livro=None):
+    """
+    Joga todos os roteiros em passo único: a cada rodada, um `inferir_lote` decide
+    parada e próxima pergunta de todos os jogos em andamento (o mesmo motor do
+    /api/batch, com o livro de aberturas se dado). Roteiro de respostas que acaba antes
+    do fim chuta o líder ("forced").
+    """
+    base = base_de(dados)
+    resultados = [None] * len(roteiros)
+    historicos = [[] for _ in roteiros]
+    for b, roteiro in enumerate(roteiros):
+        if roteiro["erro"] is not None:
+            resultados[b] = {"status": "erro", "erro": roteiro["erro"]}
+    andamento = [b for b in range(len(roteiros)) if resultados[b] is None]
+
+    while andamento:
+        saidas = inferir_lote(base, [historicos[b] for b in andamento], k=2, profundidade=profundidade,
+                              beam_width=beam_width, tempo_limite=tempo_limite, livro=livro)
+        proximos = []
+        for b, saida in zip(andamento, saidas):
+            if saida["status"] != "playing":
+                resultados[b] = saida
+                continue
+            attr, val = saida["pergunta"]
+            roteiro, historico = roteiros[b], historicos[b]
+            if roteiro["alvo"] is not None:
+                resp = "s" if base.coluna(attr, val)[roteiro["alvo"]] else "n"
+            elif len(historico) < len(roteiro["respostas"]):
+                resp = roteiro["respostas"][len(historico)]
+            else:
+                indice, prob = saida["top"][0]
+                resultados[b] = {"status": "finished", "indice": indice, "prob": prob, "forced": True}
+                continue
+            historico.append((attr, val, resp))
+            proximos.append(b)
+        andamento = proximos
+
+    saida = []
+    for roteiro, historico, r in zip(roteiros, historicos, resultados):
+        item = {"linha": roteiro["linha"], "status": r["status"], "perguntas": len(historico),
+                "historico": [list(h) for h in historico]}
+        if roteiro["id"] is not None:
+            item["id"] = roteiro["id"]
+        if r.get("indice") is not None:
+            item.update(resultado=base.nomes[r["indice"]], prob=r["prob"], forced=r.get("forced", False))
+        if roteiro["alvo"] is not None:
+            item["alvo"] = base.nomes[roteiro["alvo"]]
+            item["acertou"] = r.get("indice") == roteiro["alvo"]
+        if r["status"] == "erro":
+            item["erro"] = r["erro"]
+        saida.append(item)
+    return saida
+
+def _modo_lote(base, args):
+    linhas = []
+    for caminho in args.lote:
+        if caminho == "-":
+            linhas.extend(sys.stdin.read().splitlines())
+        else:
+            with open(caminho, "r", encoding="utf-8") as f:
+                linhas.extend(f.read().splitlines())
+
+    livro = {}
+    if not args.sem_livro:
+        from livro_abertura import carregar_livro
+        livro = carregar_livro(base)
+
+    inicio = time.perf_counter()
+    roteiros = ler_roteiros(linhas, base)
+    resultados = jogar_lote(base, roteiros, profundidade=args.profundidade or 1, beam_width=args.beam, livro=livro)
+    duracao = time.perf_counter() - inicio
+
+    saida = open(args.saida, "w", encoding="utf-8") if args.saida else sys.stdout
+    try:
+        for r in resultados:
+            saida.write(json.dumps(r, ensure_ascii=False) + "\n")
+    finally:
+        if saida is not sys.stdout:
+            saida.close()
+
+    com_alvo = [r for r in resultados if "acertou" in r]
+    resumo = f"{len(resultados)} jogos em {duracao:.2f}s ({len(resultados) / max(duracao, 1e-9):.0f} jogos/s)"
+    if com_alvo:
+        resumo += f" | acurácia {sum(r['acertou'] for r in com_alvo) / len(com_alvo) * 100:.1f}% ({len(com_alvo)} com alvo)"
+    erros = sum(r["status"] == "erro" for r in resultados)
+    if erros:
+        resumo += f" | {erros} roteiros inválidos"
+    print(resumo, file=sys.stderr)
+
+def _modo_interativo(base, args):
+    from livro_abertura import carregar_livro
+    livro = carregar_livro(base)
 
     print("\n" + "="*50)
-    print("   POKÉMON AKINATOR (GEN 1) - 151 Mons")
+    print(f"   POKÉMON AKINATOR (GEN 1) - {len(base)} Mons")
     print("="*50)
     print("Responda com:")
     print(" [s] Sim")
@@ -360,79 +1023,77 @@ def main():
     print(" [pn] Provavelmente Não")
     print("="*50)
 
-    while True:
-        dados = carregar_dados()
-        if not dados:
-            print("Erro: Base de dados vazia! Rode o import_csv.py primeiro.")
-            return
+    def mostrar_top(jogo, perguntas_feitas):
+        # Modo Verbose: Top 10 (só o conjunto ativo, sem ordenar a base toda)
+        print(f"\n--- Top 10 Candidatos (Pergunta {perguntas_feitas+1}) ---")
+        for i, (cand, prob) in enumerate(jogo.top_candidatos(10)):
+            print(f"{i+1}. {base.nomes[cand]}: {prob*100:.2f}%")
+        print("-" * 40)
 
-        jogo = AkinatorBayes(dados)
-        
+    while True:
         input("\nPressione ENTER para começar...")
-        
         perguntas_feitas = 0
-        vencedor_encontrado = False
 
-        while perguntas_feitas < 20: 
-            # Ordenar candidatos por probabilidade
-            zipped_candidates = sorted(zip(jogo.dados, jogo.probs), key=lambda x: x[1], reverse=True)
-            max_prob = zipped_candidates[0][1]
-            
-            # Modo Verbose: Top 10
-            if args.verbose:
-                print(f"\n--- Top 10 Candidatos (Pergunta {perguntas_feitas+1}) ---")
-                for i in range(min(10, len(zipped_candidates))):
-                    cand, prob = zipped_candidates[i]
-                    print(f"{i+1}. {cand['nome']}: {prob*100:.2f}%")
-                print("-" * 40)
-            
-            # Condição de Parada: Incerteza total (< 5%)
-            if perguntas_feitas > 5 and max_prob < 0.05:
-                print("\nDesisto! Não sei que Pokémon é esse.")
-                vencedor_encontrado = False 
-                break
-
-            # Checar confiança alta
-            if max_prob > 0.90:
-                break
-            
-            melhor_perg = jogo.obter_melhor_pergunta()
-            if not melhor_perg:
-                break
-                
-            attr, val = melhor_perg
-            jogo.atributos_utilizados.add(melhor_perg)
-            
+        def responder(attr, val):
+            nonlocal perguntas_feitas
             txt = formatar_pergunta(attr, val)
-            
             # Loop de validação de input
             while True:
                 resp = input(f"[Q:{perguntas_feitas+1}] {txt} [s/n/i/p/pn]: ").strip().lower()
                 if resp in LIKELIHOODS:
                     break
                 print("Opção inválida! Use s, n, i, p, ou pn.")
-            
-            jogo.atualizar_probabilidades(attr, val, resp)
-            
             perguntas_feitas += 1
-        
+            return resp
+
+        resultado = jogar_automatico(base, responder, profundidade=args.profundidade or PROFUNDIDADE_BUSCA,
+                                     beam_width=args.beam, livro=livro,
+                                     ao_perguntar=mostrar_top if args.verbose else None)
+        historico = [{"atributo": attr, "valor": val, "resposta": resp} for attr, val, resp in resultado["historico"]]
+
         # Resultado Final
-        zipped = sorted(zip(jogo.dados, jogo.probs), key=lambda x: x[1], reverse=True)
-        vencedor = zipped[0][0]
-        prob = zipped[0][1]
-        
-        if prob < 0.05:
-            pass
+        if resultado["status"] == "give_up":
+            print("\nDesisto! Não sei que Pokémon é esse.")
+            nome = input("Qual era? (ENTER para pular): ").strip()
         else:
+            vencedor = base.nomes[resultado["indice"]]
             print("\n" + "="*50)
-            print(f"🎉 É o **{vencedor['nome'].upper()}**! ({prob*100:.1f}%)")
+            print(f"🎉 É o **{vencedor.upper()}**! ({resultado['prob']*100:.1f}%)")
             print("="*50)
-            
-            if input("Acertei? (s/n): ").lower() != 's':
-                print("...")
-                
+            if input("Acertei? (s/n): ").lower() == 's':
+                nome = vencedor
+            else:
+                nome = input("Qual era? (ENTER para pular): ").strip()
+        if nome:
+            registrar_feedback(nome, historico)
+
         if input("\nJogar dnv? (s/n): ").lower() != 's':
             break
 
+def main():
+    parser = argparse.ArgumentParser(description="Pokémon Akinator (Gen 1)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Ativar modo verbose (mostra probabilidades)")
+    parser.add_argument("--lote", nargs="+", metavar="ARQUIVO",
+                        help="Modo não interativo: joga os roteiros dos arquivos ('-' = stdin), um por linha "
+                             "(nome ou número da Pokédex do alvo, ou respostas 's n p ...'), e escreve um JSON por "
+                             "jogo. Mesmo fluxo do servidor: Smart Stop -> Livro de Aberturas -> Lookahead")
+    parser.add_argument("--profundidade", type=int, default=None,
+                        help=f"Profundidade da busca (padrão: {PROFUNDIDADE_BUSCA}; 1 no modo em lote)")
+    parser.add_argument("--beam", type=int, default=None, help="Beam da raiz do Lookahead (padrão: todas as candidatas)")
+    parser.add_argument("--sem-livro", action="store_true", help="Modo em lote sem o Livro de Aberturas (só o Lookahead)")
+    parser.add_argument("-o", "--saida", help="Arquivo de saída do modo em lote (padrão: stdout)")
+    args = parser.parse_args()
+
+    # Base compilada (pokemon_db.kb via mmap): sem reler o JSON a cada partida
+    base = carregar_base()
+    if not base:
+        print("Erro: Base de dados vazia! Rode o import_csv.py primeiro.")
+        return
+
+    if args.lote:
+        _modo_lote(base, args)
+    else:
+        _modo_interativo(base, args)
+
 if __name__ == "__main__":
     main()
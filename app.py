@@ -1,119 +1,267 @@
 
-from flask import Flask, render_template, request, jsonify, session
-from akinator_gen1 import AkinatorBayes, carregar_dados, LIKELIHOODS, formatar_pergunta, TEMPLATES_PERGUNTAS
+from flask import Flask, render_template, request, jsonify, session, g, Response
+from akinator_gen1 import AkinatorBayes, CACHE_HISTORICO, inferir_lote, LIKELIHOODS, TEMPO_LIMITE_BUSCA, formatar_pergunta, TEMPLATES_PERGUNTAS
+from livro_abertura import chave_historico, consultar_livro
+from modelo import GerenciadorModelo, INTERVALO_VERIFICACAO
+from sessoes import EstadoJogo, criar_store, novo_id_jogo
+from especulacao import Especulador, ESPECULACAO_WORKERS
+from busca_paralela import PoolBusca
+from executor_busca import ExecutorLimitado, Sobrecarga, BUSCAS_SIMULTANEAS, PRAZO_REQUISICAO
+from metricas import METRICAS, contar, medir
+from posterior import PosteriorLog
+from functools import partial
+import json
 import os
+import time
 
 app = Flask(__name__)
 app.secret_key = "super_secret_pokemon_key"
 
-# --- Dados Globais (Carrega uma vez) ---
-DADOS = carregar_dados()
+# --- Modelo (base + calibração + livro), trocado a quente sem reiniciar ---
+# Base compilada e mapeada em memória (pokemon_db.kb): com `gunicorn --preload`
+# todos os workers compartilham as mesmas páginas. Jogos novos usam MODELO.atual;
+# jogos em andamento continuam na versão em que começaram, que só é aposentada
+# quando nenhum jogo guardado a usa mais (ver modelo.py).
+# AKINATOR_RECARGA=<segundos> entre verificações dos arquivos (0 desliga).
+
+# Estado dos jogos fica no servidor; o cookie só guarda o "game_id"
+JOGOS = criar_store()
+
+MODELO = GerenciadorModelo(em_uso=JOGOS.versoes_em_uso)
+
+# Lookahead em paralelo (processos com a base pré-carregada). AKINATOR_PROCESSOS_BUSCA=<n>;
+# 0 (padrão) mantém a busca no próprio worker. Os processos sobem no primeiro uso, em cada
+# worker (ver busca_paralela.py); se falham ou estouram o prazo, a busca volta a ser sequencial.
+_PROCESSOS_BUSCA = int(os.environ.get("AKINATOR_PROCESSOS_BUSCA", 0))
+POOL_BUSCA = PoolBusca(_PROCESSOS_BUSCA) if _PROCESSOS_BUSCA > 0 else None
+
+# Próxima pergunta pré-calculada em background para cada resposta possível.
+# Fica na memória do processo: com vários workers, uma resposta atendida por
+# outro worker só perde o atalho. AKINATOR_ESPECULACAO=0 desliga.
+_WORKERS_ESPECULACAO = int(os.environ.get("AKINATOR_ESPECULACAO", ESPECULACAO_WORKERS))
+ESPECULADOR = Especulador(_WORKERS_ESPECULACAO) if _WORKERS_ESPECULACAO > 0 else None
+
+# Verificação dos arquivos do modelo (a thread sobe no primeiro pedido de cada worker)
+_INTERVALO_RECARGA = float(os.environ.get("AKINATOR_RECARGA", INTERVALO_VERIFICACAO))
+if _INTERVALO_RECARGA > 0:
+    MODELO.iniciar(_INTERVALO_RECARGA)
+
+# Busca do /api/next_question num pool limitado de threads, com prazo por requisição
+# (estourou -> pergunta de Depth 1) e recusa imediata (503) com a fila cheia.
+# AKINATOR_BUSCAS_SIMULTANEAS=<n> (0 = busca na própria thread da requisição),
+# AKINATOR_FILA_MAX=<tarefas>, AKINATOR_PRAZO=<segundos>.
+_BUSCAS_SIMULTANEAS = int(os.environ.get("AKINATOR_BUSCAS_SIMULTANEAS", BUSCAS_SIMULTANEAS))
+_FILA_MAX = int(os.environ["AKINATOR_FILA_MAX"]) if os.environ.get("AKINATOR_FILA_MAX") else None
+EXECUTOR = ExecutorLimitado(_BUSCAS_SIMULTANEAS, _FILA_MAX) if _BUSCAS_SIMULTANEAS > 0 else None
+PRAZO = float(os.environ.get("AKINATOR_PRAZO", PRAZO_REQUISICAO))
+
+# Perfil por requisição: header "X-Akinator-Perfil: 1" ou AKINATOR_PERFIL=1 para todas.
+# As etapas voltam no header Server-Timing e o perfil completo vai para o log.
+PERFIL_SEMPRE = os.environ.get("AKINATOR_PERFIL") == "1"
+
+@app.before_request
+def iniciar_medicao():
+    g.inicio = time.perf_counter()
+    if PERFIL_SEMPRE or request.headers.get("X-Akinator-Perfil") == "1":
+        METRICAS.iniciar_perfil()
+
+@app.after_request
+def encerrar_medicao(response):
+    METRICAS.observar(f"http.{request.endpoint}", time.perf_counter() - g.inicio)
+    perfil = METRICAS.encerrar_perfil()
+    if perfil is not None:
+        response.headers["Server-Timing"] = ", ".join(
+            f"{nome.replace('.', '-')};dur={segundos * 1000:.3f}" for nome, segundos in perfil["etapas"])
+        app.logger.info("perfil %s %s", request.path, json.dumps(perfil))
+    return response
+
+@app.route("/metrics")
+def metrics():
+    if request.args.get("formato") == "json":
+        resumo = METRICAS.resumo()
+        resumo["cache_historico"] = CACHE_HISTORICO.estatisticas()
+        resumo["modelo"] = {"atual": MODELO.atual.id if MODELO.atual else None, "versoes": MODELO.versoes(),
+                            "livro": len(MODELO.atual.livro) if MODELO.atual else 0}
+        if EXECUTOR:
+            resumo["executor"] = {"workers": EXECUTOR.workers, "max_fila": EXECUTOR.max_fila, "pendentes": EXECUTOR.pendentes,
+                                  "recusadas": EXECUTOR.recusadas, "degradadas": EXECUTOR.degradadas}
+        return jsonify(resumo)
+    return Response(METRICAS.texto_prometheus(), mimetype="text/plain; version=0.0.4")
+
+def estado_atual():
+    """ Estado do jogo da sessão, ou None (sem jogo, expirado ou de uma versão do modelo já aposentada). """
+    id_jogo = session.get("game_id")
+    if not id_jogo:
+        return None
+    with medir("sessao.get"):
+        estado = JOGOS.get(id_jogo)
+    if estado is not None and MODELO.obter(estado.versao) is None:
+        contar("modelo.jogos_orfaos")
+        return None
+    return estado
+
+def modelo_indisponivel():
+    """ Nenhuma versão do modelo carregada (base vazia ou ausente): 503, o cliente tenta de novo depois. """
+    contar("modelo.indisponivel")
+    return jsonify({"error": "Banco de dados vazio"}), 503, {"Retry-After": str(max(1, int(_INTERVALO_RECARGA)))}
+
+def versao_de(estado):
+    return MODELO.obter(estado.versao)
+
+def salvar_estado(estado):
+    with medir("sessao.put"):
+        JOGOS.put(session["game_id"], estado)
+
+def historico_de(estado):
+    return [(h["atributo"], h["valor"], h["resposta"]) for h in estado.historico]
+
+def jogo_de(estado):
+    """ Reconstitui o objeto Akinator (estado efêmero + posterior persistido) na versão do jogo. """
+    jogo = AkinatorBayes(versao_de(estado).base)
+    jogo.posterior = PosteriorLog(estado.log_probs, estado.vista_top)
+    jogo.respostas = [h for h in historico_de(estado) if h[2] in LIKELIHOODS] # Chave do cache por histórico
+    jogo.atributos_utilizados = set(tuple(x) for x in estado.atributos_utilizados)
+    return jogo
+
+def escolher_pergunta(versao, jogo, historico, pool=None, executar=None):
+    """
+    Livro de Aberturas (jogadas iniciais pré-calculadas offline) ou, fora dele, o Lookahead.
+    `executar(busca)`, se dado, decide onde e com que prazo a busca roda (ver `buscar_no_prazo`).
+    """
+    melhor_perg = consultar_livro(versao.livro, historico)
+    if melhor_perg is not None:
+        contar("livro.acertos")
+    # Depth=2 significa: Avalia pergunta atual + 1 futuro turno.
+    if melhor_perg is None:
+        busca = partial(jogo.obter_melhor_pergunta_lookahead, profundidade=2, pool=pool)
+        melhor_perg = busca() if executar is None else executar(busca)
+    return melhor_perg
+
+def buscar_no_prazo(estado, prazo, busca):
+    """ Roda a `busca` no EXECUTOR; passado o `prazo`, responde com a melhor pergunta de Depth 1. """
+    tempo_limite = max(min(TEMPO_LIMITE_BUSCA, prazo - time.perf_counter()), 0.0)
+    return EXECUTOR.executar(partial(busca, tempo_limite=tempo_limite), prazo, partial(pergunta_depth1, estado))
+
+def pergunta_depth1(estado):
+    """ Alternativa barata (um produto matriz-vetor) para quando a busca não cabe no prazo. """
+    return jogo_de(estado).obter_melhor_pergunta_lookahead(profundidade=1, tempo_limite=None)
+
+def _pergunta_especulativa(versao, log_probs, atributos_utilizados, perguntas_feitas, historico):
+    """ O que /api/next_question escolheria depois da última resposta (hipotética) do histórico. """
+    with METRICAS.prefixo("especulacao"): # Fora das métricas de latência das requisições
+        jogo = AkinatorBayes(versao.base)
+        jogo.posterior = PosteriorLog(log_probs)
+        jogo.respostas = [h for h in historico[:-1] if h[2] in LIKELIHOODS] # Chave do cache por histórico
+        jogo.atributos_utilizados = set(atributos_utilizados)
+        attr, val, resp = historico[-1]
+        jogo.atualizar_probabilidades(attr, val, resp)
+        if jogo.avaliar_parada(perguntas_feitas) is not None:
+            return None # O jogo vai terminar: nada a buscar
+        return escolher_pergunta(versao, jogo, historico) # Sem o pool: não disputa processos com pedidos ao vivo
+
+def especular(id_jogo, estado, pergunta):
+    """ Agenda a próxima pergunta para cada resposta a `pergunta` (s/n primeiro, as mais comuns). """
+    historico = historico_de(estado)
+    atributos = set(tuple(x) for x in estado.atributos_utilizados) | {tuple(pergunta)}
+    tarefas = {}
+    for resp in ("s", "n", "i", "p", "pn"):
+        hipotese = historico + [(pergunta[0], pergunta[1], resp)]
+        tarefas[chave_historico(hipotese)] = partial(_pergunta_especulativa, versao_de(estado), estado.log_probs,
+                                                     atributos, estado.perguntas_feitas + 1, hipotese)
+    ESPECULADOR.agendar(id_jogo, tarefas)
 
 @app.route("/")
 def index():
     # Limpa sessão ao iniciar novo jogo
+    if "game_id" in session:
+        JOGOS.delete(session["game_id"])
+        if ESPECULADOR:
+            ESPECULADOR.descartar(session["game_id"])
     session.clear()
     return render_template("index.html")
 
 @app.route("/game")
 def game():
-    # Se não tem jogo iniciado, inicializa
-    if "perguntas_feitas" not in session:
-        session["perguntas_feitas"] = 0
-        session["atributos_utilizados"] = [] # Lista de (attr, val)
-        session["probs"] = [1.0 / len(DADOS)] * len(DADOS) # Probabilidades iniciais
-        session["historico"] = [] # Para debug/log se quiser
+    # Se não tem jogo iniciado (ou ele expirou), inicializa
+    versao = MODELO.atual
+    if estado_atual() is None and versao is not None:
+        session["game_id"] = novo_id_jogo()
+        salvar_estado(EstadoJogo.novo(len(versao.base), versao.id)) # Probabilidades iniciais
 
     return render_template("game.html")
 
 @app.route("/api/next_question", methods=["POST"])
 def next_question():
-    if not DADOS:
-        return jsonify({"error": "Banco de dados vazio"}), 500
-
-    # Recupera estado da sessão
-    probs = session.get("probs")
-    atributos_utilizados_raw = session.get("atributos_utilizados", [])
-    # Reconstrói set de tuplas para o motor
-    atributos_utilizados = set(tuple(x) for x in atributos_utilizados_raw)
-    perguntas_feitas = session.get("perguntas_feitas", 0)
-
-    # Reconstitui objeto Akinator (estado efêmero + probs persistidas)
-    jogo = AkinatorBayes(DADOS)
-    jogo.probs = probs
-    jogo.atributos_utilizados = atributos_utilizados
-
-    # 1. Checa Condições de Parada
-    
-    # Ordenar candidatos
-    zipped = sorted(zip(jogo.dados, jogo.probs), key=lambda x: x[1], reverse=True)
-    best_cand = zipped[0][0]
-    best_prob = zipped[0][1]
-
-    second_prob = 0
-    if len(zipped) > 1:
-        second_prob = zipped[1][1]
-
-    # --- CONDIÇÕES DE PARADA INTELIGENTES (SMART STOP) ---
-    
-    # 1. Certeza Absoluta
-    win_absolute = best_prob > 0.80
+    if not MODELO.atual:
+        return modelo_indisponivel()
 
-    # 2. Dominância Relativa (Gap Rule)
-    # Se o líder tem > 60% e é 4x mais provável que o segundo colocado.
-    win_relative = (best_prob > 0.60 and best_prob > 4 * second_prob)
-    
-    # 3. Fim de Jogo "Soft" (Após 15 perguntas, fica menos exigente)
-    win_late_game = (perguntas_feitas > 15 and best_prob > 0.55 and best_prob > 2 * second_prob)
+    # Recupera estado do jogo (e a versão do modelo em que ele começou)
+    estado = estado_atual()
+    if estado is None:
+        return jsonify({"error": "Nenhum jogo ativo"}), 400
+    perguntas_feitas = estado.perguntas_feitas
+    versao = versao_de(estado)
+    base = versao.base
+    jogo = jogo_de(estado)
 
-    if win_absolute or win_relative or win_late_game:
-        return jsonify({
+    # 1. Checa Condições de Parada (Smart Stop, lidas do top-k do posterior)
+    parada = jogo.avaliar_parada(perguntas_feitas)
+    if parada is not None:
+        if parada["status"] == "give_up":
+            return jsonify({"status": "give_up"})
+        resposta = {
             "status": "finished",
-            "result": best_cand["nome"],
-            "image": best_cand.get("imagem", ""), # Se tiver campo imagem
-            "prob": best_prob
-        })
+            "result": base.nomes[parada["indice"]],
+            "image": base.imagens[parada["indice"]], # Se tiver campo imagem
+            "prob": parada["prob"]
+        }
+        if parada.get("forced"):
+            resposta["forced"] = True
+        return jsonify(resposta)
 
-    # Derrota (Muito incerto após 10 perguntas)
-    if perguntas_feitas > 10 and best_prob < 0.05:
-        return jsonify({
-            "status": "give_up"
-        })
-        
-    # Limite de perguntas (20)
-    if perguntas_feitas >= 20:
-        # Chuta o melhor mesmo assim
-        return jsonify({
-            "status": "finished",
-            "result": best_cand["nome"],
-            "prob": best_prob,
-            "forced": True
-        })
-
-    # 2. Obtém Próxima Pergunta (Com Lookahead e Beam Search)
-    # Depth=2 significa: Avalia pergunta atual + 1 futuro turno.
-    melhor_perg = jogo.obter_melhor_pergunta_lookahead(profundidade=2, beam_width=5)
+    # 2. Obtém Próxima Pergunta
+    # Se a especulação já calculou este estado, é só ler; senão Livro de Aberturas / Lookahead
+    # (a busca respeita o prazo da requisição, ver `buscar_no_prazo`)
+    historico = historico_de(estado)
+    prazo = g.inicio + PRAZO
+    achou = False
+    if ESPECULADOR:
+        espera = max(min(TEMPO_LIMITE_BUSCA, prazo - time.perf_counter()), 0.0)
+        achou, melhor_perg = ESPECULADOR.obter(session["game_id"], chave_historico(historico), espera=espera)
+    if not achou:
+        try:
+            melhor_perg = escolher_pergunta(versao, jogo, historico, POOL_BUSCA,
+                                            partial(buscar_no_prazo, estado, prazo) if EXECUTOR else None)
+        except Sobrecarga:
+            # Fila cheia: recusa já, em vez de aumentar a latência de todo mundo
+            return jsonify({"error": "Servidor ocupado, tente novamente"}), 503, {"Retry-After": "1"}
     
     # Preparar dados de Verbose (Top 10 Candidatos)
+    top = jogo.top_candidatos(10)
     top_candidates = []
-    for cand, prob in zipped[:10]:
+    for cand, prob in top:
         top_candidates.append({
-            "nome": cand["nome"],
+            "nome": base.nomes[cand],
             "prob": round(prob * 100, 2)
         })
 
     if not melhor_perg:
         # Acabaram as perguntas úteis -> Chuta
+        best_idx, best_prob = top[0]
         return jsonify({
             "status": "finished",
-            "result": best_cand["nome"],
+            "result": base.nomes[best_idx],
             "prob": best_prob
         })
 
     attr, val = melhor_perg
     
     # 3. Salva estado temporário (ainda não respondido)
-    session["current_question"] = [attr, val]
+    estado.pergunta_atual = [attr, val]
+    estado.vista_top = jogo.posterior.vista_top
+    salvar_estado(estado)
+    if ESPECULADOR:
+        especular(session["game_id"], estado, (attr, val))
     
     # 4. Formata Texto
     texto_pergunta = formatar_pergunta(attr, val)
@@ -130,48 +278,105 @@ def answer():
     data = request.json
     resposta = data.get("answer") # s, n, i, p, pn
     
-    current_q = session.get("current_question")
+    estado = estado_atual()
+    current_q = estado.pergunta_atual if estado else None
     if not current_q:
         return jsonify({"error": "Nenhuma pergunta ativa"}), 400
         
     attr, val = current_q
     
-    # Recupera Akinator
-    probs = session.get("probs")
-    jogo = AkinatorBayes(DADOS)
-    jogo.probs = probs
+    # Recupera Akinator (na versão do modelo em que o jogo começou)
+    jogo = AkinatorBayes(versao_de(estado).base)
+    jogo.posterior = PosteriorLog(estado.log_probs, estado.vista_top)
     
-    # Atualiza Probabilidades
+    # Atualiza Probabilidades (soma a coluna de log-verossimilhança; a vista de líderes só ajusta o teto)
     jogo.atualizar_probabilidades(attr, val, resposta)
     
-    # Atualiza Sessão
-    session["probs"] = jogo.probs
-    session["perguntas_feitas"] = session.get("perguntas_feitas", 0) + 1
+    # Atualiza Estado
+    estado.log_probs = jogo.posterior.log_probs
+    estado.vista_top = jogo.posterior.vista_top
+    estado.perguntas_feitas += 1
     
     # Adiciona aos utilizados (set antigo para logica)
-    utilizados = session.get("atributos_utilizados", [])
-    utilizados.append([attr, val])
-    session["atributos_utilizados"] = utilizados
+    estado.atributos_utilizados.append([attr, val])
     
     # Salva histórico detalhado para aprendizado
-    hist = session.get("historico_anotado", [])
-    hist.append({
+    estado.historico.append({
         "atributo": attr,
         "valor": val,
         "resposta": resposta
     })
-    session["historico_anotado"] = hist
     
     # Limpa pergunta atual
-    session.pop("current_question", None)
+    estado.pergunta_atual = None
+    salvar_estado(estado)
+
+    # Só a especulação da resposta dada continua valendo
+    if ESPECULADOR:
+        ESPECULADOR.descartar(session["game_id"], exceto=chave_historico(historico_de(estado)))
     
     return jsonify({"status": "ok"})
 
+MAX_JOGOS_LOTE = 1000 # Jogos por chamada do /api/batch
+
+@app.route("/api/batch", methods=["POST"])
+def batch():
+    """
+    Inferência sem estado para muitos jogos (bots/integrações), sem cookie:
+    {"jogos": [[[attr, val, código], ...], ...], "k": 10}
+    -> {"resultados": [{"status", "top": [{"nome", "prob"}], "pergunta": {...} ou null, ...}]}
+    """
+    versao = MODELO.atual # Sem estado: sempre a versão atual
+    if not versao:
+        return modelo_indisponivel()
+    base = versao.base
+    data = request.get_json(silent=True) or {}
+    jogos = data.get("jogos")
+    if not isinstance(jogos, list):
+        return jsonify({"error": "Campo 'jogos' deve ser uma lista de históricos"}), 400
+    if len(jogos) > MAX_JOGOS_LOTE:
+        return jsonify({"error": f"No máximo {MAX_JOGOS_LOTE} jogos por chamada"}), 413
+    try:
+        historicos = [[(attr, val, resp) for attr, val, resp in historico] for historico in jogos]
+        k = max(1, int(data.get("k", 10)))
+        for historico in historicos:
+            for attr, val, resp in historico:
+                if not isinstance(attr, str) or not isinstance(val, (str, bool, int, float)) or \
+                   not isinstance(resp, str) or resp not in LIKELIHOODS:
+                    raise ValueError(attr)
+    except (TypeError, ValueError):
+        return jsonify({"error": f"Histórico inválido: use [atributo, valor, código] com código em {list(LIKELIHOODS)}"}), 400
+
+    with medir("lote.inferencia"):
+        resultados = inferir_lote(base, historicos, k=k, livro=versao.livro)
+    contar("lote.jogos", len(historicos))
+
+    saida = []
+    for r in resultados:
+        item = {
+            "status": r["status"],
+            "top": [{"nome": base.nomes[i], "prob": round(p * 100, 2)} for i, p in r["top"]],
+            "pergunta": None
+        }
+        if r["pergunta"] is not None:
+            attr, val = r["pergunta"]
+            item["pergunta"] = {"atributo": attr, "valor": val, "texto": formatar_pergunta(attr, val)}
+        if r["status"] == "finished":
+            item["result"] = base.nomes[r["indice"]]
+            item["prob"] = r["prob"]
+            if r.get("forced"):
+                item["forced"] = True
+        saida.append(item)
+    return jsonify({"resultados": saida})
+
 @app.route("/result")
 def result():
+    versao = MODELO.atual
+    if not versao:
+        return modelo_indisponivel()
     cand_nome = request.args.get("pokemon")
     # Busca a lista completa para o dropdown de correção
-    lista_nomes = sorted([p["nome"] for p in DADOS])
+    lista_nomes = sorted(versao.base.nomes)
     return render_template("result.html", pokemon=cand_nome, todos_pokemons=lista_nomes)
 
 @app.route("/api/feedback", methods=["POST"])
@@ -180,7 +385,8 @@ def feedback():
     pokemon_real = data.get("pokemon_real")
     acertou = data.get("acertou")
     
-    historico_detalhado = session.get("historico_anotado", [])
+    estado = estado_atual()
+    historico_detalhado = estado.historico if estado else []
     
     from akinator_gen1 import registrar_feedback
     registrar_feedback(pokemon_real, historico_detalhado)
@@ -188,4 +394,5 @@ def feedback():
     return jsonify({"status": "logged"})
 
 if __name__ == "__main__":
-    app.run(debug=True)
+    # Uma thread por requisição; a CPU da busca fica limitada pelo EXECUTOR
+    app.run(debug=os.environ.get("FLASK_DEBUG") == "1", threaded=True)
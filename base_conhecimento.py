@@ -0,0 +1,565 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from cache import CacheLRU
+
+# Base de Conhecimento compilada: o JSON vira índices de atributos, um bitmap de
+# features (1 bit por pokémon x pergunta) e a tabela de perguntas candidatas.
+# A compilação é gravada em um arquivo binário (<base>.kb) que é aberto via mmap,
+# então workers forkados (gunicorn) compartilham as mesmas páginas e o startup
+# não precisa parsear o JSON enquanto a base não mudar.
+
+MAGICO = b"AKKB\x00\x01\x00\x00"
+ALINHAMENTO = 64
+
+# --- Esquema de Atributos ---
+# Cada atributo sabe gerar suas perguntas candidatas e sua coluna de feature, então uma
+# base nova (outra geração, outro domínio) só precisa declarar o esquema.
+
+class Atributo:
+    """
+    booleano:      pergunta única (nome, True); chave ausente conta como False.
+    categorico:    uma pergunta por valor distinto do campo (ex.: cor).
+    multivalorado: uma pergunta por valor, presente em QUALQUER um dos campos (ex.: tipo/tipo2).
+    derivado:      pergunta única (nome, True) sobre `funcao(registro)` (ex.: evolui).
+    """
+
+    def __init__(self, nome, tipo, campos=None, funcao=None):
+        self.nome = nome
+        self.tipo = tipo
+        self.campos = tuple(campos or (nome,))
+        self.funcao = funcao
+
+    def valores(self, registro):
+        """ Valores do registro para este atributo (vazio = sem valor). """
+        if self.tipo == "booleano":
+            return [registro.get(self.nome, False)]
+        if self.tipo == "derivado":
+            return [self.funcao(registro)]
+        valores = []
+        for campo in self.campos:
+            v = registro.get(campo)
+            if isinstance(v, list):
+                valores.extend(v)
+            elif v not in (None, ""):
+                valores.append(v)
+        return valores
+
+    def tem(self, registro, val):
+        return any(v == val for v in self.valores(registro))
+
+    def vocabulario(self, dados):
+        return sorted(set(v for p in dados for v in self.valores(p)))
+
+    def perguntas(self, dados):
+        if self.tipo in ("booleano", "derivado"):
+            return [(self.nome, True)]
+        return [(self.nome, v) for v in self.vocabulario(dados)]
+
+    def assinatura(self):
+        return f"{self.nome}:{self.tipo}:{','.join(self.campos)}"
+
+BOOLEANOS_POKEMON = ["lendario", "inicial", "bipede", "tem_cauda", "tem_asas", "tem_chifre", "tem_pelo", "flutua", "tem_casco", "evolui_com_pedra"]
+
+ESQUEMA_POKEMON = [
+    # Se perguntamos "É tipo Fogo?", vale True se Primary OU Secondary for Fogo
+    Atributo("tipo", "multivalorado", campos=("tipo", "tipo2")),
+    Atributo("evolui", "derivado", funcao=lambda p: bool(p.get("evolui"))),
+    Atributo("cor", "categorico"),
+] + [Atributo(b, "booleano") for b in BOOLEANOS_POKEMON]
+
+CAMPOS_IGNORADOS = ("numero", "nome", "imagem")
+MAX_CATEGORIAS = 64 # Campos texto com mais valores que isso não viram perguntas
+
+def inferir_esquema(dados, esquema=None):
+    """
+    Esquema declarado + atributos descobertos nos dados: campos só com bool viram
+    booleanos e campos texto de baixa cardinalidade viram categóricos.
+    """
+    esquema = list(ESQUEMA_POKEMON if esquema is None else esquema)
+    cobertos = campos_cobertos(esquema)
+
+    valores = {}
+    for p in dados:
+        for chave, v in p.items():
+            if chave not in cobertos:
+                valores.setdefault(chave, set()).add(v if not isinstance(v, list) else tuple(v))
+    return completar_esquema(esquema, valores)
+
+def campos_cobertos(esquema):
+    cobertos = set(CAMPOS_IGNORADOS)
+    for attr in esquema:
+        cobertos.add(attr.nome)
+        cobertos.update(attr.campos)
+    return cobertos
+
+def completar_esquema(esquema, valores):
+    """ Esquema declarado + um atributo por campo descoberto (`valores`: campo -> valores vistos). """
+    esquema = list(esquema)
+    cobertos = campos_cobertos(esquema)
+    for chave in sorted(valores):
+        vistos = set(valores[chave])
+        if chave in cobertos or not vistos:
+            continue
+        if all(isinstance(v, bool) for v in vistos):
+            esquema.append(Atributo(chave, "booleano"))
+        elif all(isinstance(v, str) for v in vistos) and 2 <= len(vistos - {""}) <= MAX_CATEGORIAS:
+            esquema.append(Atributo(chave, "categorico"))
+    return esquema
+
+def assinatura_esquema(esquema=None):
+    esquema = ESQUEMA_POKEMON if esquema is None else esquema
+    return hashlib.sha1("|".join(a.assinatura() for a in esquema).encode("utf-8")).hexdigest()
+
+_ESQUEMA_POR_NOME = {a.nome: a for a in ESQUEMA_POKEMON}
+
+# Verifica se o pokemon tem a característica desejada.
+
+def tem_caracteristica(pokemon, attr, val):
+    spec = _ESQUEMA_POR_NOME.get(attr)
+    if spec is not None:
+        return spec.tem(pokemon, val)
+
+    # Booleanos Genéricos (e atributos fora do esquema)
+    # Se a chave não existir no JSON do pokemon, assumimos False por segurança
+    return pokemon.get(attr, False) == val
+
+def gerar_perguntas_candidatas(dados, esquema=None):
+    pgs = []
+    for attr in inferir_esquema(dados, esquema):
+        pgs.extend(attr.perguntas(dados))
+    return pgs
+
+def assinatura_dados(dados):
+    """ Hash do conteúdo da base (independe de formatação do arquivo). """
+    canonico = json.dumps(dados, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(canonico.encode("utf-8")).hexdigest()
+
+def registro_canonico(registro):
+    return json.dumps(registro, sort_keys=True, ensure_ascii=False).encode("utf-8")
+
+def assinatura_canonicos(canonicos):
+    """ O mesmo que `assinatura_dados`, a partir de `registro_canonico` de cada registro. """
+    h = hashlib.sha1(b"[")
+    h.update(b", ".join(canonicos))
+    h.update(b"]")
+    return h.hexdigest()
+
+class KnowledgeBase:
+    """
+    Base imutável e compacta. Use `KnowledgeBase.carregar(caminho)` para abrir com cache
+    em disco ou `KnowledgeBase.compilar(dados)` para compilar uma lista já em memória.
+    """
+
+    def __init__(self, nomes, imagens, perguntas, bitmap, vocabulario, codigos, assinatura, origem=None, dados=None):
+        self.nomes = nomes
+        self.imagens = imagens
+        self.perguntas = perguntas
+        self.indice_perguntas = {perg: j for j, perg in enumerate(perguntas)}
+        self.bitmap = bitmap # (perguntas x ceil(pokémons / 8)) uint8, 1 bit por pokémon
+        self.vocabulario = vocabulario # attr -> [valores]
+        self.codigos = codigos # attr -> array int16 (índice em vocabulario[attr], -1 = vazio)
+        self.assinatura = assinatura
+        self.origem = origem # Caminho do JSON (para carregar os registros sob demanda)
+        self._dados = dados
+        self._matriz = None
+        self.derivados = {} # Arrays derivados desta base (tabelas de verossimilhança etc.)
+
+    def __len__(self):
+        return len(self.nomes)
+
+    @property
+    def total(self):
+        return len(self.nomes)
+
+    @property
+    def matriz(self):
+        """ Matriz booleana (pokémons x perguntas), desempacotada uma vez por processo. """
+        if self._matriz is None:
+            matriz = np.unpackbits(self.bitmap, axis=1, count=self.total).T.astype(bool)
+            matriz.setflags(write=False)
+            self._matriz = matriz
+        return self._matriz
+
+    @property
+    def dados(self):
+        """ Registros completos do JSON (só parseados se alguém precisar deles). """
+        if self._dados is None:
+            with open(self.origem, "r", encoding="utf-8") as f:
+                self._dados = json.load(f)
+        return self._dados
+
+    def coluna(self, attr, val):
+        """ Vetor booleano 'tem a característica' para (attr, val). """
+        j = self.indice_perguntas.get((attr, val))
+        if j is not None:
+            return self.matriz[:, j]
+        # Pergunta fora da lista de candidatas: calcula na hora
+        return np.array([tem_caracteristica(p, attr, val) for p in self.dados], dtype=bool)
+
+    def indices_com_valor(self, attr, val):
+        """ Índices dos pokémons cujo atributo categórico `attr` vale `val`. """
+        vocab = self.vocabulario.get(attr, [])
+        if val not in vocab:
+            return np.zeros(0, dtype=np.intp)
+        return np.flatnonzero(self.codigos[attr] == vocab.index(val))
+
+    # --- Compilação ---
+
+    @classmethod
+    def compilar(cls, dados, origem=None, esquema=None):
+        """
+        Gera perguntas e colunas a partir do esquema. Campos categóricos são internados
+        (valor -> código int16) uma única vez e as colunas saem por comparação vetorizada.
+        """
+        perguntas, colunas = [], []
+        vocabulario, codigos = {}, {}
+        for attr in inferir_esquema(dados, esquema):
+            if attr.tipo in ("booleano", "derivado"):
+                perguntas.append((attr.nome, True))
+                colunas.append(np.array([attr.tem(p, True) for p in dados], dtype=bool)[:, None])
+                continue
+
+            vocab = attr.vocabulario(dados)
+            posicao = {v: k for k, v in enumerate(vocab)}
+            bloco = np.zeros((len(dados), len(vocab)), dtype=bool)
+            for campo in attr.campos:
+                brutos = [p.get(campo) for p in dados]
+                if any(isinstance(v, list) for v in brutos):
+                    # Campo com lista de valores: sem código único por registro
+                    for i, v in enumerate(brutos):
+                        for item in (v if isinstance(v, list) else [v]):
+                            if item in posicao: bloco[i, posicao[item]] = True
+                    continue
+                cod = np.array([posicao.get(v, -1) for v in brutos], dtype=np.int16)
+                vocabulario[campo] = vocab
+                codigos[campo] = cod
+                bloco |= cod[:, None] == np.arange(len(vocab))
+            perguntas.extend((attr.nome, v) for v in vocab)
+            colunas.append(bloco)
+
+        matriz = np.hstack(colunas) if colunas else np.zeros((len(dados), 0), dtype=bool)
+
+        return cls(
+            nomes=[p.get("nome", "") for p in dados],
+            imagens=[p.get("imagem", "") for p in dados],
+            perguntas=perguntas,
+            bitmap=np.packbits(matriz.T, axis=1),
+            vocabulario=vocabulario,
+            codigos=codigos,
+            assinatura=assinatura_dados(dados),
+            origem=origem,
+            dados=dados
+        )
+
+    # --- Cache binário ---
+
+    def salvar(self, caminho, marca_origem=None):
+        """ Grava o cache binário (ver `gravar_binario`). """
+        arrays = {"bitmap": self.bitmap}
+        for attr, cod in self.codigos.items():
+            arrays["codigos:" + attr] = cod
+
+        cabecalho = {
+            "origem": marca_origem,
+            "assinatura": self.assinatura,
+            "nomes": self.nomes,
+            "imagens": self.imagens,
+            "perguntas": [list(p) for p in self.perguntas],
+            "vocabulario": self.vocabulario
+        }
+        gravar_binario(caminho, cabecalho, arrays)
+
+    @classmethod
+    def abrir(cls, caminho, origem=None):
+        """ Abre um cache .kb via mmap. Retorna (base, marca_origem) ou None se inválido. """
+        aberto = abrir_binario(caminho)
+        if aberto is None:
+            return None
+        cabecalho, arrays = aberto
+
+        base = cls(
+            nomes=cabecalho["nomes"],
+            imagens=cabecalho["imagens"],
+            perguntas=[tuple(p) for p in cabecalho["perguntas"]],
+            bitmap=arrays["bitmap"],
+            vocabulario=cabecalho["vocabulario"],
+            codigos={nome.split(":", 1)[1]: arr for nome, arr in arrays.items() if nome.startswith("codigos:")},
+            assinatura=cabecalho["assinatura"],
+            origem=origem
+        )
+        return base, cabecalho["origem"]
+
+    @classmethod
+    def carregar(cls, caminho_json, caminho_cache=None, esquema=None):
+        """
+        Abre a base a partir do cache binário se ele ainda corresponde ao JSON
+        (mesmo tamanho e mtime); senão compila o JSON e regrava o cache.
+        """
+        if caminho_cache is None:
+            caminho_cache = caminho_cache_padrao(caminho_json)
+        if not os.path.exists(caminho_json):
+            return None
+
+        marca = marca_json(caminho_json, esquema)
+
+        if os.path.exists(caminho_cache):
+            try:
+                aberto = cls.abrir(caminho_cache, origem=caminho_json)
+            except (OSError, ValueError, KeyError):
+                aberto = None
+            if aberto is not None and aberto[1] == marca:
+                return aberto[0]
+
+        with open(caminho_json, "r", encoding="utf-8") as f:
+            dados = json.load(f)
+        base = cls.compilar(dados, origem=caminho_json, esquema=esquema)
+        try:
+            base.salvar(caminho_cache, marca)
+        except OSError:
+            pass # Sem permissão de escrita: segue só com a versão em memória
+        return base
+
+# --- Compilação incremental ---
+
+def _chave_valor(v):
+    return tuple(v) if isinstance(v, list) else v
+
+class CompiladorIncremental:
+    """
+    Aplica inclusões/alterações de registros a uma base compilada sem recompilar tudo.
+    O resultado é idêntico a `KnowledgeBase.compilar` sobre os dados alterados (mesmas
+    perguntas, na mesma ordem, mesmo bitmap e assinatura), mas só as linhas tocadas e
+    as colunas novas são calculadas; o resto é copiado da base anterior.
+
+    Para isso guarda, por campo, quantos registros têm cada valor: o esquema inferido e
+    o vocabulário de cada atributo saem dessas contagens, sem varrer os dados de novo.
+    A forma canônica de cada registro também fica guardada, e a assinatura só
+    re-serializa os registros tocados.
+    """
+
+    def __init__(self, base, esquema=None):
+        self.base = base
+        self.dados = list(base.dados)
+        self._declarado = list(ESQUEMA_POKEMON if esquema is None else esquema)
+        self._contagens = {} # campo -> {valor: nº de registros}
+        for registro in self.dados:
+            self._contar(registro, 1)
+        self._canonicos = [registro_canonico(p) for p in self.dados]
+        self.esquema = self._inferir()
+
+    def _contar(self, registro, delta):
+        for chave, v in registro.items():
+            contagem = self._contagens.setdefault(chave, {})
+            v = _chave_valor(v)
+            n = contagem.get(v, 0) + delta
+            if n:
+                contagem[v] = n
+            else:
+                del contagem[v]
+
+    def _inferir(self):
+        return completar_esquema(self._declarado, self._contagens)
+
+    def _vocabulario(self, attr):
+        """ O mesmo que `attr.vocabulario(dados)`, a partir das contagens. """
+        vistos = set()
+        for campo in attr.campos:
+            for v in self._contagens.get(campo, ()):
+                if isinstance(v, tuple):
+                    vistos.update(v)
+                elif v not in (None, ""):
+                    vistos.add(v)
+        return sorted(vistos)
+
+    def _tem_lista(self, campo):
+        return any(isinstance(v, tuple) for v in self._contagens.get(campo, ()))
+
+    def aplicar(self, alteracoes):
+        """
+        `alteracoes`: [(índice ou None, registro)], None = registro novo (vai para o fim).
+        Retorna (base nova, origem_linhas, origem_colunas): para cada linha/coluna da base
+        nova, o índice correspondente na anterior (-1 = nova). Registros alterados mantêm
+        a origem (é a mesma entrada, com outras características).
+        """
+        anterior = self.base
+        dados, canonicos = list(self.dados), list(self._canonicos)
+        tocados = set()
+        for indice, registro in alteracoes:
+            if indice is None:
+                indice = len(dados)
+                dados.append(registro)
+                canonicos.append(registro_canonico(registro))
+            else:
+                self._contar(dados[indice], -1)
+                dados[indice] = registro
+                canonicos[indice] = registro_canonico(registro)
+            self._contar(registro, 1)
+            tocados.add(indice)
+
+        esquema = self._inferir()
+        assinaturas_anteriores = {attr.assinatura() for attr in self.esquema}
+        vocabularios, perguntas = {}, []
+        for attr in esquema:
+            if attr.tipo in ("booleano", "derivado"):
+                perguntas.append((attr.nome, True))
+            else:
+                vocabularios[attr.nome] = self._vocabulario(attr)
+                perguntas.extend((attr.nome, v) for v in vocabularios[attr.nome])
+        indice_perguntas = {perg: j for j, perg in enumerate(perguntas)}
+
+        n, n_anterior = len(dados), len(anterior)
+        origem_linhas = np.arange(n)
+        origem_linhas[n_anterior:] = -1
+        origem_colunas = np.array([anterior.indice_perguntas.get(perg, -1) for perg in perguntas], dtype=np.intp)
+
+        # Colunas mantidas: copiadas. Colunas de valores novos de um atributo já existente só
+        # podem estar nas linhas tocadas; atributos novos são calculados na base inteira.
+        matriz = np.zeros((n, len(perguntas)), dtype=bool)
+        mantidas = np.flatnonzero(origem_colunas >= 0)
+        matriz[:n_anterior, mantidas] = anterior.matriz[:, origem_colunas[mantidas]]
+        linhas = np.array(sorted(tocados), dtype=np.intp)
+        matriz[linhas] = False
+        novos = [attr for attr in esquema if attr.assinatura() not in assinaturas_anteriores]
+        if novos:
+            nomes_novos = {attr.nome for attr in novos}
+            matriz[:, [j for j, (attr, _) in enumerate(perguntas) if attr in nomes_novos]] = False
+            self._preencher(matriz, range(n), dados, novos, indice_perguntas)
+        self._preencher(matriz, linhas, dados, esquema, indice_perguntas)
+
+        vocabulario, codigos = {}, {}
+        for attr in esquema:
+            if attr.tipo in ("booleano", "derivado"):
+                continue
+            vocab = vocabularios[attr.nome]
+            posicao = {v: k for k, v in enumerate(vocab)}
+            for campo in attr.campos:
+                if self._tem_lista(campo):
+                    continue
+                anteriores = anterior.codigos.get(campo)
+                if anteriores is not None and len(anteriores) == n_anterior:
+                    traducao = np.array([posicao.get(v, -1) for v in anterior.vocabulario[campo]] + [-1], dtype=np.int16)
+                    cod = np.full(n, -1, dtype=np.int16)
+                    cod[:n_anterior] = traducao[anteriores]
+                    for i in linhas:
+                        cod[i] = posicao.get(dados[i].get(campo), -1)
+                else:
+                    cod = np.array([posicao.get(p.get(campo), -1) for p in dados], dtype=np.int16)
+                vocabulario[campo] = vocab
+                codigos[campo] = cod
+
+        nomes, imagens = list(anterior.nomes), list(anterior.imagens)
+        for i in linhas:
+            if i < n_anterior:
+                nomes[i] = dados[i].get("nome", "")
+                imagens[i] = dados[i].get("imagem", "")
+            else:
+                nomes.append(dados[i].get("nome", ""))
+                imagens.append(dados[i].get("imagem", ""))
+
+        base = KnowledgeBase(
+            nomes=nomes,
+            imagens=imagens,
+            perguntas=perguntas,
+            bitmap=np.packbits(matriz.T, axis=1),
+            vocabulario=vocabulario,
+            codigos=codigos,
+            assinatura=assinatura_canonicos(canonicos),
+            origem=anterior.origem,
+            dados=dados
+        )
+        matriz.setflags(write=False)
+        base._matriz = matriz # Já está desempacotada
+
+        self.base, self.dados, self.esquema, self._canonicos = base, dados, esquema, canonicos
+        return base, origem_linhas, origem_colunas
+
+    @staticmethod
+    def _preencher(matriz, linhas, dados, atributos, indice_perguntas):
+        """ Marca, nas `linhas`, as perguntas dos `atributos` que cada registro satisfaz. """
+        for i in linhas:
+            for attr in atributos:
+                for v in attr.valores(dados[i]):
+                    j = indice_perguntas.get((attr.nome, v))
+                    if j is not None:
+                        matriz[i, j] = True
+
+def caminho_cache_padrao(caminho_json):
+    return os.path.splitext(caminho_json)[0] + ".kb"
+
+def marca_json(caminho_json, esquema=None):
+    """ O que identifica a versão do JSON para a qual um cache .kb foi gravado. """
+    stat = os.stat(caminho_json)
+    return {"tamanho": stat.st_size, "mtime_ns": stat.st_mtime_ns, "esquema": assinatura_esquema(esquema)}
+
+def _alinhar(n):
+    return (n + ALINHAMENTO - 1) // ALINHAMENTO * ALINHAMENTO
+
+def gravar_binario(caminho, cabecalho, arrays, magico=MAGICO):
+    """
+    Formato: MAGICO | tamanho do cabeçalho (uint64) | cabeçalho JSON | arrays alinhados.
+    Gravação atômica (arquivo temporário + rename) para não corromper leitores.
+    """
+    cabecalho = dict(cabecalho, arrays={})
+    # Offsets relativos ao início da área de dados (logo após o cabeçalho, alinhada)
+    offset = 0
+    for nome, arr in arrays.items():
+        cabecalho["arrays"][nome] = [offset, arr.dtype.str, list(arr.shape)]
+        offset = _alinhar(offset + arr.nbytes)
+    bruto = json.dumps(cabecalho, ensure_ascii=False).encode("utf-8")
+    inicio_dados = _alinhar(len(magico) + 8 + len(bruto))
+
+    pasta = os.path.dirname(os.path.abspath(caminho))
+    import tempfile # Só na gravação (quem só lê o cache não paga o import)
+    fd, temporario = tempfile.mkstemp(dir=pasta, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(magico)
+            f.write(np.uint64(len(bruto)).tobytes())
+            f.write(bruto)
+            for nome, arr in arrays.items():
+                f.seek(inicio_dados + cabecalho["arrays"][nome][0])
+                f.write(np.ascontiguousarray(arr).tobytes())
+            f.truncate(inicio_dados + offset)
+        os.chmod(temporario, 0o644)
+        os.replace(temporario, caminho)
+    except:
+        os.unlink(temporario)
+        raise
+
+def abrir_binario(caminho, magico=MAGICO):
+    """ (cabeçalho, {nome: np.memmap}) de um arquivo gravado por `gravar_binario`, ou None. """
+    with open(caminho, "rb") as f:
+        if f.read(len(magico)) != magico:
+            return None
+        tamanho = int(np.frombuffer(f.read(8), dtype=np.uint64)[0])
+        cabecalho = json.loads(f.read(tamanho).decode("utf-8"))
+    inicio_dados = _alinhar(len(magico) + 8 + tamanho)
+
+    arrays = {}
+    for nome, (offset, dtype, shape) in cabecalho["arrays"].items():
+        arrays[nome] = np.memmap(caminho, dtype=np.dtype(dtype), mode="r", offset=inicio_dados + offset, shape=tuple(shape))
+    return cabecalho, arrays
+
+# Bases compiladas a partir de listas em memória, pela assinatura do conteúdo: uma lista
+# alterada no lugar gera outra assinatura (nunca devolve um bitmap velho) e o cache é
+# limitado, então não cresce com cada lista que passa por aqui.
+CAPACIDADE_BASES = 8
+_BASES = CacheLRU(CAPACIDADE_BASES)
+
+def base_de(dados):
+    """
+    KnowledgeBase correspondente a `dados` (lista de dicts ou a própria base).
+    Para listas, custa um hash do conteúdo por chamada: quem consulta muito deve guardar a base.
+    """
+    if isinstance(dados, KnowledgeBase):
+        return dados
+    assinatura = assinatura_dados(dados)
+    base = _BASES.get(assinatura)
+    if base is None:
+        base = KnowledgeBase.compilar(dados)
+        _BASES.put(assinatura, base)
+    return base
@@ -0,0 +1,180 @@
+import argparse
+import json
+import platform
+import sys
+import time
+
+import numpy as np
+
+from akinator_gen1 import CACHE_HISTORICO, carregar_base, jogar_automatico, TEMPO_LIMITE_BUSCA
+from livro_abertura import carregar_livro
+
+# Auto-jogo (self-play): cada entrada da base vira o Pokémon secreto de uma partida,
+# respondida por um usuário simulado com ruído. Mede velocidade (latência por
+# pergunta, CPU por jogo) e qualidade (acurácia, perguntas até acertar) de cada
+# configuração de busca, com saída em JSON para comparar versões.
+#
+# O CACHE_HISTORICO é esvaziado antes de cada partida: as aberturas se repetem entre
+# alvos e, com o cache quente, a latência mediria consultas ao cache e não a busca.
+# `--cache-quente` mantém o cache entre as partidas de uma configuração (como um
+# servidor em regime); a taxa de acerto sai ao lado dos percentis nos dois modos.
+
+class UsuarioSimulado:
+    """
+    Responde sobre o `alvo` a partir da matriz de features da base:
+      nao_sei:   chance de responder "i"
+      erro:      chance de inverter a resposta verdadeira
+      incerteza: chance de responder "p"/"pn" em vez de "s"/"n"
+    """
+
+    def __init__(self, base, alvo, erro=0.0, incerteza=0.0, nao_sei=0.0, rng=None):
+        self.base = base
+        self.alvo = alvo
+        self.erro = erro
+        self.incerteza = incerteza
+        self.nao_sei = nao_sei
+        self.rng = rng if rng is not None else np.random.default_rng()
+
+    def __call__(self, attr, val):
+        tem = bool(self.base.coluna(attr, val)[self.alvo])
+        sorteio = self.rng.random()
+        if sorteio < self.nao_sei:
+            return "i"
+        if sorteio < self.nao_sei + self.erro:
+            tem = not tem
+        if self.rng.random() < self.incerteza:
+            return "p" if tem else "pn"
+        return "s" if tem else "n"
+
+def _percentis_ms(valores, qs=(50, 90, 99)):
+    if not valores:
+        return {}
+    valores = np.asarray(valores) * 1000
+    resultado = {f"p{q}": float(np.percentile(valores, q)) for q in qs}
+    resultado["max"] = float(valores.max())
+    resultado["media"] = float(valores.mean())
+    return resultado
+
+def avaliar_configuracao(base, profundidade, beam_width, alvos, erro=0.0, incerteza=0.0, nao_sei=0.0,
+                         tempo_limite=TEMPO_LIMITE_BUSCA, livro=None, seed=0, pool=None, cache_quente=False):
+    """
+    Joga uma partida por alvo com a configuração dada e agrega as métricas. O cache por
+    histórico começa vazio na configuração e, sem `cache_quente`, em cada partida.
+    """
+    rng = np.random.default_rng(seed)
+    latencias, cpu_jogos, perguntas, perguntas_acertos = [], [], [], []
+    acertos = desistencias = 0
+    acertos_cache = falhas_cache = 0
+
+    CACHE_HISTORICO.clear()
+    for alvo in alvos:
+        if not cache_quente:
+            CACHE_HISTORICO.clear()
+        antes = (CACHE_HISTORICO.acertos, CACHE_HISTORICO.falhas)
+        usuario = UsuarioSimulado(base, alvo, erro, incerteza, nao_sei, rng)
+        inicio_cpu = time.process_time()
+        resultado = jogar_automatico(base, usuario, profundidade=profundidade, beam_width=beam_width,
+                                     tempo_limite=tempo_limite, livro=livro, pool=pool)
+        cpu_jogos.append(time.process_time() - inicio_cpu)
+        acertos_cache += CACHE_HISTORICO.acertos - antes[0]
+        falhas_cache += CACHE_HISTORICO.falhas - antes[1]
+
+        latencias.extend(resultado["tempos"])
+        perguntas.append(resultado["perguntas"])
+        if resultado["status"] == "give_up":
+            desistencias += 1
+        elif resultado["indice"] == alvo:
+            acertos += 1
+            perguntas_acertos.append(resultado["perguntas"])
+
+    return {
+        "profundidade": profundidade,
+        "beam_width": beam_width,
+        "jogos": len(alvos),
+        "acuracia": acertos / len(alvos) if alvos else 0.0,
+        "desistencias": desistencias,
+        "perguntas_media": float(np.mean(perguntas)) if perguntas else 0.0,
+        "perguntas_media_acertos": float(np.mean(perguntas_acertos)) if perguntas_acertos else None,
+        "latencia_pergunta_ms": _percentis_ms(latencias),
+        "cpu_por_jogo_ms": _percentis_ms(cpu_jogos, qs=(50, 95)),
+        "cache_historico": {
+            "modo": "quente" if cache_quente else "frio",
+            "acertos": acertos_cache,
+            "falhas": falhas_cache,
+            "taxa_acerto": acertos_cache / (acertos_cache + falhas_cache) if acertos_cache + falhas_cache else 0.0
+        }
+    }
+
+def _ler_configuracao(texto):
+    """ "2:5" -> (2, 5); "3:all" -> (3, None). """
+    profundidade, _, beam = texto.partition(":")
+    return int(profundidade), (None if beam in ("", "all") else int(beam))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de auto-jogo do motor de perguntas")
+    parser.add_argument("--config", nargs="+", default=["1:5", "2:5", "2:all"],
+                        help="Configurações profundidade:beam (beam 'all' = sem corte)")
+    parser.add_argument("--alvos", type=int, default=None, help="Limita a quantidade de alvos (padrão: base inteira)")
+    parser.add_argument("--erro", type=float, default=0.0, help="Chance de resposta invertida")
+    parser.add_argument("--incerteza", type=float, default=0.0, help="Chance de responder p/pn em vez de s/n")
+    parser.add_argument("--nao-sei", type=float, default=0.0, help="Chance de responder 'i'")
+    parser.add_argument("--tempo-limite", type=float, default=TEMPO_LIMITE_BUSCA)
+    parser.add_argument("--livro", action="store_true", help="Usa o Livro de Aberturas, como o servidor")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--processos", type=int, default=0, help="Lookahead paralelo com N processos (0 = sequencial)")
+    parser.add_argument("--cache-quente", action="store_true",
+                        help="Mantém o cache por histórico entre as partidas (padrão: vazio a cada partida)")
+    parser.add_argument("-o", "--saida", help="Arquivo JSON de saída (padrão: stdout)")
+    args = parser.parse_args()
+
+    base = carregar_base()
+    if not base:
+        print("Erro: Base de dados vazia!", file=sys.stderr)
+        return
+
+    alvos = list(range(len(base)))[:args.alvos]
+    livro = carregar_livro(base) if args.livro else None
+    pool = None
+    if args.processos > 0:
+        from busca_paralela import PoolBusca
+        pool = PoolBusca(args.processos)
+
+    resultados = []
+    for texto in args.config:
+        profundidade, beam = _ler_configuracao(texto)
+        r = avaliar_configuracao(base, profundidade, beam, alvos, args.erro, args.incerteza, args.nao_sei,
+                                 args.tempo_limite, livro, args.seed, pool, args.cache_quente)
+        resultados.append(r)
+        lat = r["latencia_pergunta_ms"]
+        print(f"depth={profundidade} beam={beam}: acurácia {r['acuracia']*100:.1f}% | "
+              f"{r['perguntas_media']:.2f} perguntas | latência p50 {lat.get('p50', 0):.2f}ms "
+              f"p99 {lat.get('p99', 0):.2f}ms | CPU/jogo {r['cpu_por_jogo_ms'].get('media', 0):.1f}ms | "
+              f"cache {r['cache_historico']['modo']} {r['cache_historico']['taxa_acerto']*100:.0f}%",
+              file=sys.stderr)
+    if pool is not None:
+        pool.encerrar()
+
+    relatorio = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "base": base.assinatura,
+            "entradas": len(base),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "ruido": {"erro": args.erro, "incerteza": args.incerteza, "nao_sei": args.nao_sei},
+            "tempo_limite": args.tempo_limite,
+            "livro": args.livro,
+            "processos": args.processos,
+            "seed": args.seed
+        },
+        "resultados": resultados
+    }
+    saida = json.dumps(relatorio, indent=4, ensure_ascii=False)
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            f.write(saida)
+    else:
+        print(saida)
+
+if __name__ == "__main__":
+    main()
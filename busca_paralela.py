@@ -0,0 +1,119 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+from akinator_gen1 import BuscaExpectimax, TempoEsgotado, assinatura_modelo, carregar_base, tabela_ramos_base
+from metricas import contar
+
+# Lookahead paralelo: na raiz, cada candidata do Beam é uma subárvore independente,
+# então as candidatas são repartidas entre processos. Cada processo abre a base uma
+# única vez (pokemon_db.kb via mmap, páginas compartilhadas com o pai) e recebe só
+# o estado pequeno da busca: conjunto ativo, probs, máscara e as candidatas.
+
+_BASE = None # Base do processo trabalhador (carregada no initializer)
+
+def _iniciar_trabalhador():
+    global _BASE
+    _BASE = carregar_base()
+
+def _avaliar(assinatura, ativos, ramos, probs, disponiveis, profundidade, candidatas, restante):
+    """ Scores das `candidatas` na `profundidade` (executado no trabalhador). """
+    global _BASE
+    if _BASE is None or assinatura_modelo(_BASE) != assinatura:
+        _BASE = carregar_base() # O pai pode ter trocado de versão (recarga a quente, ver modelo.py)
+        if _BASE is None or assinatura_modelo(_BASE) != assinatura:
+            return None # Base diferente da do pai: quem chamou calcula sozinho
+    tabelas, tabelas_tlogt = tabela_ramos_base(_BASE, ramos)
+    if len(ativos) != len(_BASE):
+        tabelas, tabelas_tlogt = tabelas[:, ativos, :], tabelas_tlogt[:, ativos, :]
+    # O relógio é do próprio processo: o prazo chega como tempo restante
+    prazo = time.perf_counter() + restante if restante is not None else None
+    busca = BuscaExpectimax(tabelas, prazo=prazo, tabelas_tlogt=tabelas_tlogt)
+    return busca.valores(probs, disponiveis, profundidade, candidatas), busca.nos, busca.cache_hits, busca.podas
+
+MARGEM_PRAZO = 0.5 # Segundos além do prazo da busca antes de desistir dos trabalhadores
+
+class PoolBusca:
+    """
+    Pool de processos com a base pré-carregada. `valores` tem a mesma assinatura e
+    o mesmo resultado de `BuscaExpectimax.valores`, só que repartindo as candidatas.
+
+    Os processos só sobem no primeiro uso e em cada pid: criado no import de um servidor
+    com `--preload`, o objeto vai para os workers sem processos herdados do master. O
+    contexto "forkserver" permite subir o pool depois que o worker já tem threads. Se os
+    trabalhadores não respondem a tempo ou morrem, quem chamou recebe None (calcula
+    sozinho) e o pool é recriado na próxima busca.
+    """
+
+    def __init__(self, processos=None):
+        self.processos = processos or os.cpu_count() or 1
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._recusadas = set() # Assinaturas que os trabalhadores não têm
+
+    def _obter_executor(self):
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(max_workers=self.processos,
+                                                     mp_context=multiprocessing.get_context("forkserver"),
+                                                     initializer=_iniciar_trabalhador)
+                self._pid = os.getpid()
+                self._recusadas = set()
+            return self._executor
+
+    def _descartar(self, executor):
+        """ Derruba um pool travado ou quebrado; o próximo `valores` cria outro. """
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        for processo in list((getattr(executor, "_processes", None) or {}).values()):
+            processo.kill() # Um trabalhador preso (ou parado) não sai sozinho nem com SIGTERM
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def valores(self, base, ativos, ramos, probs, disponiveis, profundidade, candidatas, prazo=None):
+        """
+        Retorna (scores, nós, cache_hits, podas) ou None se os trabalhadores não têm esta
+        base ou falharam (não responderam até `prazo` + MARGEM_PRAZO, ou o pool quebrou).
+        """
+        assinatura = assinatura_modelo(base)
+        executor = self._obter_executor()
+        if assinatura in self._recusadas:
+            return None
+        fatias = [f for f in np.array_split(np.asarray(candidatas), min(self.processos, len(candidatas))) if len(f)]
+        restante = prazo - time.perf_counter() if prazo is not None else None
+        if restante is not None and restante <= 0:
+            raise TempoEsgotado()
+        limite = prazo + MARGEM_PRAZO if prazo is not None else None
+        resultados = []
+        try:
+            futuros = [executor.submit(_avaliar, assinatura, ativos, tuple(ramos), probs, disponiveis,
+                                       profundidade, fatia, restante) for fatia in fatias]
+            try:
+                for futuro in futuros:
+                    espera = max(limite - time.perf_counter(), 0.0) if limite is not None else None
+                    resultados.append(futuro.result(timeout=espera))
+            finally:
+                for futuro in futuros:
+                    futuro.cancel()
+        except (TimeoutError, BrokenProcessPool, RuntimeError):
+            # RuntimeError: submit num pool já encerrado por outra thread que o descartou
+            contar("busca.pool_falhas")
+            self._descartar(executor)
+            return None
+        if any(r is None for r in resultados):
+            self._recusadas.add(assinatura)
+            return None
+        return (np.concatenate([r[0] for r in resultados]),
+                sum(r[1] for r in resultados), sum(r[2] for r in resultados), sum(r[3] for r in resultados))
+
+    def encerrar(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None and self._pid == os.getpid():
+            executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,90 @@
+import threading
+import time
+from collections import OrderedDict
+
+class CacheLRU:
+    """
+    Dicionário com capacidade máxima (descarta o menos usado recentemente) e
+    expiração por tempo (TTL, em segundos) para cada entrada. Seguro entre threads.
+    """
+
+    def __init__(self, capacidade=1024, ttl=None):
+        self.capacidade = capacidade
+        self.ttl = ttl
+        self._itens = OrderedDict() # chave -> (instante_expiracao, valor)
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+
+    def _expirou(self, expira, agora):
+        return expira is not None and agora >= expira
+
+    def get(self, chave, padrao=None):
+        agora = time.monotonic()
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                self.falhas += 1
+                return padrao
+            if self._expirou(item[0], agora):
+                del self._itens[chave]
+                self.falhas += 1
+                return padrao
+            self._itens.move_to_end(chave)
+            self.acertos += 1
+            return item[1]
+
+    def put(self, chave, valor):
+        expira = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._itens[chave] = (expira, valor)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.capacidade:
+                self._itens.popitem(last=False)
+
+    def pop(self, chave, padrao=None):
+        with self._lock:
+            item = self._itens.pop(chave, None)
+        return padrao if item is None else item[1]
+
+    def limpar_expirados(self):
+        """ Remove todas as entradas vencidas; retorna quantas saíram. """
+        agora = time.monotonic()
+        with self._lock:
+            vencidas = [k for k, (expira, _) in self._itens.items() if self._expirou(expira, agora)]
+            for k in vencidas:
+                del self._itens[k]
+        return len(vencidas)
+
+    def remover(self, predicado):
+        """ Remove as entradas cuja chave satisfaz `predicado`; retorna quantas saíram. """
+        with self._lock:
+            chaves = [k for k in self._itens if predicado(k)]
+            for k in chaves:
+                del self._itens[k]
+        return len(chaves)
+
+    def valores(self):
+        """ Valores das entradas ainda válidas (não mexe na ordem de uso nem nas estatísticas). """
+        agora = time.monotonic()
+        with self._lock:
+            return [valor for expira, valor in self._itens.values() if not self._expirou(expira, agora)]
+
+    def estatisticas(self):
+        """ Itens, capacidade e taxa de acerto dos `get` desde a criação (ou do último clear). """
+        consultas = self.acertos + self.falhas
+        return {
+            "itens": len(self._itens),
+            "capacidade": self.capacidade,
+            "acertos": self.acertos,
+            "falhas": self.falhas,
+            "taxa_acerto": self.acertos / consultas if consultas else 0.0
+        }
+
+    def clear(self):
+        with self._lock:
+            self._itens.clear()
+            self.acertos = self.falhas = 0
+
+    def __len__(self):
+        return len(self._itens)
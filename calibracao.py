@@ -0,0 +1,265 @@
+import argparse
+import hashlib
+import os
+import time
+
+import numpy as np
+
+from akinator_gen1 import carregar_base, LIKELIHOODS, CALIBRACAO_FILE
+from base_conhecimento import abrir_binario, gravar_binario
+from log_aprendizado import LOG_FILE, LOG_LEGADO, arquivos_rotacionados, ler_legado, ler_linhas
+
+# Calibração offline: conta, no log de aprendizado, quantas vezes cada resposta foi
+# dada para cada (pokémon real, pergunta) e transforma as contagens em uma matriz
+# P(resposta | pokémon, pergunta) suavizada. O motor usa essa matriz no lugar de
+# LIKELIHOODS + feature 0/1 (ver `aplicar_calibracao`).
+#
+# O treino é incremental: as contagens ficam num checkpoint junto com o progresso
+# no log (arquivos rotacionados já lidos + byte do arquivo atual), então cada
+# execução só lê as partidas novas.
+
+CHECKPOINT_FILE = CALIBRACAO_FILE + ".ckpt"
+MAGICO_CALIBRACAO = b"AKCL\x00\x01\x00\x00"
+MAGICO_CHECKPOINT = b"AKCK\x00\x01\x00\x00"
+
+ALFA = 10.0          # Força do prior (em respostas fictícias) por (pokémon, pergunta)
+LOTE_CONTAGEM = 100000  # Respostas acumuladas antes de cada np.add.at
+
+CODIGOS = list(LIKELIHOODS)
+
+def prior_respostas(base):
+    """
+    P(resposta | pokémon, pergunta) antes de qualquer dado, (respostas x pokémons x perguntas):
+    LIKELIHOODS normalizado entre as respostas. A razão entre pokémons é a mesma de
+    LIKELIHOODS, então sem feedback o jogo se comporta exatamente como antes.
+    """
+    tem = np.array([LIKELIHOODS[c][0] for c in CODIGOS])
+    nao_tem = np.array([LIKELIHOODS[c][1] for c in CODIGOS])
+    tem, nao_tem = tem / tem.sum(), nao_tem / nao_tem.sum()
+    return np.where(base.matriz[None], tem[:, None, None], nao_tem[:, None, None])
+
+def suavizar(base, contagens, alfa=ALFA):
+    """ Média posterior de Dirichlet: (contagens + alfa * prior) / (total + alfa). """
+    total = contagens.sum(axis=0, keepdims=True)
+    return ((contagens + alfa * prior_respostas(base)) / (total + alfa)).astype(np.float32)
+
+def _itens_historico(entrada):
+    """ (attr, val, resposta) do histórico, aceitando dicts (app) ou listas (auto-jogo). """
+    for item in entrada.get("historico") or []:
+        if isinstance(item, dict):
+            yield item.get("atributo"), item.get("valor"), item.get("resposta")
+        elif len(item) == 3:
+            yield item[0], item[1], item[2]
+
+class Contador:
+    """ Contagens (respostas x pokémons x perguntas) acumuladas em lotes vetorizados. """
+
+    def __init__(self, base, contagens=None):
+        self.base = base
+        self.contagens = contagens if contagens is not None else \
+            np.zeros((len(CODIGOS), len(base), len(base.perguntas)), dtype=np.uint32)
+        self.indice_nomes = {nome: i for i, nome in enumerate(base.nomes)}
+        self.indice_codigos = {c: k for k, c in enumerate(CODIGOS)}
+        self.partidas = 0
+        self.ignoradas = 0
+        self._lote = ([], [], [])
+
+    def adicionar(self, entrada):
+        i = self.indice_nomes.get(entrada.get("pokemon_real"))
+        if i is None:
+            self.ignoradas += 1 # Pokémon fora da base (ou feedback sem correção)
+            return
+        self.partidas += 1
+        codigos, pokemons, perguntas = self._lote
+        for attr, val, resp in _itens_historico(entrada):
+            j = self.base.indice_perguntas.get((attr, val))
+            k = self.indice_codigos.get(resp)
+            if j is None or k is None:
+                continue
+            codigos.append(k)
+            pokemons.append(i)
+            perguntas.append(j)
+        if len(codigos) >= LOTE_CONTAGEM:
+            self.descarregar()
+
+    def descarregar(self):
+        if self._lote[0]:
+            np.add.at(self.contagens, self._lote, 1)
+            self._lote = ([], [], [])
+
+def carregar_checkpoint(base, caminho=CHECKPOINT_FILE):
+    """ (contagens, progresso) do checkpoint, ou None se não existe ou é de outra base. """
+    if not os.path.exists(caminho):
+        return None
+    try:
+        aberto = abrir_binario(caminho, MAGICO_CHECKPOINT)
+    except (OSError, ValueError, KeyError):
+        return None
+    if aberto is None:
+        return None
+    cabecalho, arrays = aberto
+    if cabecalho.get("base") != base.assinatura or cabecalho.get("codigos") != CODIGOS:
+        return None
+    return np.array(arrays["contagens"]), cabecalho["progresso"]
+
+def treinar(base, caminho_log=LOG_FILE, legado=LOG_LEGADO, checkpoint=CHECKPOINT_FILE, do_zero=False):
+    """
+    Atualiza as contagens com as partidas ainda não vistas e grava o checkpoint.
+    Retorna (Contador, estatísticas).
+    """
+    anterior = None if do_zero else carregar_checkpoint(base, checkpoint)
+    if anterior is None:
+        contador = Contador(base)
+        progresso = {"legado": None, "concluidos": [], "atual": None, "partidas": 0, "ignoradas": 0}
+    else:
+        contador = Contador(base, anterior[0])
+        progresso = anterior[1]
+
+    # Log legado (lista JSON única): lido uma vez, identificado por tamanho + mtime
+    if legado and os.path.exists(legado):
+        stat = os.stat(legado)
+        marca = [stat.st_size, stat.st_mtime_ns]
+        if progresso["legado"] != marca:
+            if progresso["legado"] is not None:
+                return treinar(base, caminho_log, legado, checkpoint, do_zero=True) # Legado mudou: recomeça
+            for entrada in ler_legado(legado):
+                contador.adicionar(entrada)
+            progresso["legado"] = marca
+
+    # Arquivos rotacionados são imutáveis: cada um é lido uma única vez. O que era o
+    # arquivo atual no último treino (mesmo inode) é retomado do byte onde parou.
+    atual = progresso["atual"]
+    concluidos = set(progresso["concluidos"])
+    for arquivo in arquivos_rotacionados(caminho_log):
+        nome = os.path.basename(arquivo)
+        if nome in concluidos:
+            continue
+        inicio = atual["offset"] if atual and os.stat(arquivo).st_ino == atual["ino"] else 0
+        for entrada, _ in ler_linhas(arquivo, inicio):
+            contador.adicionar(entrada)
+        concluidos.add(nome)
+
+    novo_atual = None
+    if os.path.exists(caminho_log):
+        ino = os.stat(caminho_log).st_ino
+        posicao = atual["offset"] if atual and ino == atual["ino"] else 0
+        for entrada, posicao in ler_linhas(caminho_log, posicao):
+            contador.adicionar(entrada)
+        novo_atual = {"ino": ino, "offset": posicao}
+    contador.descarregar()
+
+    progresso.update(
+        concluidos=sorted(concluidos),
+        atual=novo_atual,
+        partidas=progresso["partidas"] + contador.partidas,
+        ignoradas=progresso["ignoradas"] + contador.ignoradas
+    )
+    gravar_binario(checkpoint, {"base": base.assinatura, "codigos": CODIGOS, "progresso": progresso},
+                   {"contagens": contador.contagens}, MAGICO_CHECKPOINT)
+    return contador, {"novas": contador.partidas, "ignoradas": contador.ignoradas, "total": progresso["partidas"]}
+
+def salvar_calibracao(base, contagens, caminho=CALIBRACAO_FILE, alfa=ALFA, origem=None):
+    gravar_calibracao(base, suavizar(base, contagens, alfa), caminho, alfa, origem)
+
+def gravar_calibracao(base, probs, caminho=CALIBRACAO_FILE, alfa=ALFA, origem=None):
+    """ `origem`: id da calibração de que esta foi levada numa edição da base (ver `remapear_calibracao`). """
+    cabecalho = {
+        "base": base.assinatura,
+        "codigos": CODIGOS,
+        "alfa": alfa,
+        "id": hashlib.sha1(probs.tobytes()).hexdigest()[:16]
+    }
+    if origem is not None:
+        cabecalho["origem"] = origem
+    gravar_binario(caminho, cabecalho, {"probs": probs}, MAGICO_CALIBRACAO)
+
+def _remapear(antigo, novo, origem_linhas, origem_colunas):
+    """ Copia para `novo` as células (respostas x pokémons x perguntas) que existem em `antigo`. """
+    linhas, colunas = np.flatnonzero(origem_linhas >= 0), np.flatnonzero(origem_colunas >= 0)
+    novo[:, linhas[:, None], colunas] = antigo[:, origem_linhas[linhas][:, None], origem_colunas[colunas]]
+    return novo
+
+def remapear_calibracao(anterior, base, origem_linhas, origem_colunas, caminho=CALIBRACAO_FILE, checkpoint=CHECKPOINT_FILE):
+    """
+    Leva calibração e checkpoint de `anterior` para `base`, editada incrementalmente
+    (ver `CompiladorIncremental`). As contagens das entradas e perguntas mantidas são
+    preservadas e as novas começam zeradas: o treino segue do ponto do log onde parou,
+    sem reler tudo. Sem checkpoint, as probabilidades mantidas são copiadas e as células
+    novas (ou cuja feature mudou) voltam ao prior. Retorna False se não havia calibração.
+    """
+    calibracao = None
+    if os.path.exists(caminho):
+        try:
+            calibracao = abrir_binario(caminho, MAGICO_CALIBRACAO)
+        except (OSError, ValueError, KeyError):
+            calibracao = None
+    if calibracao is not None and (calibracao[0].get("base") != anterior.assinatura or calibracao[0].get("codigos") != CODIGOS):
+        calibracao = None
+    alfa = calibracao[0].get("alfa", ALFA) if calibracao is not None else ALFA
+
+    salvo = carregar_checkpoint(anterior, checkpoint)
+    if salvo is not None:
+        contagens, progresso = salvo
+        contagens = _remapear(contagens, np.zeros((len(CODIGOS), len(base), len(base.perguntas)), dtype=np.uint32),
+                              origem_linhas, origem_colunas)
+        gravar_binario(checkpoint, {"base": base.assinatura, "codigos": CODIGOS, "progresso": progresso},
+                       {"contagens": contagens}, MAGICO_CHECKPOINT)
+        if calibracao is not None:
+            salvar_calibracao(base, contagens, caminho, alfa, origem=calibracao[0]["id"])
+        return calibracao is not None
+    if calibracao is None:
+        return False
+
+    prior = prior_respostas(base).astype(np.float32)
+    probs = _remapear(calibracao[1]["probs"], prior.copy(), origem_linhas, origem_colunas)
+    linhas, colunas = np.flatnonzero(origem_linhas >= 0), np.flatnonzero(origem_colunas >= 0)
+    mudou = np.zeros(base.matriz.shape, dtype=bool)
+    mudou[linhas[:, None], colunas] = base.matriz[linhas[:, None], colunas] != \
+        anterior.matriz[origem_linhas[linhas][:, None], origem_colunas[colunas]]
+    probs[:, mudou] = prior[:, mudou]
+    gravar_calibracao(base, probs, caminho, alfa, origem=calibracao[0]["id"])
+    return True
+
+def aplicar_calibracao(base, caminho=CALIBRACAO_FILE):
+    """
+    Carrega a matriz calibrada (via mmap) nos derivados da base, descartando as
+    tabelas que dependiam do modelo antigo. Retorna False se o arquivo não serve
+    para esta base.
+    """
+    try:
+        aberto = abrir_binario(caminho, MAGICO_CALIBRACAO)
+    except (OSError, ValueError, KeyError):
+        return False
+    if aberto is None:
+        return False
+    cabecalho, arrays = aberto
+    if cabecalho.get("base") != base.assinatura or cabecalho.get("codigos") != CODIGOS:
+        return False
+
+    for chave in [c for c in base.derivados if isinstance(c, tuple) and c[0] in ("log_verossimilhanca", "log_verossimilhanca_max", "ramos")]:
+        del base.derivados[chave]
+    base.derivados["calibracao"] = {"id": cabecalho["id"], "origem": cabecalho.get("origem"), "codigos": CODIGOS,
+                                    "probs": arrays["probs"]}
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibra P(resposta | pokémon, pergunta) a partir do log de aprendizado")
+    parser.add_argument("--log", default=LOG_FILE, help="Arquivo atual do log (rotacionados são encontrados ao lado)")
+    parser.add_argument("--alfa", type=float, default=ALFA, help="Força do prior de LIKELIHOODS")
+    parser.add_argument("--do-zero", action="store_true", help="Ignora o checkpoint e relê o log inteiro")
+    parser.add_argument("-o", "--saida", default=CALIBRACAO_FILE)
+    args = parser.parse_args()
+
+    base = carregar_base()
+    if not base:
+        print("Erro: Base de dados vazia!")
+        return
+
+    inicio = time.perf_counter()
+    contador, stats = treinar(base, args.log, do_zero=args.do_zero)
+    salvar_calibracao(base, contador.contagens, args.saida, args.alfa)
+    print(f"{stats['novas']} partidas novas ({stats['ignoradas']} ignoradas), {stats['total']} no total. "
+          f"Calibração gravada em {args.saida} ({time.perf_counter() - inicio:.2f}s)")
+
+if __name__ == "__main__":
+    main()
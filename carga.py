@@ -0,0 +1,259 @@
+import argparse
+import http.cookiejar
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import numpy as np
+
+from akinator_gen1 import carregar_base, formatar_pergunta
+from benchmark import UsuarioSimulado
+from metricas import BUCKETS, Histograma
+
+# Teste de carga do fluxo HTTP completo: jogadores simulados concorrentes fazendo
+#   / -> /game -> /api/next_question <-> /api/answer -> /api/feedback
+# com cookie de sessão próprio, respondendo sobre um Pokémon alvo da base. Roda
+# contra um servidor de verdade (--url) ou, sem rede, pelo test client do Flask no
+# próprio processo. Reporta requisições/s, histogramas de latência e taxa de erro
+# por endpoint em cada nível de concorrência, em JSON para comparar deploys.
+
+MAX_TENTATIVAS_503 = 20 # Jogador desiste da partida depois de tantas recusas seguidas
+
+def _json(corpo):
+    try:
+        return json.loads(corpo)
+    except ValueError:
+        return None
+
+class ClienteHTTP:
+    """ Um jogador contra um servidor de verdade (cookie de sessão próprio). """
+
+    def __init__(self, url):
+        self.url = url.rstrip("/")
+        self._opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+    def requisitar(self, metodo, caminho, corpo=None):
+        """ (status, json ou None, cabeçalhos) """
+        dados = json.dumps(corpo).encode("utf-8") if corpo is not None else None
+        cabecalhos = {"Content-Type": "application/json"} if dados is not None else {}
+        pedido = urllib.request.Request(self.url + caminho, data=dados, method=metodo, headers=cabecalhos)
+        try:
+            with self._opener.open(pedido, timeout=30) as r:
+                return r.status, _json(r.read()), r.headers
+        except urllib.error.HTTPError as e:
+            return e.code, _json(e.read()), e.headers
+
+class ClienteTeste:
+    """ O mesmo jogador pelo test client do Flask (sem rede, no próprio processo). """
+
+    def __init__(self, app):
+        self._cliente = app.test_client()
+
+    def requisitar(self, metodo, caminho, corpo=None):
+        r = self._cliente.open(caminho, method=metodo, json=corpo)
+        return r.status_code, r.get_json(silent=True), r.headers
+
+class Estatisticas:
+    """ Latências e status por endpoint, alimentadas por todos os jogadores. Seguro entre threads. """
+
+    def __init__(self):
+        self.latencias = {}  # endpoint -> [segundos]
+        self.histogramas = {} # endpoint -> Histograma
+        self.status = {}     # endpoint -> {status: n}
+        self.jogos = self.acertos = self.abandonados = 0
+        self._lock = threading.Lock()
+
+    def registrar(self, endpoint, segundos, status):
+        with self._lock:
+            if endpoint not in self.latencias:
+                self.latencias[endpoint] = []
+                self.histogramas[endpoint] = Histograma()
+                self.status[endpoint] = {}
+            self.latencias[endpoint].append(segundos)
+            self.histogramas[endpoint].observar(segundos)
+            self.status[endpoint][status] = self.status[endpoint].get(status, 0) + 1
+
+    def fim_de_jogo(self, acertou=False, abandonado=False):
+        with self._lock:
+            self.jogos += 1
+            self.acertos += acertou
+            self.abandonados += abandonado
+
+    def resumo(self, duracao):
+        endpoints = {}
+        total = 0
+        for endpoint, latencias in sorted(self.latencias.items()):
+            status = self.status[endpoint]
+            n = len(latencias)
+            total += n
+            valores = np.asarray(latencias) * 1000
+            hist = self.histogramas[endpoint]
+            endpoints[endpoint] = {
+                "requisicoes": n,
+                "rps": n / duracao if duracao else 0.0,
+                "status": {str(s): c for s, c in sorted(status.items(), key=lambda item: str(item[0]))},
+                "taxa_erro": sum(c for s, c in status.items() if s == "falha" or (s >= 500 and s != 503)) / n,
+                "taxa_recusa": status.get(503, 0) / n,
+                "latencia_ms": {"p50": float(np.percentile(valores, 50)), "p90": float(np.percentile(valores, 90)),
+                                "p99": float(np.percentile(valores, 99)), "max": float(valores.max()),
+                                "media": float(valores.mean())},
+                "histograma": {"limites_s": list(BUCKETS) + ["+Inf"], "contagens": list(hist.buckets)}
+            }
+        return {
+            "duracao_s": duracao,
+            "jogos": self.jogos,
+            "jogos_por_s": self.jogos / duracao if duracao else 0.0,
+            "acuracia": self.acertos / self.jogos if self.jogos else 0.0,
+            "abandonados": self.abandonados,
+            "requisicoes": total,
+            "rps": total / duracao if duracao else 0.0,
+            "endpoints": endpoints
+        }
+
+def _chamar(cliente, estatisticas, endpoint, metodo, caminho, corpo=None):
+    inicio = time.perf_counter()
+    try:
+        status, dados, cabecalhos = cliente.requisitar(metodo, caminho, corpo)
+    except Exception:
+        estatisticas.registrar(endpoint, time.perf_counter() - inicio, "falha") # Conexão recusada, timeout...
+        return None, None, {}
+    estatisticas.registrar(endpoint, time.perf_counter() - inicio, status)
+    return status, dados, cabecalhos
+
+def jogar(cliente, base, perguntas_por_texto, alvo, usuario, estatisticas, pensar=0.0):
+    """ Uma partida completa pelo HTTP, terminando com o /api/feedback do alvo verdadeiro. """
+    _chamar(cliente, estatisticas, "index", "GET", "/") # Zera a sessão: partida nova
+    status, _, _ = _chamar(cliente, estatisticas, "game", "GET", "/game")
+    if status != 200:
+        estatisticas.fim_de_jogo(abandonado=True)
+        return
+
+    recusas = 0
+    while True:
+        status, dados, cabecalhos = _chamar(cliente, estatisticas, "next_question", "POST", "/api/next_question", {})
+        if status == 503 and recusas < MAX_TENTATIVAS_503:
+            recusas += 1
+            time.sleep(min(float(cabecalhos.get("Retry-After", 1)), 1.0) * 0.1) # Espera curta: o teste quer pressão
+            continue
+        if status != 200 or not dados:
+            estatisticas.fim_de_jogo(abandonado=True)
+            return
+        recusas = 0
+        if dados["status"] != "playing":
+            break
+
+        pergunta = perguntas_por_texto.get(dados["question"])
+        resposta = usuario(*pergunta) if pergunta is not None else "i"
+        if pensar:
+            time.sleep(pensar)
+        status, _, _ = _chamar(cliente, estatisticas, "answer", "POST", "/api/answer", {"answer": resposta})
+        if status != 200:
+            estatisticas.fim_de_jogo(abandonado=True)
+            return
+
+    nome = base.nomes[alvo]
+    acertou = dados.get("result") == nome
+    _chamar(cliente, estatisticas, "feedback", "POST", "/api/feedback", {"pokemon_real": nome, "acertou": acertou})
+    estatisticas.fim_de_jogo(acertou=acertou)
+
+def rodar_nivel(criar_cliente, base, concorrencia, jogos, duracao=None, erro=0.0, pensar=0.0, seed=0):
+    """
+    `concorrencia` jogadores em paralelo até completar `jogos` partidas (ou até `duracao`
+    segundos). Os alvos percorrem a base em ordem embaralhada.
+    """
+    perguntas_por_texto = {formatar_pergunta(attr, val): (attr, val) for attr, val in base.perguntas}
+    alvos = np.random.default_rng(seed).permutation(len(base))
+    estatisticas = Estatisticas()
+    proximo = [0]
+    lock = threading.Lock()
+    inicio = time.perf_counter()
+
+    def jogador(numero):
+        cliente = criar_cliente()
+        rng = np.random.default_rng((seed, numero))
+        while True:
+            with lock:
+                n = proximo[0]
+                if n >= jogos or (duracao is not None and time.perf_counter() - inicio > duracao):
+                    return
+                proximo[0] += 1
+            alvo = int(alvos[n % len(alvos)])
+            jogar(cliente, base, perguntas_por_texto, alvo, UsuarioSimulado(base, alvo, erro=erro, rng=rng),
+                  estatisticas, pensar)
+
+    threads = [threading.Thread(target=jogador, args=(i,)) for i in range(concorrencia)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    resultado = estatisticas.resumo(time.perf_counter() - inicio)
+    resultado["concorrencia"] = concorrencia
+    return resultado
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga do fluxo HTTP com jogadores simulados")
+    parser.add_argument("--url", help="Servidor alvo (ex.: http://127.0.0.1:5000); sem ele, usa o test client do Flask")
+    parser.add_argument("--concorrencia", type=int, nargs="+", default=[1, 4, 16], help="Jogadores simultâneos (um nível por valor)")
+    parser.add_argument("--jogos", type=int, default=200, help="Partidas por nível")
+    parser.add_argument("--duracao", type=float, default=None, help="Limite de segundos por nível")
+    parser.add_argument("--erro", type=float, default=0.0, help="Chance de resposta invertida")
+    parser.add_argument("--pensar", type=float, default=0.0, help="Segundos de 'leitura' antes de cada resposta")
+    parser.add_argument("--log", help="Log de aprendizado do modo test client (padrão: arquivo temporário)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--saida", help="Arquivo JSON de saída (padrão: stdout)")
+    args = parser.parse_args()
+
+    base = carregar_base()
+    if not base:
+        print("Erro: Base de dados vazia!", file=sys.stderr)
+        return
+
+    if args.url:
+        criar_cliente = lambda: ClienteHTTP(args.url)
+    else:
+        # O feedback do teste não pode sujar o log de aprendizado de verdade
+        os.environ["AKINATOR_LOG"] = args.log or os.path.join(tempfile.mkdtemp(prefix="akinator-carga-"), "learning_log.jsonl")
+        from app import app
+        criar_cliente = lambda: ClienteTeste(app)
+
+    niveis = []
+    for concorrencia in args.concorrencia:
+        r = rodar_nivel(criar_cliente, base, concorrencia, args.jogos, args.duracao, args.erro, args.pensar, args.seed)
+        niveis.append(r)
+        pergunta = r["endpoints"].get("next_question", {})
+        lat = pergunta.get("latencia_ms", {})
+        print(f"concorrência {concorrencia}: {r['rps']:.0f} req/s | {r['jogos_por_s']:.1f} jogos/s | "
+              f"next_question p50 {lat.get('p50', 0):.1f}ms p99 {lat.get('p99', 0):.1f}ms | "
+              f"erros {pergunta.get('taxa_erro', 0)*100:.1f}% recusas {pergunta.get('taxa_recusa', 0)*100:.1f}%",
+              file=sys.stderr)
+
+    relatorio = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "alvo": args.url or "test_client",
+            "base": base.assinatura,
+            "entradas": len(base),
+            "python": platform.python_version(),
+            "jogos_por_nivel": args.jogos,
+            "duracao_max_s": args.duracao,
+            "erro": args.erro,
+            "pensar_s": args.pensar,
+            "seed": args.seed
+        },
+        "niveis": niveis
+    }
+    saida = json.dumps(relatorio, indent=4, ensure_ascii=False)
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            f.write(saida)
+    else:
+        print(saida)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import argparse
+import json
+import time
+
+import numpy as np
+
+from akinator_gen1 import AkinatorBayes, LIKELIHOODS, PROFUNDIDADE_BUSCA, TEMPO_LIMITE_BUSCA, tabela_log_verossimilhanca, tabela_ramos_base
+from base_conhecimento import KnowledgeBase, BOOLEANOS_POKEMON
+
+# Gerador de bases sintéticas no formato do pokemon_db.json, para medir como o
+# motor escala com mais entradas (multi-geração) e mais atributos.
+
+TIPOS = ["Normal", "Fogo", "Água", "Grama", "Elétrico", "Gelo", "Lutador", "Veneno", "Terra",
+         "Voador", "Psíquico", "Inseto", "Pedra", "Fantasma", "Dragão", "Sombrio", "Aço", "Fada"]
+CORES = ["Vermelho", "Azul", "Amarelo", "Verde", "Preto", "Marrom", "Roxo", "Cinza", "Branco", "Rosa"]
+
+def gerar_base_sintetica(n_entradas, n_atributos_extras=0, n_habitats=0, seed=0):
+    """
+    Lista de registros com tipo/tipo2/cor/evolui, os booleanos do esquema Pokémon e
+    `n_atributos_extras` booleanos novos (descobertos automaticamente pelo esquema).
+    Cada booleano tem sua própria frequência, para haver perguntas boas e ruins.
+    """
+    rng = np.random.default_rng(seed)
+    booleanos = BOOLEANOS_POKEMON + [f"atributo_{k:03d}" for k in range(n_atributos_extras)]
+    frequencias = rng.uniform(0.05, 0.5, size=len(booleanos))
+    habitats = [f"Habitat {k}" for k in range(n_habitats)]
+
+    # Tipos com popularidade desigual (como na franquia: muitos Água/Normal, poucos Dragão)
+    pesos_tipo = 1.0 / np.arange(1, len(TIPOS) + 1)
+    pesos_tipo /= pesos_tipo.sum()
+
+    dados = []
+    for i in range(n_entradas):
+        tipo = TIPOS[rng.choice(len(TIPOS), p=pesos_tipo)]
+        tipo2 = TIPOS[rng.integers(len(TIPOS))] if rng.random() < 0.5 else ""
+        registro = {
+            "numero": i + 1,
+            "nome": f"Sintetico {i + 1:05d}",
+            "tipo": tipo,
+            "tipo2": tipo2 if tipo2 != tipo else "",
+            "evolui": f"sintetico {i + 2:05d}" if rng.random() < 0.45 else "",
+            "cor": CORES[rng.integers(len(CORES))]
+        }
+        for nome, freq in zip(booleanos, frequencias):
+            registro[nome] = bool(rng.random() < freq)
+        if habitats:
+            registro["habitat"] = habitats[rng.integers(len(habitats))]
+        dados.append(registro)
+    return dados
+
+def _percentis(valores):
+    valores = np.asarray(valores) * 1000
+    return {"p50_ms": float(np.percentile(valores, 50)), "p95_ms": float(np.percentile(valores, 95)),
+            "max_ms": float(valores.max())}
+
+def medir_escala(n_entradas, n_atributos_extras, jogos=5, perguntas=6, profundidade=PROFUNDIDADE_BUSCA,
+                 tempo_limite=TEMPO_LIMITE_BUSCA, seed=0, amostragem=None):
+    """ Compila uma base sintética e joga alguns jogos medindo atualização e lookahead. """
+    dados = gerar_base_sintetica(n_entradas, n_atributos_extras, seed=seed)
+
+    inicio = time.perf_counter()
+    base = KnowledgeBase.compilar(dados)
+    tempo_compilacao = time.perf_counter() - inicio
+
+    # Tabelas derivadas são montadas uma vez por base (no servidor, no startup)
+    inicio = time.perf_counter()
+    for resp in LIKELIHOODS:
+        tabela_log_verossimilhanca(base, resp)
+    tabela_ramos_base(base)
+    tempo_preparo = time.perf_counter() - inicio
+
+    rng = np.random.default_rng(seed + 1)
+    codigos = list(LIKELIHOODS)
+    t_update, t_lookahead, profundidades = [], [], []
+    for _ in range(jogos):
+        jogo = AkinatorBayes(base)
+        for _ in range(perguntas):
+            inicio = time.perf_counter()
+            perg = jogo.obter_melhor_pergunta_lookahead(profundidade=profundidade, tempo_limite=tempo_limite,
+                                                        amostragem=amostragem)
+            t_lookahead.append(time.perf_counter() - inicio)
+            profundidades.append(jogo.estatisticas_busca["profundidade"])
+            if perg is None:
+                break
+            jogo.atributos_utilizados.add(perg)
+
+            inicio = time.perf_counter()
+            jogo.atualizar_probabilidades(perg[0], perg[1], codigos[rng.integers(len(codigos))])
+            t_update.append(time.perf_counter() - inicio)
+
+    return {
+        "entradas": n_entradas,
+        "perguntas_candidatas": len(base.perguntas),
+        "compilacao_s": tempo_compilacao,
+        "preparo_s": tempo_preparo,
+        "atualizacao": _percentis(t_update),
+        "lookahead": _percentis(t_lookahead),
+        "profundidade_media": float(np.mean(profundidades)),
+        "orcamento_ms": tempo_limite * 1000 if tempo_limite is not None else None
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Curva de escala do motor com bases sintéticas")
+    parser.add_argument("--entradas", type=int, nargs="+", default=[151, 500, 1000, 1510])
+    parser.add_argument("--extras", type=int, nargs="+", default=[0, 100, 360],
+                        help="Quantidades de atributos booleanos extras")
+    parser.add_argument("--jogos", type=int, default=5)
+    parser.add_argument("--profundidade", type=int, default=PROFUNDIDADE_BUSCA)
+    parser.add_argument("--tempo-limite", type=float, default=TEMPO_LIMITE_BUSCA)
+    parser.add_argument("--amostragem", default=None,
+                        help="Estimador amostrado: 'auto' ou nº de amostras (padrão: exato)")
+    parser.add_argument("--json", help="Grava os resultados neste arquivo")
+    parser.add_argument("--gerar", type=int, help="Só gera uma base com N entradas (JSON na saída padrão)")
+    args = parser.parse_args()
+
+    if args.gerar:
+        print(json.dumps(gerar_base_sintetica(args.gerar, args.extras[0]), indent=4, ensure_ascii=False))
+        return
+
+    amostragem = args.amostragem if args.amostragem in (None, "auto") else int(args.amostragem)
+
+    resultados = []
+    print(f"{'entradas':>8} {'perguntas':>9} {'compila':>8} {'update p95':>10} {'look p50':>9} {'look p95':>9} {'depth':>5}")
+    for n in args.entradas:
+        for extras in args.extras:
+            r = medir_escala(n, extras, args.jogos, profundidade=args.profundidade, tempo_limite=args.tempo_limite,
+                             amostragem=amostragem)
+            resultados.append(r)
+            print(f"{r['entradas']:>8} {r['perguntas_candidatas']:>9} {r['compilacao_s']:>7.2f}s "
+                  f"{r['atualizacao']['p95_ms']:>8.3f}ms {r['lookahead']['p50_ms']:>7.1f}ms "
+                  f"{r['lookahead']['p95_ms']:>7.1f}ms {r['profundidade_media']:>5.2f}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, indent=4, ensure_ascii=False)
+
+if __name__ == "__main__":
+    main()
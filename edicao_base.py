@@ -0,0 +1,176 @@
+import argparse
+import json
+import sys
+import time
+
+from akinator_gen1 import CALIBRACAO_FILE, DB_FILE, salvar_dados
+from base_conhecimento import CompiladorIncremental, KnowledgeBase, caminho_cache_padrao, marca_json
+from calibracao import CHECKPOINT_FILE, aplicar_calibracao, remapear_calibracao
+from metricas import contar, medir
+
+# Edição incremental da base: incluir Pokémons, alterar características e criar
+# atributos sem recompilar tudo. As alterações se acumulam e são aplicadas de uma vez
+# em `salvar()`: só as linhas tocadas e as colunas novas do bitmap são calculadas
+# (`CompiladorIncremental`), o cache .kb é gravado já válido para o JSON novo e a
+# calibração é levada para a base nova em vez de retreinada do zero.
+#
+# O servidor percebe os arquivos novos e troca de modelo sozinho (ver modelo.py); a
+# recarga abre o .kb pronto, sem compilar, recalcula só as linhas/colunas alteradas das
+# tabelas derivadas e gera em segundo plano o livro de aberturas da base nova.
+
+class EditorBase:
+    """ Alterações pendentes sobre a base do arquivo `caminho` (ver `salvar`). """
+
+    def __init__(self, caminho=DB_FILE, base=None, esquema=None, calibracao=CALIBRACAO_FILE, checkpoint=CHECKPOINT_FILE):
+        self.caminho = caminho
+        self.esquema = esquema
+        self.calibracao = calibracao
+        self.checkpoint = checkpoint
+        if base is None:
+            base = KnowledgeBase.carregar(caminho, esquema=esquema) or KnowledgeBase.compilar([], origem=caminho, esquema=esquema)
+        self._compilador = CompiladorIncremental(base, esquema)
+        self._alterados = {} # índice -> registro novo (índices além do fim = entradas novas)
+        self._indice_nomes = {nome: i for i, nome in enumerate(base.nomes)}
+
+    @property
+    def base(self):
+        """ Base com as alterações já salvas (as pendentes ainda não entram). """
+        return self._compilador.base
+
+    @property
+    def pendentes(self):
+        return len(self._alterados)
+
+    def _total(self):
+        """ Entradas na base + novas pendentes (alterações de entradas existentes não contam). """
+        n = len(self._compilador.dados)
+        return n + sum(1 for i in self._alterados if i >= n)
+
+    def _registro(self, i):
+        return self._alterados.get(i) or self._compilador.dados[i]
+
+    def indice(self, pokemon):
+        """ Índice de um Pokémon pelo nome ou pelo número da Pokédex (campo "numero"). """
+        if isinstance(pokemon, int) and not isinstance(pokemon, bool):
+            for i in range(self._total()):
+                if self._registro(i).get("numero") == pokemon:
+                    return i
+            raise KeyError(f"Número da Pokédex não está na base: {pokemon}")
+        if pokemon not in self._indice_nomes:
+            raise KeyError(f"Pokémon não está na base: {pokemon}")
+        return self._indice_nomes[pokemon]
+
+    def registro(self, pokemon):
+        """ Registro atual (com as alterações pendentes). """
+        return self._registro(self.indice(pokemon))
+
+    def adicionar(self, registro):
+        """ Inclui uma entrada nova (dict no formato do JSON). Retorna o índice dela. """
+        nome = registro.get("nome")
+        if not nome:
+            raise ValueError("Registro sem nome")
+        if nome in self._indice_nomes:
+            raise ValueError(f"Pokémon já está na base: {nome}")
+        i = self._total()
+        self._alterados[i] = dict(registro)
+        self._indice_nomes[nome] = i
+        return i
+
+    def modificar(self, pokemon, campos):
+        """ Altera campos de uma entrada (valor None remove o campo). """
+        i = self.indice(pokemon)
+        atual = self._registro(i)
+        registro = dict(atual)
+        for chave, valor in campos.items():
+            if valor is None:
+                registro.pop(chave, None)
+            else:
+                registro[chave] = valor
+        if registro.get("nome") != atual.get("nome"):
+            if not registro.get("nome") or registro["nome"] in self._indice_nomes:
+                raise ValueError(f"Nome inválido ou repetido: {registro.get('nome')}")
+            del self._indice_nomes[atual["nome"]]
+            self._indice_nomes[registro["nome"]] = i
+        self._alterados[i] = registro
+
+    def adicionar_atributo(self, nome, valores):
+        """
+        Atributo novo (ou valores novos de um existente): `valores` mapeia Pokémon -> valor.
+        Os demais ficam sem o campo, que para booleanos conta como False; só os citados são tocados.
+        """
+        for pokemon, valor in valores.items():
+            self.modificar(pokemon, {nome: valor})
+
+    def salvar(self):
+        """
+        Aplica as alterações pendentes e grava JSON, cache .kb e calibração.
+        Retorna a base nova (com a calibração aplicada, se houver).
+        """
+        if not self._alterados:
+            return self.base
+        n = len(self._compilador.dados)
+        alteracoes = [(i if i < n else None, registro) for i, registro in sorted(self._alterados.items())]
+
+        anterior = self.base
+        with medir("edicao.compilacao"):
+            base, origem_linhas, origem_colunas = self._compilador.aplicar(alteracoes)
+        self._alterados = {}
+
+        salvar_dados(base.dados, self.caminho)
+        try:
+            base.salvar(caminho_cache_padrao(self.caminho), marca_json(self.caminho, self.esquema))
+        except OSError:
+            pass # Sem permissão de escrita: o próximo carregamento compila o JSON
+        with medir("edicao.calibracao"):
+            if remapear_calibracao(anterior, base, origem_linhas, origem_colunas, self.calibracao, self.checkpoint):
+                aplicar_calibracao(base, self.calibracao)
+        contar("edicao.registros", len(alteracoes))
+        return base
+
+def _ler_json(texto):
+    """ JSON direto ou @arquivo. """
+    if texto.startswith("@"):
+        with open(texto[1:], "r", encoding="utf-8") as f:
+            return json.load(f)
+    return json.loads(texto)
+
+def main():
+    parser = argparse.ArgumentParser(description="Inclui/altera Pokémons e atributos sem recompilar a base")
+    parser.add_argument("--base", default=DB_FILE)
+    comandos = parser.add_subparsers(dest="comando", required=True)
+    p = comandos.add_parser("adicionar", help="Entradas novas: um registro JSON ou uma lista deles (@arquivo.json)")
+    p.add_argument("registros")
+    p = comandos.add_parser("modificar", help="Altera campos de um Pokémon (null remove o campo)")
+    p.add_argument("pokemon", help="Nome ou número da Pokédex")
+    p.add_argument("campos", help='Ex.: \'{"tem_cauda": true}\'')
+    p = comandos.add_parser("atributo", help="Atributo novo: valor por Pokémon (os demais ficam sem o campo)")
+    p.add_argument("nome")
+    p.add_argument("valores", help='Ex.: \'{"Psyduck": true, "Golduck": true}\'')
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    editor = EditorBase(args.base)
+    carregado = time.perf_counter()
+    try:
+        if args.comando == "adicionar":
+            registros = _ler_json(args.registros)
+            for registro in registros if isinstance(registros, list) else [registros]:
+                editor.adicionar(registro)
+        elif args.comando == "modificar":
+            editor.modificar(int(args.pokemon) if args.pokemon.isdigit() else args.pokemon, _ler_json(args.campos))
+        else:
+            editor.adicionar_atributo(args.nome, _ler_json(args.valores))
+    except (KeyError, IndexError, ValueError) as e:
+        print(f"Erro: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    alteradas = editor.pendentes
+    base = editor.salvar()
+    print(f"{alteradas} entradas alteradas: {len(base)} Pokémons, {len(base.perguntas)} perguntas "
+          f"(carga {carregado - inicio:.2f}s, edição {time.perf_counter() - carregado:.2f}s)")
+    if "calibracao" in base.derivados:
+        print("Calibração levada para a base nova.")
+    print("Livro de aberturas desatualizado: o servidor gera o novo na recarga (ou `python livro_abertura.py`).")
+
+if __name__ == "__main__":
+    main()
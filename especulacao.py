@@ -0,0 +1,118 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from metricas import contar
+
+# Pré-cálculo especulativo: enquanto o usuário lê a pergunta, um pool pequeno de
+# threads já calcula a próxima pergunta para cada resposta possível. Quando a
+# resposta chega, /api/next_question normalmente só lê o resultado pronto.
+#
+# O trabalho especulativo é limitado (poucas threads, teto de tarefas pendentes,
+# teto de jogos acompanhados) e descartável: tarefas ainda na fila são canceladas
+# quando o jogo avança, é reiniciado ou fica entre os mais antigos.
+
+ESPECULACAO_WORKERS = 2
+MAX_TAREFAS_PENDENTES = 64
+MAX_JOGOS_ESPECULADOS = 1000
+
+class Especulador:
+    """
+    Tarefas especulativas por jogo: {id_jogo: {chave: Future}}. A `chave` identifica o
+    estado futuro (ex.: o histórico com a resposta hipotética), então um resultado só é
+    reaproveitado se o jogo chegou exatamente àquele estado.
+    """
+
+    def __init__(self, workers=ESPECULACAO_WORKERS, max_pendentes=MAX_TAREFAS_PENDENTES,
+                 max_jogos=MAX_JOGOS_ESPECULADOS):
+        self.max_pendentes = max_pendentes
+        self.max_jogos = max_jogos
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="especulacao")
+        self._jogos = OrderedDict() # id_jogo -> {chave: Future}, do menos para o mais recente
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+
+    def _pendentes(self):
+        return sum(1 for tarefas in self._jogos.values() for f in tarefas.values() if not f.done())
+
+    def agendar(self, id_jogo, tarefas):
+        """
+        Substitui a especulação do jogo por `tarefas` ({chave: função sem argumentos}),
+        na ordem dada (as mais prováveis primeiro). Tarefas que não cabem no teto de
+        pendentes são simplesmente descartadas.
+        """
+        with self._lock:
+            self._cancelar(self._jogos.pop(id_jogo, {}))
+            futuros = {}
+            self._jogos[id_jogo] = futuros
+            while len(self._jogos) > self.max_jogos:
+                self._cancelar(self._jogos.popitem(last=False)[1])
+
+            pendentes = self._pendentes()
+            for chave, funcao in tarefas.items():
+                if pendentes >= self.max_pendentes:
+                    # Fila cheia: abre espaço cancelando o jogo mais antigo (provavelmente abandonado)
+                    antigo = next(iter(self._jogos))
+                    if antigo == id_jogo:
+                        break
+                    pendentes -= self._cancelar(self._jogos.pop(antigo))
+                    if pendentes >= self.max_pendentes:
+                        break
+                futuros[chave] = self._executor.submit(funcao)
+                pendentes += 1
+
+    def _registrar(self, acertou):
+        if acertou:
+            self.acertos += 1
+        else:
+            self.falhas += 1
+        contar("especulacao.acertos" if acertou else "especulacao.falhas")
+
+    def obter(self, id_jogo, chave, espera=None):
+        """
+        (True, resultado) se há especulação para esse estado, senão (False, None). Uma
+        tarefa já em execução é aguardada por até `espera` segundos; uma que ainda nem
+        começou é cancelada (quem chamou calcula direto, sem esperar a fila).
+        """
+        with self._lock:
+            futuro = self._jogos.get(id_jogo, {}).get(chave)
+        if futuro is None or (not futuro.done() and futuro.cancel()):
+            self._registrar(False)
+            return False, None
+        try:
+            resultado = futuro.result(timeout=espera)
+        except TimeoutError:
+            self._registrar(False)
+            return False, None
+        except Exception:
+            self._registrar(False) # Erro na especulação não derruba a requisição
+            return False, None
+        self._registrar(True)
+        return True, resultado
+
+    def descartar(self, id_jogo, exceto=None):
+        """ Cancela a especulação do jogo (menos a `exceto`, que é o estado que de fato ocorreu). """
+        with self._lock:
+            tarefas = self._jogos.get(id_jogo)
+            if tarefas is None:
+                return
+            if exceto is None:
+                del self._jogos[id_jogo]
+                self._cancelar(tarefas)
+            else:
+                self._cancelar({c: f for c, f in tarefas.items() if c != exceto})
+                for c in [c for c in tarefas if c != exceto]:
+                    del tarefas[c]
+
+    def _cancelar(self, tarefas):
+        """ Cancela o que ainda está na fila; retorna quantas pendentes deixaram de contar. """
+        canceladas = 0
+        for futuro in tarefas.values():
+            if not futuro.done():
+                canceladas += 1 # Em execução termina sozinha (a busca tem limite de tempo)
+                futuro.cancel()
+        return canceladas
+
+    def encerrar(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,82 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from metricas import METRICAS, contar, observar
+
+# Atendimento com contrapressão: a busca de cada /api/next_question roda num pool
+# limitado de threads, em vez de direto na thread da requisição. Assim:
+#   - no máximo `workers` buscas disputam a CPU ao mesmo tempo (as demais esperam na fila);
+#   - com a fila cheia, a requisição é recusada na hora (503) em vez de esperar;
+#   - passado o prazo da requisição, ela responde com a alternativa barata (Depth 1)
+#     e a busca, que recebeu o mesmo prazo como limite de tempo, termina sozinha.
+
+BUSCAS_SIMULTANEAS = os.cpu_count() or 1
+FILA_POR_WORKER = 4      # Tarefas aceitas (na fila + em execução) por worker antes de recusar
+PRAZO_REQUISICAO = 1.0   # Segundos, contados da chegada da requisição
+
+class Sobrecarga(Exception):
+    """ Fila cheia: a requisição deve ser recusada (HTTP 503). """
+
+class ExecutorLimitado:
+    """ Pool de threads com fila limitada, prazo por tarefa e alternativa ao estourar o prazo. """
+
+    def __init__(self, workers=BUSCAS_SIMULTANEAS, max_fila=None):
+        self.workers = workers
+        self.max_fila = max_fila if max_fila is not None else workers * FILA_POR_WORKER
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="busca")
+        self._lock = threading.Lock()
+        self._pendentes = 0
+        self.recusadas = 0
+        self.degradadas = 0
+
+    @property
+    def pendentes(self):
+        return self._pendentes
+
+    def _concluida(self, _):
+        with self._lock:
+            self._pendentes -= 1
+
+    def executar(self, funcao, prazo, degradar):
+        """
+        Resultado de `funcao()` se ele sair até `prazo` (time.perf_counter()); senão o de
+        `degradar()`, calculado na thread de quem chamou. Levanta Sobrecarga se a fila está cheia.
+        """
+        with self._lock:
+            if self._pendentes >= self.max_fila:
+                self.recusadas += 1
+                contar("executor.recusadas")
+                raise Sobrecarga()
+            self._pendentes += 1
+
+        enfileirada = time.perf_counter()
+        com_perfil = METRICAS.perfil_ativo()
+
+        def tarefa():
+            observar("executor.espera_fila", time.perf_counter() - enfileirada)
+            if com_perfil:
+                METRICAS.iniciar_perfil() # Perfil próprio; só volta para a requisição se chegar a tempo
+            try:
+                return funcao(), METRICAS.encerrar_perfil()
+            except BaseException:
+                METRICAS.encerrar_perfil()
+                raise
+
+        futuro = self._executor.submit(tarefa)
+        futuro.add_done_callback(self._concluida)
+        try:
+            resultado, perfil = futuro.result(timeout=max(prazo - time.perf_counter(), 0.0))
+        except TimeoutError:
+            futuro.cancel() # Na fila: nem começa. Em execução: termina pelo próprio limite de tempo
+            with self._lock:
+                self.degradadas += 1
+            contar("executor.degradadas")
+            return degradar()
+        if perfil is not None:
+            METRICAS.mesclar_perfil(perfil)
+        return resultado
+
+    def encerrar(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
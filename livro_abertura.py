@@ -0,0 +1,131 @@
+import argparse
+import json
+import os
+import time
+
+try:
+    import fcntl # Trava entre processos (POSIX); sem ela, cada worker pode regenerar o livro
+except ImportError:
+    fcntl = None
+
+from akinator_gen1 import AkinatorBayes, assinatura_modelo, carregar_base, LIKELIHOODS, DB_FILE, PROFUNDIDADE_BUSCA
+from base_conhecimento import base_de
+
+# Livro de Aberturas: todo jogo começa do mesmo prior uniforme, então as primeiras
+# perguntas (as buscas mais caras, com entropia máxima) são sempre as mesmas.
+# Aqui elas são calculadas offline e gravadas ao lado do pokemon_db.json.
+#
+# Cada posição depende do posterior inteiro, então uma edição da base invalida o livro
+# todo. O servidor regenera em segundo plano, com os mesmos parâmetros, o livro de uma
+# versão nova do modelo (`regenerar_livro`, ver modelo.py).
+
+LIVRO_FILE = os.path.join(os.path.dirname(DB_FILE), "livro_abertura.json")
+
+def chave_historico(historico):
+    """ Chave do livro para uma sequência de (atributo, valor, resposta). """
+    return "|".join(f"{attr}={val}:{resp}" for attr, val, resp in historico)
+
+def construir_livro(dados, plies=3, profundidade=PROFUNDIDADE_BUSCA, beam_width=None, verbose=False):
+    """
+    Enumera a árvore de perguntas das primeiras `plies` jogadas para todas as
+    respostas de LIKELIHOODS, usando a busca completa (sem limite de tempo).
+    """
+    perguntas = {}
+
+    def expandir(jogo, historico):
+        if len(historico) >= plies:
+            return
+        melhor = jogo.obter_melhor_pergunta_lookahead(profundidade=profundidade, beam_width=beam_width, tempo_limite=None)
+        if not melhor:
+            return
+        perguntas[chave_historico(historico)] = list(melhor)
+        if verbose:
+            print(f"{len(perguntas):4d} [{chave_historico(historico) or 'início'}] -> {melhor}")
+
+        attr, val = melhor
+        for resp in LIKELIHOODS:
+            filho = AkinatorBayes(dados)
+            filho.posterior = jogo.posterior.copy()
+            filho.atributos_utilizados = jogo.atributos_utilizados | {melhor}
+            filho.atualizar_probabilidades(attr, val, resp)
+            expandir(filho, historico + [(attr, val, resp)])
+
+    expandir(AkinatorBayes(dados), [])
+
+    return {
+        "base": assinatura_modelo(base_de(dados)),
+        "parametros": {"plies": plies, "profundidade": profundidade, "beam_width": beam_width},
+        "perguntas": perguntas
+    }
+
+def salvar_livro(livro, caminho=LIVRO_FILE):
+    # Arquivo temporário + rename: quem lê (outros workers) nunca vê um livro pela metade
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    with open(temporario, "w", encoding="utf-8") as f:
+        json.dump(livro, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(temporario, caminho)
+
+def carregar_livro(dados, caminho=LIVRO_FILE):
+    """ Retorna {chave: (attr, val)}; vazio se não existir ou se a base (ou a calibração) mudou. """
+    if not os.path.exists(caminho):
+        return {}
+    try:
+        with open(caminho, "r", encoding="utf-8") as f:
+            livro = json.load(f)
+    except:
+        return {}
+    if livro.get("base") != assinatura_modelo(base_de(dados)):
+        return {}
+    return {chave: tuple(perg) for chave, perg in livro.get("perguntas", {}).items()}
+
+def parametros_livro(caminho=LIVRO_FILE):
+    """ Parâmetros com que o livro gravado foi gerado (valha ele ou não para a base atual); None se não há livro. """
+    try:
+        with open(caminho, "r", encoding="utf-8") as f:
+            return json.load(f).get("parametros")
+    except:
+        return None
+
+def regenerar_livro(base, parametros, caminho=LIVRO_FILE):
+    """
+    Gera e grava o livro de `base` com `parametros` (os de `parametros_livro`). Com
+    vários processos só um gera: os outros recebem None e veem o arquivo novo depois.
+    """
+    with open(caminho + ".lock", "a") as trava:
+        if fcntl is not None:
+            try:
+                fcntl.flock(trava.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return None
+        if carregar_livro(base, caminho):
+            return None # Outro processo acabou de gerar
+        livro = construir_livro(base, parametros.get("plies", 3), parametros.get("profundidade", PROFUNDIDADE_BUSCA),
+                                parametros.get("beam_width"))
+        salvar_livro(livro, caminho)
+        return livro
+
+def consultar_livro(livro, historico):
+    """ Pergunta do livro para esse histórico, ou None se o jogo já saiu da abertura. """
+    return livro.get(chave_historico(historico))
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera o livro de aberturas do Akinator")
+    parser.add_argument("--plies", type=int, default=3, help="Quantas perguntas iniciais pré-calcular")
+    parser.add_argument("--profundidade", type=int, default=PROFUNDIDADE_BUSCA, help="Profundidade da busca")
+    parser.add_argument("--beam", type=int, default=None, help="Beam da raiz (padrão: todas as candidatas)")
+    parser.add_argument("-o", "--saida", default=LIVRO_FILE, help="Arquivo de saída")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args()
+
+    dados = carregar_base()
+    if not dados:
+        print("Erro: Base de dados vazia!")
+        return
+
+    inicio = time.perf_counter()
+    livro = construir_livro(dados, args.plies, args.profundidade, args.beam, args.verbose)
+    salvar_livro(livro, args.saida)
+    print(f"{len(livro['perguntas'])} posições gravadas em {args.saida} ({time.perf_counter() - inicio:.1f}s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+
+try:
+    import fcntl # Trava entre processos (POSIX); sem ela, só entre threads
+except ImportError:
+    fcntl = None
+
+# Log de aprendizado append-only: uma partida por linha (JSON Lines).
+# Cada /api/feedback só acrescenta bytes ao fim do arquivo, em vez de reler e
+# regravar o histórico inteiro. Quando o arquivo passa de TAMANHO_MAX_LOG ele é
+# renomeado para um nome imutável com timestamp (learning_log.AAAAMMDD-HHMMSS-ffffff.jsonl)
+# (+ pid) e um novo arquivo é iniciado. Vários workers podem escrever no mesmo arquivo:
+# cada descarga é um único write sob flock.
+
+LOG_FILE = "learning_log.jsonl"
+LOG_LEGADO = "learning_log.json" # Formato antigo (lista JSON única), só leitura
+
+TAMANHO_MAX_LOG = 64 * 1024 * 1024  # Rotaciona ao passar de 64 MB
+BUFFER_MAX_ENTRADAS = 32            # Descarrega ao acumular tantas partidas...
+BUFFER_MAX_SEGUNDOS = 5.0           # ...ou quando a mais antiga espera há tanto tempo
+
+def arquivos_rotacionados(caminho):
+    raiz, ext = os.path.splitext(caminho)
+    # Timestamps de largura fixa -> ordem lexicográfica = ordem cronológica
+    return sorted(glob.glob(f"{glob.escape(raiz)}.*{ext}"))
+
+class LogAprendizado:
+    """
+    Escritor bufferizado do log de aprendizado. `registrar` só guarda a linha em
+    memória; `descarregar` grava o buffer de uma vez: ao encher, quando a entrada mais
+    antiga completa `intervalo_max` segundos (timer armado na primeira entrada, então
+    vale também com o servidor ocioso) e no atexit.
+    """
+
+    def __init__(self, caminho=LOG_FILE, tamanho_max=TAMANHO_MAX_LOG,
+                 buffer_max=BUFFER_MAX_ENTRADAS, intervalo_max=BUFFER_MAX_SEGUNDOS):
+        self.caminho = caminho
+        self.tamanho_max = tamanho_max
+        self.buffer_max = buffer_max
+        self.intervalo_max = intervalo_max
+        self._buffer = []
+        self._primeira = None # Instante da entrada mais antiga no buffer
+        self._timer = None    # Descarga agendada para quando a mais antiga vencer
+        self._lock = threading.Lock()
+        atexit.register(self.descarregar)
+
+    def registrar(self, pokemon_real, historico):
+        entrada = {
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "pokemon_real": pokemon_real,
+            "historico": historico
+        }
+        linha = json.dumps(entrada, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with self._lock:
+            if not self._buffer:
+                self._primeira = time.monotonic()
+                self._timer = threading.Timer(self.intervalo_max, self.descarregar)
+                self._timer.daemon = True
+                self._timer.start()
+            self._buffer.append(linha)
+            cheio = (len(self._buffer) >= self.buffer_max or
+                     time.monotonic() - self._primeira >= self.intervalo_max)
+        if cheio:
+            self.descarregar()
+
+    def descarregar(self):
+        with self._lock:
+            if self._timer is not None and self._timer is not threading.current_thread():
+                self._timer.cancel()
+            self._timer = None
+            if not self._buffer:
+                return
+            dados = "".join(self._buffer).encode("utf-8")
+            self._buffer = []
+            self._gravar(dados)
+
+    def _abrir_travado(self):
+        """
+        Abre o arquivo atual em append com trava exclusiva. Se outro processo rotacionou
+        o arquivo enquanto esperávamos a trava, o descritor aponta para o arquivo antigo:
+        nesse caso reabre pelo nome.
+        """
+        while True:
+            f = open(self.caminho, "ab")
+            if fcntl is None:
+                return f
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                if os.stat(self.caminho).st_ino == os.fstat(f.fileno()).st_ino:
+                    return f
+            except FileNotFoundError:
+                pass
+            f.close()
+
+    def _gravar(self, dados):
+        f = self._abrir_travado()
+        try:
+            if f.tell() > 0 and f.tell() + len(dados) > self.tamanho_max:
+                self._rotacionar()
+                f.close()
+                f = self._abrir_travado()
+            f.write(dados)
+            f.flush()
+        finally:
+            f.close() # Fechar libera o flock
+
+    def _rotacionar(self):
+        """ Renomeia o arquivo atual (com a trava ainda mantida) para um nome imutável. """
+        raiz, ext = os.path.splitext(self.caminho)
+        agora = time.time_ns()
+        carimbo = time.strftime("%Y%m%d-%H%M%S", time.localtime(agora / 1e9)) + f"-{agora // 1000 % 1000000:06d}"
+        os.replace(self.caminho, f"{raiz}.{carimbo}-{os.getpid()}{ext}")
+
+def ler_feedback(caminho=LOG_FILE, legado=LOG_LEGADO):
+    """
+    Gerador com todas as partidas registradas, da mais antiga para a mais nova:
+    log legado (se existir), arquivos rotacionados e o arquivo atual. Lê linha a
+    linha, então a memória não cresce com o tamanho do log. Linhas corrompidas
+    (ex.: escrita interrompida) são ignoradas.
+    """
+    if legado:
+        yield from ler_legado(legado)
+
+    for arquivo in arquivos_rotacionados(caminho) + [caminho]:
+        for entrada, _ in ler_linhas(arquivo):
+            yield entrada
+
+def ler_legado(legado=LOG_LEGADO):
+    """ Partidas do learning_log.json antigo (lista JSON única, não cresce mais). """
+    if not os.path.exists(legado):
+        return []
+    try:
+        with open(legado, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except:
+        return []
+
+def ler_linhas(arquivo, inicio=0):
+    """
+    (entrada, posição logo após a linha) de um arquivo do log a partir do byte `inicio`.
+    Uma última linha sem "\\n" (ainda sendo escrita) não é consumida, então a posição
+    devolvida é sempre um ponto seguro para retomar a leitura depois.
+    """
+    try:
+        f = open(arquivo, "rb")
+    except FileNotFoundError:
+        return # Rotacionado entre a listagem e a abertura
+    with f:
+        f.seek(inicio)
+        posicao = inicio
+        for linha in f:
+            if not linha.endswith(b"\n"):
+                return
+            posicao += len(linha)
+            if not linha.strip():
+                continue
+            try:
+                entrada = json.loads(linha)
+            except ValueError:
+                continue
+            yield entrada, posicao
+
+_LOG_PADRAO = None
+_LOG_PADRAO_LOCK = threading.Lock()
+
+def log_padrao():
+    """ Instância compartilhada pelo processo (criada no primeiro uso), em AKINATOR_LOG se definido. """
+    global _LOG_PADRAO
+    with _LOG_PADRAO_LOCK:
+        if _LOG_PADRAO is None:
+            _LOG_PADRAO = LogAprendizado(os.environ.get("AKINATOR_LOG") or LOG_FILE)
+        return _LOG_PADRAO
@@ -0,0 +1,165 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# Instrumentação leve do caminho quente: contadores e cronômetros por etapa
+# (ex.: "busca.depth1", "sessao.get"), acumulados por processo e expostos no
+# /metrics. Opcionalmente, um perfil por requisição (thread atual) guarda as
+# etapas daquela requisição na ordem em que aconteceram.
+
+# Limites (em segundos) dos buckets dos histogramas, no estilo Prometheus
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+class Histograma:
+    __slots__ = ("contagem", "soma", "maximo", "buckets")
+
+    def __init__(self):
+        self.contagem = 0
+        self.soma = 0.0
+        self.maximo = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1) # Último = +Inf
+
+    def observar(self, segundos):
+        self.contagem += 1
+        self.soma += segundos
+        if segundos > self.maximo:
+            self.maximo = segundos
+        for k, limite in enumerate(BUCKETS):
+            if segundos <= limite:
+                self.buckets[k] += 1
+                return
+        self.buckets[-1] += 1
+
+    def percentil(self, q):
+        """ Limite superior do bucket onde cai o percentil q (aproximação do histograma). """
+        if not self.contagem:
+            return 0.0
+        alvo = q / 100 * self.contagem
+        acumulado = 0
+        for k, n in enumerate(self.buckets):
+            acumulado += n
+            if acumulado >= alvo:
+                return BUCKETS[k] if k < len(BUCKETS) else self.maximo
+        return self.maximo
+
+class Metricas:
+    """ Contadores e histogramas de tempo do processo. Seguro entre threads. """
+
+    def __init__(self):
+        self.contadores = {}
+        self.tempos = {}
+        self.inicio = time.time()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    # --- Registro ---
+
+    def _nome(self, nome):
+        prefixo = getattr(self._local, "prefixo", None)
+        return nome if prefixo is None else f"{prefixo}.{nome}"
+
+    def contar(self, nome, n=1):
+        nome = self._nome(nome)
+        with self._lock:
+            self.contadores[nome] = self.contadores.get(nome, 0) + n
+        perfil = getattr(self._local, "perfil", None)
+        if perfil is not None:
+            perfil["contadores"][nome] = perfil["contadores"].get(nome, 0) + n
+
+    def observar(self, nome, segundos):
+        nome = self._nome(nome)
+        with self._lock:
+            hist = self.tempos.get(nome)
+            if hist is None:
+                hist = self.tempos[nome] = Histograma()
+            hist.observar(segundos)
+        perfil = getattr(self._local, "perfil", None)
+        if perfil is not None:
+            perfil["etapas"].append((nome, segundos))
+
+    @contextmanager
+    def medir(self, nome):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(nome, time.perf_counter() - inicio)
+
+    @contextmanager
+    def prefixo(self, prefixo):
+        """ Separa as métricas de um trabalho de fundo (ex.: "especulacao.busca.depth2") na thread atual. """
+        anterior = getattr(self._local, "prefixo", None)
+        self._local.prefixo = prefixo
+        try:
+            yield
+        finally:
+            self._local.prefixo = anterior
+
+    # --- Perfil por requisição ---
+
+    def iniciar_perfil(self):
+        self._local.perfil = {"etapas": [], "contadores": {}}
+
+    def perfil_ativo(self):
+        return getattr(self._local, "perfil", None) is not None
+
+    def mesclar_perfil(self, perfil):
+        """ Junta ao perfil da thread atual o de um trabalho feito em outra thread por ela. """
+        atual = getattr(self._local, "perfil", None)
+        if atual is None:
+            return
+        atual["etapas"].extend(perfil["etapas"])
+        for nome, n in perfil["contadores"].items():
+            atual["contadores"][nome] = atual["contadores"].get(nome, 0) + n
+
+    def encerrar_perfil(self):
+        """ Perfil da thread atual ({"etapas": [(nome, s)], "contadores": {}}) ou None. """
+        perfil = getattr(self._local, "perfil", None)
+        self._local.perfil = None
+        return perfil
+
+    # --- Exportação ---
+
+    def resumo(self):
+        with self._lock:
+            return {
+                "uptime_s": time.time() - self.inicio,
+                "contadores": dict(self.contadores),
+                "tempos": {nome: {"contagem": h.contagem, "soma_s": h.soma, "max_s": h.maximo,
+                                  "p50_s": h.percentil(50), "p95_s": h.percentil(95), "p99_s": h.percentil(99)}
+                           for nome, h in self.tempos.items()}
+            }
+
+    def texto_prometheus(self, prefixo="akinator"):
+        """ Formato texto de exposição do Prometheus (contadores + histogramas). """
+        linhas = []
+        with self._lock:
+            for nome, valor in sorted(self.contadores.items()):
+                metrica = f"{prefixo}_{_nome_metrica(nome)}_total"
+                linhas.append(f"# TYPE {metrica} counter")
+                linhas.append(f"{metrica} {valor}")
+            for nome, h in sorted(self.tempos.items()):
+                metrica = f"{prefixo}_{_nome_metrica(nome)}_segundos"
+                linhas.append(f"# TYPE {metrica} histogram")
+                acumulado = 0
+                for limite, n in zip(BUCKETS + ("+Inf",), h.buckets):
+                    acumulado += n
+                    linhas.append(f'{metrica}_bucket{{le="{limite}"}} {acumulado}')
+                linhas.append(f"{metrica}_sum {h.soma}")
+                linhas.append(f"{metrica}_count {h.contagem}")
+        return "\n".join(linhas) + "\n"
+
+    def limpar(self):
+        with self._lock:
+            self.contadores.clear()
+            self.tempos.clear()
+            self.inicio = time.time()
+
+def _nome_metrica(nome):
+    return "".join(c if c.isalnum() else "_" for c in nome)
+
+# Instância do processo
+METRICAS = Metricas()
+contar = METRICAS.contar
+observar = METRICAS.observar
+medir = METRICAS.medir
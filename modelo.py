@@ -0,0 +1,208 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from akinator_gen1 import (CACHE_HISTORICO, CALIBRACAO_FILE, DB_FILE, LIKELIHOODS, RAMOS_BUSCA, assinatura_modelo,
+                           carregar_base, maximo_log_verossimilhanca, tabela_log_verossimilhanca, tabela_ramos_base,
+                           transportar_derivados)
+from livro_abertura import LIVRO_FILE, carregar_livro, parametros_livro, regenerar_livro
+from metricas import contar, medir
+from sessoes import TTL_JOGO
+
+# Troca a quente do modelo (base compilada + calibração + livro de aberturas) sem
+# reiniciar o servidor. Uma thread verifica os arquivos periodicamente; quando algum
+# muda, a versão nova é compilada e aquecida fora do caminho das requisições e só
+# então publicada (buffer duplo: a atual continua atendendo enquanto isso).
+#
+# Cada jogo guarda o id da versão em que começou e continua nela até o fim. O id é a
+# assinatura do modelo (base + calibração), igual em todos os workers, e também é o
+# que separa as entradas do CACHE_HISTORICO: ao aposentar uma versão, só as entradas
+# dela saem do cache.
+#
+# Uma versão antiga só é aposentada quando nenhum jogo guardado a referencia mais
+# (`versoes_em_uso` do store de sessões, que com SQLite enxerga todos os workers).
+# Sem store, vale o último uso: `ociosa` segundos (TTL_JOGO) sem nenhum `obter`.
+#
+# Depois de uma edição da base (edicao_base.py), as tabelas derivadas da versão nova
+# são levadas da atual e só as linhas/colunas alteradas são recalculadas. O livro
+# gravado deixa de valer: a versão nova é publicada sem ele, um livro novo é gerado em
+# segundo plano com os mesmos parâmetros e entra na verificação seguinte.
+
+INTERVALO_VERIFICACAO = 5.0 # Segundos entre verificações dos arquivos
+
+class VersaoModelo:
+    """ Versão imutável do modelo servida às requisições. """
+
+    __slots__ = ("id", "base", "livro")
+
+    def __init__(self, id, base, livro):
+        self.id = id
+        self.base = base
+        self.livro = livro
+
+def marca_artefatos(caminhos=(DB_FILE, CALIBRACAO_FILE, LIVRO_FILE)):
+    """ (tamanho, mtime) de cada artefato (None se não existe): muda quando algum é regravado. """
+    marca = []
+    for caminho in caminhos:
+        try:
+            stat = os.stat(caminho)
+            marca.append((stat.st_size, stat.st_mtime_ns))
+        except OSError:
+            marca.append(None)
+    return tuple(marca)
+
+def aquecer_base(base, anterior=None):
+    """
+    Calcula as tabelas derivadas usadas pelas requisições, para a primeira não pagar por elas.
+    Com `anterior` (a base da versão atual), reaproveita dela o que a edição não mudou.
+    """
+    if anterior is not None:
+        with medir("modelo.transporte"):
+            contar("modelo.tabelas_transportadas", transportar_derivados(anterior, base))
+    for codigo in LIKELIHOODS:
+        tabela_log_verossimilhanca(base, codigo)
+        maximo_log_verossimilhanca(base, codigo)
+    tabela_ramos_base(base, RAMOS_BUSCA)
+    tabela_ramos_base(base, ("s", "n"))
+
+def compilar_versao(anterior=None):
+    """ Carrega (JSON/cache .kb + calibração) e aquece uma versão; None se a base está vazia. """
+    base = carregar_base()
+    if not base:
+        return None
+    aquecer_base(base, anterior.base if anterior is not None else None)
+    return VersaoModelo(assinatura_modelo(base), base, carregar_livro(base))
+
+class GerenciadorModelo:
+    """
+    Versão atual do modelo + as anteriores ainda em uso, por id. `atual` é só uma
+    referência: a troca é uma atribuição, e quem já leu a versão segue com ela.
+    `em_uso`: função que devolve os ids referenciados pelos jogos guardados.
+    """
+
+    def __init__(self, em_uso=None, ociosa=TTL_JOGO):
+        self.em_uso = em_uso
+        self.ociosa = ociosa
+        self._lock = threading.Lock() # Uma recarga por vez
+        self._versoes = OrderedDict() # id -> VersaoModelo, da mais antiga para a atual
+        self._ultimo_uso = {}         # id -> time.monotonic() do último `obter`
+        self._marca = marca_artefatos()
+        self._atual = compilar_versao()
+        if self._atual is not None:
+            self._versoes[self._atual.id] = self._atual
+            if not self._atual.livro:
+                self._regenerar_livro(self._atual)
+        self._parar = threading.Event()
+        self._intervalo = None
+        self._pid_thread = None
+
+    @property
+    def atual(self):
+        self._garantir_thread()
+        return self._atual
+
+    def obter(self, id_versao):
+        """ Versão pelo id (None se já foi aposentada); id None = a atual. """
+        self._garantir_thread()
+        if id_versao is None:
+            return self._atual
+        versao = self._versoes.get(id_versao)
+        if versao is not None:
+            self._ultimo_uso[id_versao] = time.monotonic()
+        return versao
+
+    def versoes(self):
+        return list(self._versoes)
+
+    def recarregar(self, forcar=False):
+        """ Compila e publica uma versão nova se algum artefato mudou. Retorna True se publicou. """
+        with self._lock:
+            self._aposentar()
+            marca = marca_artefatos()
+            if marca == self._marca and not forcar:
+                return False
+            try:
+                with medir("modelo.compilacao"):
+                    nova = compilar_versao(self._atual)
+            except Exception:
+                contar("modelo.falhas") # Ex.: arquivo no meio de uma gravação; tenta de novo na próxima
+                return False
+            self._marca = marca
+            if nova is None:
+                return False # Base vazia/ausente: melhor continuar com a versão que funciona
+
+            anterior = self._versoes.get(nova.id)
+            if anterior is not None:
+                # Mesmo modelo (ex.: só o livro mudou): reaproveita a base já aquecida
+                if anterior.livro == nova.livro and anterior is self._atual:
+                    return False
+                nova = VersaoModelo(anterior.id, anterior.base, nova.livro)
+
+            if self._atual is not None and self._atual.id != nova.id:
+                self._ultimo_uso[self._atual.id] = time.monotonic() # Conta a partir de quando deixou de ser a atual
+            self._versoes[nova.id] = nova
+            self._versoes.move_to_end(nova.id)
+            self._atual = nova
+            contar("modelo.trocas")
+            if not nova.livro:
+                self._regenerar_livro(nova)
+            return True
+
+    def _regenerar_livro(self, versao):
+        """ Livro gravado é de outro modelo: gera o desta versão numa thread (a verificação seguinte o publica). """
+        parametros = parametros_livro()
+        if parametros is None:
+            return # Nunca houve livro: não é o servidor que decide gerar um
+        def gerar():
+            try:
+                with medir("modelo.livro"):
+                    if regenerar_livro(versao.base, parametros) is not None:
+                        contar("modelo.livros_gerados")
+            except Exception:
+                contar("modelo.falhas")
+        threading.Thread(target=gerar, name="livro-modelo", daemon=True).start()
+
+    def _aposentar(self):
+        """ Remove as versões antigas que nenhum jogo usa mais (e as entradas delas no CACHE_HISTORICO). """
+        if len(self._versoes) <= 1:
+            return
+        if self.em_uso is not None:
+            try:
+                em_uso = self.em_uso()
+            except Exception:
+                contar("modelo.falhas") # Store indisponível: na dúvida, mantém todas
+                return
+            aposentar = lambda id_versao: id_versao not in em_uso
+        else:
+            limite = time.monotonic() - self.ociosa
+            aposentar = lambda id_versao: self._ultimo_uso.get(id_versao, 0.0) < limite
+        for id_versao in [v for v in self._versoes if v != self._atual.id and aposentar(v)]:
+            del self._versoes[id_versao]
+            self._ultimo_uso.pop(id_versao, None)
+            CACHE_HISTORICO.remover(lambda chave: chave[1] == id_versao)
+            contar("modelo.aposentadas")
+
+    def iniciar(self, intervalo=INTERVALO_VERIFICACAO):
+        """
+        Liga a verificação periódica (`recarregar` a cada `intervalo` segundos). A thread
+        sobe no primeiro uso em cada processo: com `gunicorn --preload` o `iniciar` roda
+        no master, e threads não sobrevivem ao fork dos workers.
+        """
+        self._intervalo = intervalo
+
+    def _garantir_thread(self):
+        if self._intervalo is None or self._pid_thread == os.getpid():
+            return
+        with self._lock:
+            if self._pid_thread == os.getpid():
+                return
+            self._pid_thread = os.getpid()
+            intervalo = self._intervalo
+            def verificar():
+                while not self._parar.wait(intervalo):
+                    self.recarregar()
+            threading.Thread(target=verificar, name="recarga-modelo", daemon=True).start()
+
+    def encerrar(self):
+        self._parar.set()
@@ -0,0 +1,162 @@
+import numpy as np
+
+TOP_K_VISTA = 32 # Tamanho mínimo da vista de líderes mantida entre respostas
+
+class PosteriorLog:
+    """
+    Posterior mantido em log-espaço. Cada resposta soma uma coluna de
+    log-verossimilhança (in-place, sem realocar); a normalização só acontece
+    quando as probabilidades são lidas. Como nada é multiplicado até virar 0,
+    jogos longos não sofrem underflow nem precisam de reset para uniforme.
+
+    Os líderes ficam numa vista incremental (`vista_top`): os índices dos K mais
+    prováveis e um teto para o log de qualquer um fora deles. Cada resposta só sobe
+    o teto pelo máximo da coluna somada; enquanto o k-ésimo da vista continua acima
+    do teto, o top-k sai da vista (O(K)) sem varrer a base.
+    """
+
+    def __init__(self, log_probs, vista_top=None):
+        self.log_probs = np.array(log_probs, dtype=np.float64)
+        self._log_norm = None # log(Somatório exp(log_probs)), calculado sob demanda
+        self._probs = None
+        self._ativos = None # (epsilon, índices) do último conjunto ativo calculado
+        self._top = None # (índices dos líderes, teto do log fora deles)
+        if vista_top is not None:
+            indices, teto = vista_top
+            self._top = (np.asarray(indices, dtype=np.intp), -np.inf if teto is None else float(teto))
+
+    @classmethod
+    def uniforme(cls, total):
+        return cls(np.zeros(total))
+
+    @classmethod
+    def de_probs(cls, probs):
+        with np.errstate(divide="ignore"):
+            return cls(np.log(np.asarray(probs, dtype=np.float64)))
+
+    def __len__(self):
+        return len(self.log_probs)
+
+    def _invalidar(self):
+        self._log_norm = None
+        self._probs = None
+        self._ativos = None
+
+    def adicionar(self, log_verossimilhanca, maximo=None):
+        """
+        Bayes em log: log P(H|E) = log P(H) + log P(E|H) (+ constante).
+        `maximo` (o máximo de `log_verossimilhanca`, se já conhecido) atualiza a vista de líderes.
+        """
+        self.log_probs += log_verossimilhanca
+        self._invalidar()
+        if self._top is not None:
+            if maximo is None:
+                maximo = np.max(log_verossimilhanca)
+            self._top = (self._top[0], self._top[1] + float(maximo))
+
+    @property
+    def vista_top(self):
+        """
+        (índices, teto) da vista de líderes, para persistir junto com `log_probs` (ou None).
+        Teto -inf (a vista cobre a base inteira) vira None: -Infinity não é JSON válido.
+        """
+        if self._top is None:
+            return None
+        indices, teto = self._top
+        return indices.tolist(), teto if np.isfinite(teto) else None
+
+    @property
+    def log_norm(self):
+        if self._log_norm is None:
+            maximo = self.log_probs.max() if len(self.log_probs) else -np.inf
+            if not np.isfinite(maximo):
+                self._log_norm = -np.inf
+            else:
+                self._log_norm = maximo + np.log(np.exp(self.log_probs - maximo).sum())
+        return self._log_norm
+
+    @property
+    def probs(self):
+        """ Probabilidades normalizadas (somente leitura; recalculadas após cada resposta). """
+        if self._probs is None:
+            if not np.isfinite(self.log_norm):
+                probs = np.full(len(self.log_probs), 1.0 / max(len(self.log_probs), 1))
+            else:
+                probs = np.exp(self.log_probs - self.log_norm)
+            probs.setflags(write=False)
+            self._probs = probs
+        return self._probs
+
+    def prob(self, indices):
+        """ Probabilidade normalizada de um ou mais índices, sem materializar o vetor todo. """
+        if not np.isfinite(self.log_norm):
+            return np.full(np.shape(indices), 1.0 / max(len(self.log_probs), 1))
+        return np.exp(self.log_probs[indices] - self.log_norm)
+
+    def ativos(self, epsilon):
+        """
+        Conjunto ativo: índices com probabilidade > epsilon. Como o vetor completo continua
+        sendo atualizado, um pokémon que sai do conjunto volta exatamente quando uma
+        resposta posterior recupera sua massa. Em bases com mais de 1/(2 epsilon) entradas o
+        corte desce para metade da probabilidade uniforme, senão o prior inteiro ficaria de fora.
+        """
+        if self._ativos is None or self._ativos[0] != epsilon:
+            if not np.isfinite(self.log_norm):
+                indices = np.arange(len(self.log_probs))
+            else:
+                corte = min(epsilon, 0.5 / len(self.log_probs))
+                indices = np.flatnonzero(self.log_probs > self.log_norm + np.log(corte))
+            self._ativos = (epsilon, indices)
+        return self._ativos[1]
+
+    def top_k(self, k, indices=None):
+        """
+        (índices, probs) dos k mais prováveis, do maior para o menor, sem ordenar tudo.
+        Com `indices` (ex.: o conjunto ativo) a busca fica restrita a eles; sem eles,
+        a resposta vem da vista de líderes, reconstruída só quando deixa de ser exata.
+        """
+        if indices is None and np.isfinite(self.log_norm):
+            ordem = self._top_vista(k)
+            return ordem, self.prob(ordem)
+        if indices is None or len(indices) < k:
+            indices = np.arange(len(self.log_probs))
+        k = min(k, len(indices))
+        if k <= 0:
+            return np.zeros(0, dtype=np.intp), np.zeros(0)
+        valores = self.log_probs[indices]
+        if k < len(indices):
+            candidatos = np.argpartition(-valores, k - 1)[:k]
+        else:
+            candidatos = np.arange(len(indices))
+        candidatos = candidatos[np.argsort(-valores[candidatos], kind="stable")]
+        ordem = indices[candidatos]
+        return ordem, self.prob(ordem)
+
+    def _top_vista(self, k):
+        k = min(k, len(self.log_probs))
+        if self._top is not None and len(self._top[0]) >= k:
+            lideres, teto = self._top
+            valores = self.log_probs[lideres]
+            ordem = np.lexsort((lideres, -valores)) # Empates: menor índice primeiro
+            # Exata se o k-ésimo da vista está acima de qualquer um que ficou de fora
+            if k == 0 or valores[ordem[k - 1]] > teto:
+                return lideres[ordem[:k]]
+
+        # Reconstrói: K maiores por argpartition e o (K+1)-ésimo como teto
+        tamanho = min(max(k, TOP_K_VISTA), len(self.log_probs))
+        if tamanho < len(self.log_probs):
+            particao = np.argpartition(-self.log_probs, tamanho)
+            lideres, teto = particao[:tamanho], float(self.log_probs[particao[tamanho]])
+            if self.log_probs[lideres].min() == teto:
+                # Empate na fronteira: ficam os de menor índice, como numa ordenação completa
+                acima = lideres[self.log_probs[lideres] > teto]
+                empatados = np.flatnonzero(self.log_probs == teto)[:tamanho - len(acima)]
+                lideres = np.concatenate([acima, empatados])
+        else:
+            lideres, teto = np.arange(len(self.log_probs)), -np.inf
+        lideres = lideres[np.lexsort((lideres, -self.log_probs[lideres]))]
+        self._top = (lideres, teto)
+        return lideres[:k]
+
+    def copy(self):
+        return PosteriorLog(self.log_probs, self.vista_top)
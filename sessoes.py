@@ -0,0 +1,140 @@
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from cache import CacheLRU
+
+# Estado de jogo guardado no servidor; o cookie do Flask carrega só o ID do jogo.
+# Configuração por variável de ambiente:
+#   AKINATOR_STORE=memoria              (padrão, LRU em memória do processo)
+#   AKINATOR_STORE=sqlite:jogos.db      (arquivo compartilhado entre workers)
+
+TTL_JOGO = 2 * 60 * 60      # Jogos parados há mais de 2h são descartados
+MAX_JOGOS_MEMORIA = 10000
+
+class EstadoJogo:
+    """ Estado compacto de uma partida: posterior (log-espaço) em array + metadados pequenos. """
+
+    __slots__ = ("log_probs", "atributos_utilizados", "historico", "perguntas_feitas", "pergunta_atual", "vista_top", "versao")
+
+    def __init__(self, log_probs, atributos_utilizados=None, historico=None, perguntas_feitas=0, pergunta_atual=None,
+                 vista_top=None, versao=None):
+        self.log_probs = log_probs
+        self.atributos_utilizados = atributos_utilizados or [] # Lista de [attr, val]
+        self.historico = historico or [] # Histórico anotado para o aprendizado
+        self.perguntas_feitas = perguntas_feitas
+        self.pergunta_atual = pergunta_atual
+        self.vista_top = vista_top # Líderes do posterior ([índices], teto), ver PosteriorLog.vista_top
+        self.versao = versao # Id da versão do modelo em que o jogo começou (ver modelo.py)
+
+    @classmethod
+    def novo(cls, total, versao=None):
+        return cls(np.zeros(total), versao=versao) # log-prior uniforme (não normalizado)
+
+    def metadados(self):
+        return {
+            "atributos_utilizados": self.atributos_utilizados,
+            "historico": self.historico,
+            "perguntas_feitas": self.perguntas_feitas,
+            "pergunta_atual": self.pergunta_atual,
+            "vista_top": self.vista_top,
+            "versao": self.versao
+        }
+
+    def serializar(self):
+        """ (json dos metadados, bytes do posterior) para stores persistentes. """
+        return json.dumps(self.metadados(), ensure_ascii=False), np.asarray(self.log_probs, dtype=np.float64).tobytes()
+
+    @classmethod
+    def desserializar(cls, meta, log_probs):
+        return cls(np.frombuffer(log_probs, dtype=np.float64).copy(), **json.loads(meta))
+
+def novo_id_jogo():
+    return secrets.token_urlsafe(16)
+
+class MemoriaStore:
+    """ Jogos em memória do processo (LRU + TTL). Só serve para um único worker. """
+
+    def __init__(self, capacidade=MAX_JOGOS_MEMORIA, ttl=TTL_JOGO):
+        self._cache = CacheLRU(capacidade, ttl)
+
+    def get(self, id_jogo):
+        return self._cache.get(id_jogo)
+
+    def put(self, id_jogo, estado):
+        self._cache.put(id_jogo, estado)
+
+    def delete(self, id_jogo):
+        self._cache.pop(id_jogo)
+
+    def versoes_em_uso(self):
+        """ Ids das versões do modelo referenciadas por jogos ainda válidos. """
+        return {estado.versao for estado in self._cache.valores()}
+
+class SQLiteStore:
+    """ Jogos em um arquivo SQLite, compartilhado por vários workers/processos. """
+
+    def __init__(self, caminho, ttl=TTL_JOGO):
+        self.caminho = caminho
+        self.ttl = ttl
+        self._local = threading.local() # Uma conexão por thread
+        self._escritas = 0
+        with self._conexao() as con:
+            con.execute("CREATE TABLE IF NOT EXISTS jogos (id TEXT PRIMARY KEY, atualizado REAL, meta TEXT, log_probs BLOB)")
+
+    def _conexao(self):
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.caminho, timeout=10)
+            con.execute("PRAGMA journal_mode=WAL")
+            self._local.con = con
+        return con
+
+    def get(self, id_jogo):
+        linha = self._conexao().execute(
+            "SELECT atualizado, meta, log_probs FROM jogos WHERE id = ?", (id_jogo,)).fetchone()
+        if linha is None:
+            return None
+        atualizado, meta, log_probs = linha
+        if self.ttl is not None and time.time() - atualizado > self.ttl:
+            self.delete(id_jogo)
+            return None
+        return EstadoJogo.desserializar(meta, log_probs)
+
+    def put(self, id_jogo, estado):
+        meta, log_probs = estado.serializar()
+        with self._conexao() as con:
+            con.execute("INSERT OR REPLACE INTO jogos (id, atualizado, meta, log_probs) VALUES (?, ?, ?, ?)",
+                        (id_jogo, time.time(), meta, log_probs))
+        self._escritas += 1
+        if self._escritas % 1000 == 0: # Faxina periódica dos jogos abandonados
+            self.limpar_expirados()
+
+    def delete(self, id_jogo):
+        with self._conexao() as con:
+            con.execute("DELETE FROM jogos WHERE id = ?", (id_jogo,))
+
+    def versoes_em_uso(self):
+        """ Ids das versões do modelo referenciadas por jogos ainda válidos (de todos os workers). """
+        limite = time.time() - self.ttl if self.ttl is not None else float("-inf")
+        linhas = self._conexao().execute(
+            "SELECT DISTINCT json_extract(meta, '$.versao') FROM jogos WHERE atualizado >= ?", (limite,)).fetchall()
+        return {versao for versao, in linhas}
+
+    def limpar_expirados(self):
+        with self._conexao() as con:
+            return con.execute("DELETE FROM jogos WHERE atualizado < ?", (time.time() - self.ttl,)).rowcount
+
+def criar_store(config=None):
+    """ Cria o store a partir de "memoria" ou "sqlite:<arquivo>" (padrão: AKINATOR_STORE). """
+    config = config or os.environ.get("AKINATOR_STORE", "memoria")
+    if config.startswith("sqlite:"):
+        return SQLiteStore(config[len("sqlite:"):])
+    if config == "memoria":
+        return MemoriaStore()
+    raise ValueError(f"Store de sessão desconhecido: {config}")
@@ -0,0 +1,15 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+@pytest.fixture
+def pasta_base(tmp_path, monkeypatch):
+    """ Diretório temporário com uma cópia do pokemon_db.json (os artefatos usam caminhos relativos). """
+    shutil.copy(os.path.join(RAIZ, "pokemon_db.json"), tmp_path / "pokemon_db.json")
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
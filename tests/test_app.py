@@ -0,0 +1,25 @@
+import importlib
+
+import pytest
+
+@pytest.fixture
+def cliente(pasta_base, monkeypatch):
+    monkeypatch.setenv("AKINATOR_RECARGA", "0")
+    monkeypatch.setenv("AKINATOR_ESPECULACAO", "0")
+    app = importlib.import_module("app")
+    return app, app.app.test_client()
+
+def test_sem_modelo_responde_503(cliente, monkeypatch):
+    app, cliente = cliente
+    monkeypatch.setattr(app.MODELO, "_atual", None)
+    for resposta in (cliente.get("/result?pokemon=Pikachu"), cliente.post("/api/next_question"),
+                     cliente.post("/api/batch", json={"jogos": [[]]})):
+        assert resposta.status_code == 503
+        assert resposta.headers["Retry-After"]
+
+def test_lote_recusa_codigo_invalido(cliente):
+    _, cliente = cliente
+    for codigo in (["s"], "x", None):
+        resposta = cliente.post("/api/batch", json={"jogos": [[["tipo", "Fogo", codigo]]]})
+        assert resposta.status_code == 400
+    assert cliente.post("/api/batch", json={"jogos": [[["tipo", "Fogo", "s"]]]}).status_code == 200
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from akinator_gen1 import (CACHE_HISTORICO, AkinatorBayes, BuscaExpectimax, TOLERANCIA_EMPATE, carregar_base,
+                           entropia_esperada_lote)
+
+HISTORICOS = [
+    [],
+    [("evolui", True, "s")],
+    [("tem_cauda", True, "n"), ("bipede", True, "s")],
+    [("evolui", True, "n"), ("tem_cauda", True, "p"), ("bipede", True, "i")],
+]
+
+def _jogo(base, historico):
+    jogo = AkinatorBayes(base)
+    for attr, val, resp in historico:
+        jogo.atualizar_probabilidades(attr, val, resp)
+        jogo.atributos_utilizados.add((attr, val))
+    return jogo
+
+def _forca_bruta(tabelas, tlogt, probs, disponiveis, profundidade):
+    """ Expectimax sem poda nem tabela de transposição: entropia esperada de cada pergunta disponível. """
+    candidatas = np.flatnonzero(disponiveis)
+    if profundidade == 1:
+        return entropia_esperada_lote(probs, tabelas, tlogt)[candidatas]
+    valores = np.zeros(len(candidatas))
+    for k, j in enumerate(candidatas):
+        restantes = disponiveis.copy()
+        restantes[j] = False
+        for pesos in tabelas[:, :, j] * probs:
+            p = pesos.sum()
+            if p <= 1e-12:
+                continue
+            if restantes.any():
+                valores[k] += p * _forca_bruta(tabelas, tlogt, pesos / p, restantes, profundidade - 1).min()
+            else:
+                valores[k] += p * AkinatorBayes.static_calc_entropy(pesos / p)
+    return valores
+
+@pytest.mark.parametrize("profundidade", [2, 3])
+def test_poda_igual_a_expectimax_completo(pasta_base, profundidade):
+    base = carregar_base()
+    podas = 0
+    for historico in HISTORICOS:
+        jogo = _jogo(base, historico)
+        disponiveis = jogo._mascara_disponiveis()
+        ativos, probs = jogo._estado_ativo()
+        tabelas, tlogt = jogo._tabelas_ativas(ativos)
+
+        esperado = _forca_bruta(tabelas, tlogt, probs, disponiveis, profundidade)
+        busca = BuscaExpectimax(tabelas, tabelas_tlogt=tlogt)
+        valores = busca.valores(probs, disponiveis, profundidade)
+        podas += busca.podas
+        # Podadas ficam com inf; as avaliadas (e o mínimo) batem com a busca completa
+        avaliadas = np.isfinite(valores)
+        assert np.allclose(valores[avaliadas], esperado[avaliadas], atol=1e-6)
+        assert valores.min() == pytest.approx(esperado.min(), abs=1e-6)
+
+        CACHE_HISTORICO.clear()
+        attr_val = jogo.obter_melhor_pergunta_lookahead(profundidade=profundidade, tempo_limite=None)
+        candidatas = np.flatnonzero(disponiveis)
+        escolhida = int(np.flatnonzero(candidatas == jogo.base.indice_perguntas[attr_val])[0])
+        assert esperado[escolhida] <= esperado.min() + 1e-6 + TOLERANCIA_EMPATE
+    assert podas > 0 # A poda de fato entrou em ação
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from akinator_gen1 import CACHE_HISTORICO, BuscaExpectimax, TOLERANCIA_EMPATE, carregar_base, jogar_automatico
+from busca_paralela import PoolBusca
+
+HISTORICOS = [
+    [],
+    [("evolui", True, "s")],
+    [("tem_cauda", True, "n"), ("bipede", True, "pn")],
+]
+
+@pytest.fixture
+def pool(pasta_base):
+    pool = PoolBusca(2)
+    yield pool
+    pool.encerrar()
+
+def _escolhida(candidatas, scores):
+    return candidatas[int(np.flatnonzero(scores <= scores.min() + TOLERANCIA_EMPATE)[0])]
+
+@pytest.mark.parametrize("profundidade", [2, 3])
+def test_pool_igual_a_busca_sequencial(pool, profundidade):
+    from akinator_gen1 import AkinatorBayes
+    base = carregar_base()
+    for historico in HISTORICOS:
+        jogo = AkinatorBayes(base)
+        for attr, val, resp in historico:
+            jogo.atualizar_probabilidades(attr, val, resp)
+            jogo.atributos_utilizados.add((attr, val))
+        disponiveis = jogo._mascara_disponiveis()
+        ativos, probs = jogo._estado_ativo()
+        tabelas, tlogt = jogo._tabelas_ativas(ativos)
+        candidatas = np.flatnonzero(disponiveis)
+
+        sequencial = BuscaExpectimax(tabelas, tabelas_tlogt=tlogt).valores(probs, disponiveis, profundidade, candidatas)
+        paralelo = pool.valores(base, ativos, ("s", "n"), probs, disponiveis, profundidade, candidatas)
+        assert paralelo is not None, "o pool não atendeu (caiu para a busca sequencial)"
+        scores = paralelo[0]
+        # Cada processo poda com o seu melhor: os infinitos podem mudar, o mínimo e a escolha não
+        ambos = np.isfinite(scores) & np.isfinite(sequencial)
+        assert np.allclose(scores[ambos], sequencial[ambos], atol=1e-9)
+        assert scores.min() == pytest.approx(sequencial.min(), abs=1e-9)
+        assert _escolhida(candidatas, scores) == _escolhida(candidatas, sequencial)
+
+def test_jogos_com_pool_iguais_aos_sequenciais(pool):
+    base = carregar_base()
+    for alvo in (0, 24, 150):
+        resultados = []
+        for p in (None, pool):
+            CACHE_HISTORICO.clear()
+            perguntas = []
+            def responder(attr, val):
+                perguntas.append((attr, val))
+                return "s" if base.coluna(attr, val)[alvo] else "n"
+            resultado = jogar_automatico(base, responder, profundidade=2, tempo_limite=None, pool=p)
+            resultados.append((perguntas, resultado["status"], resultado["indice"]))
+        assert resultados[0] == resultados[1]
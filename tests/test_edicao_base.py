@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+from akinator_gen1 import carregar_base, transportar_derivados
+from base_conhecimento import KnowledgeBase
+from calibracao import CODIGOS, gravar_calibracao
+from edicao_base import EditorBase
+from modelo import aquecer_base
+
+def _editar():
+    editor = EditorBase()
+    editor.adicionar_atributo("atributo_teste", {"Pikachu": True, "Psyduck": True})
+    editor.modificar("Bulbasaur", {"nome": "Bulbasaur Editado"})
+    editor.modificar("Charmander", {"evolui": False})
+    novo = dict(editor.registro("Mew"), nome="Mew Clone", numero=999)
+    editor.adicionar(novo)
+    return editor.salvar()
+
+def _calibrar(base):
+    probs = np.random.default_rng(0).random((len(CODIGOS), len(base), len(base.perguntas))).astype(np.float32) + 0.01
+    gravar_calibracao(base, probs / probs.sum(axis=0, keepdims=True))
+
+def _comparar_derivados(incremental, completa):
+    chaves = sorted(c for c in completa.derivados if isinstance(c, tuple))
+    assert sorted(c for c in incremental.derivados if isinstance(c, tuple)) == chaves
+    for chave in chaves:
+        a, b = incremental.derivados[chave], completa.derivados[chave]
+        for x, y in zip(a, b) if isinstance(a, tuple) else [(a, b)]:
+            assert np.array_equal(x, y), chave
+
+def test_compilacao_incremental_igual_a_completa(pasta_base):
+    base = _editar()
+    completa = KnowledgeBase.compilar(base.dados)
+    assert base.assinatura == completa.assinatura
+    assert base.nomes == completa.nomes and base.perguntas == completa.perguntas
+    assert np.array_equal(base.matriz, completa.matriz)
+
+@pytest.mark.parametrize("calibrada", [False, True])
+def test_tabelas_transportadas_iguais_a_recalculo(pasta_base, calibrada):
+    if calibrada:
+        _calibrar(carregar_base())
+    anterior = carregar_base()
+    aquecer_base(anterior)
+    _editar()
+
+    incremental, completa = carregar_base(), carregar_base()
+    assert ("calibracao" in incremental.derivados) == calibrada
+    assert transportar_derivados(anterior, incremental) > 0
+    aquecer_base(incremental)
+    aquecer_base(completa)
+    _comparar_derivados(incremental, completa)
+
+def test_calibracao_retreinada_recalcula_tudo(pasta_base):
+    _calibrar(carregar_base())
+    anterior = carregar_base()
+    aquecer_base(anterior)
+    probs = np.full((len(CODIGOS), len(anterior), len(anterior.perguntas)), 1 / len(CODIGOS), dtype=np.float32)
+    gravar_calibracao(anterior, probs) # Sem `origem`: não dá para reaproveitar nada
+
+    incremental, completa = carregar_base(), carregar_base()
+    assert transportar_derivados(anterior, incremental) == 0
+    aquecer_base(incremental)
+    aquecer_base(completa)
+    _comparar_derivados(incremental, completa)
+
+def test_numero_e_o_da_pokedex(pasta_base):
+    editor = EditorBase()
+    assert editor.registro(25)["nome"] == "Pikachu"
+    editor.modificar(25, {"tem_cauda": True})
+    assert editor.registro("Pikachu")["tem_cauda"] is True
+    assert editor.registro("Raichu") is editor.base.dados[editor.indice("Raichu")] # Não foi tocado
+
+    with pytest.raises(KeyError):
+        editor.indice(len(editor.base) + 1) # Alterações pendentes não abrem índices novos
+    novo = editor.adicionar(dict(editor.registro("Mew"), nome="Mew Clone", numero=999))
+    assert editor.indice(999) == novo
+    with pytest.raises(KeyError):
+        editor.indice(1000)
@@ -0,0 +1,94 @@
+import threading
+
+from akinator_gen1 import carregar_dados, salvar_dados
+from modelo import GerenciadorModelo
+from sessoes import EstadoJogo, MemoriaStore
+
+def _editar(n):
+    """ Regrava o JSON com um atributo novo no Pikachu (base com assinatura nova). """
+    dados = carregar_dados()
+    next(p for p in dados if p["nome"] == "Pikachu")[f"atributo_teste_{n}"] = True
+    salvar_dados(dados)
+
+def _jogar(modelo, estado):
+    """ Uma pergunta + resposta na versão do jogo, como o /api/answer faz. """
+    from akinator_gen1 import AkinatorBayes
+    from posterior import PosteriorLog
+    versao = modelo.obter(estado.versao)
+    assert versao is not None, "versão do jogo aposentada com o jogo em andamento"
+    jogo = AkinatorBayes(versao.base)
+    jogo.posterior = PosteriorLog(estado.log_probs, estado.vista_top)
+    jogo.atributos_utilizados = set(tuple(x) for x in estado.atributos_utilizados)
+    attr, val = jogo.obter_melhor_pergunta_lookahead(profundidade=1, tempo_limite=None)
+    jogo.atualizar_probabilidades(attr, val, "s")
+    estado.log_probs = jogo.posterior.log_probs
+    estado.vista_top = jogo.posterior.vista_top
+    estado.atributos_utilizados.append([attr, val])
+
+def test_jogo_atravessa_varias_recargas(pasta_base):
+    jogos = MemoriaStore()
+    modelo = GerenciadorModelo(em_uso=jogos.versoes_em_uso)
+    primeira = modelo.atual
+    estado = EstadoJogo.novo(len(primeira.base), primeira.id)
+    jogos.put("antigo", estado)
+    _jogar(modelo, estado)
+
+    for n in range(4):
+        _editar(n)
+        assert modelo.recarregar()
+        assert modelo.atual.id != primeira.id
+        estado = jogos.get("antigo")
+        _jogar(modelo, estado)
+        jogos.put("antigo", estado)
+
+    # Versões intermediárias sem jogos saem na verificação seguinte; a do jogo antigo fica
+    assert not modelo.recarregar()
+    assert modelo.versoes() == [primeira.id, modelo.atual.id]
+
+    jogos.delete("antigo")
+    modelo.recarregar()
+    assert modelo.versoes() == [modelo.atual.id]
+    assert modelo.obter(primeira.id) is None
+
+def test_sem_store_aposenta_por_ociosidade(pasta_base):
+    modelo = GerenciadorModelo(ociosa=3600)
+    primeira = modelo.atual
+    _editar(0)
+    assert modelo.recarregar()
+    modelo.recarregar(forcar=True)
+    assert primeira.id in modelo.versoes() # Acabou de deixar de ser a atual
+
+    modelo.ociosa = 0
+    modelo.recarregar()
+    assert modelo.versoes() == [modelo.atual.id]
+
+def test_thread_de_recarga_sobe_no_primeiro_uso(pasta_base):
+    modelo = GerenciadorModelo()
+    modelo.iniciar(3600)
+    try:
+        recargas = lambda: sum(t.name == "recarga-modelo" for t in threading.enumerate())
+        antes = recargas()
+        assert modelo._pid_thread is None # Nada sobe no `iniciar` (ex.: master do gunicorn --preload)
+        modelo.atual
+        modelo.obter(None)
+        assert recargas() == antes + 1
+    finally:
+        modelo.encerrar()
+
+def test_recarga_regenera_livro_da_base_editada(pasta_base):
+    from akinator_gen1 import carregar_base
+    from livro_abertura import construir_livro, salvar_livro
+    salvar_livro(construir_livro(carregar_base(), plies=2, profundidade=1))
+    modelo = GerenciadorModelo()
+    assert modelo.atual.livro
+
+    _editar(0)
+    assert modelo.recarregar()
+    assert not modelo.atual.livro # Publicada sem esperar o livro...
+    for thread in threading.enumerate():
+        if thread.name == "livro-modelo":
+            thread.join()
+    modelo.recarregar() # ...que entra na verificação seguinte
+
+    esperado = construir_livro(carregar_base(), plies=2, profundidade=1)["perguntas"]
+    assert modelo.atual.livro == {chave: tuple(perg) for chave, perg in esperado.items()}
@@ -0,0 +1,85 @@
+import json
+
+import numpy as np
+import pytest
+
+from akinator_gen1 import LIKELIHOODS, carregar_base, maximo_log_verossimilhanca, tabela_log_verossimilhanca
+from posterior import TOP_K_VISTA, PosteriorLog
+from sessoes import EstadoJogo, SQLiteStore
+
+def _top_completo(log_probs, k):
+    """ Referência: ordenação completa (empates pelo menor índice). """
+    return np.lexsort((np.arange(len(log_probs)), -log_probs))[:k]
+
+def _respostas(base, n, seed=0):
+    rng = np.random.default_rng(seed)
+    codigos = list(LIKELIHOODS)
+    for _ in range(n):
+        codigo = codigos[rng.integers(len(codigos))]
+        j = rng.integers(len(base.perguntas))
+        yield tabela_log_verossimilhanca(base, codigo)[:, j], maximo_log_verossimilhanca(base, codigo)[j]
+
+def test_vista_top_igual_a_ordenacao_completa(pasta_base):
+    base = carregar_base()
+    posterior = PosteriorLog.uniforme(len(base))
+    for coluna, maximo in _respostas(base, 40):
+        posterior.adicionar(coluna, maximo)
+        # Ida e volta pelo estado persistido, como entre duas requisições
+        posterior = PosteriorLog(posterior.log_probs, posterior.vista_top)
+        for k in (1, 5, 10, TOP_K_VISTA):
+            indices, probs = posterior.top_k(k)
+            assert indices.tolist() == _top_completo(posterior.log_probs, k).tolist()
+            assert np.allclose(probs, posterior.probs[indices])
+
+def test_vista_cobrindo_a_base_inteira(tmp_path):
+    # Base menor que a vista: nada fica de fora e o teto é -inf
+    rng = np.random.default_rng(1)
+    posterior = PosteriorLog.uniforme(TOP_K_VISTA // 2)
+    posterior.top_k(3)
+    indices, teto = posterior.vista_top
+    assert teto is None and len(indices) == len(posterior)
+    for _ in range(10):
+        posterior.adicionar(rng.normal(size=len(posterior)))
+        posterior = PosteriorLog(posterior.log_probs, json.loads(json.dumps(posterior.vista_top, allow_nan=False)))
+        assert posterior.top_k(5)[0].tolist() == _top_completo(posterior.log_probs, 5).tolist()
+
+    # O estado guardado no SQLite continua legível por json_extract
+    jogos = SQLiteStore(str(tmp_path / "jogos.db"))
+    estado = EstadoJogo(posterior.log_probs, vista_top=posterior.vista_top, versao="v1")
+    jogos.put("jogo", estado)
+    assert jogos.versoes_em_uso() == {"v1"}
+    assert jogos.get("jogo").vista_top == list(posterior.vista_top)
+
+def _tem_original(pokemon, attr, val):
+    """ check_feature da versão original (loop por Pokémon), usada como referência. """
+    if attr == "tipo":
+        return pokemon.get("tipo", "") == val or pokemon.get("tipo2", "") == val
+    if attr == "evolui":
+        return bool(pokemon.get("evolui", "")) if val is True else not bool(pokemon.get("evolui", ""))
+    if attr == "cor":
+        return pokemon.get("cor") == val
+    return pokemon.get(attr, False) == val
+
+def test_posterior_igual_ao_loop_original(pasta_base):
+    from akinator_gen1 import AkinatorBayes
+    base = carregar_base()
+    dados = base.dados
+    rng = np.random.default_rng(2)
+    codigos = list(LIKELIHOODS)
+    for attr, val in base.perguntas:
+        assert base.coluna(attr, val).tolist() == [_tem_original(p, attr, val) for p in dados], (attr, val)
+
+    jogo = AkinatorBayes(base)
+    probs = [1.0 / len(dados)] * len(dados)
+    for _ in range(25):
+        attr, val = base.perguntas[rng.integers(len(base.perguntas))]
+        codigo = codigos[rng.integers(len(codigos))]
+
+        jogo.atualizar_probabilidades(attr, val, codigo)
+        p_tem, p_nao_tem = LIKELIHOODS[codigo]
+        probs = [p * (p_tem if _tem_original(pokemon, attr, val) else p_nao_tem) for p, pokemon in zip(probs, dados)]
+        soma = sum(probs)
+        probs = [p / soma for p in probs]
+        assert np.allclose(jogo.probs, probs, rtol=1e-9, atol=0)
+    assert AkinatorBayes.static_calc_entropy(jogo.probs) == \
+        pytest.approx(-sum(p * np.log2(p) for p in probs if p > 0), rel=1e-9)